@@ -3,21 +3,25 @@ import streamlit as st
 import pandas as pd
 import json
 import os
-import time
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
 import plotly.express as px
 import plotly.graph_objects as go
 import re
 
+from database import query_log, query_archive
+
 # ================================
 # Paths & setup
 # ================================
 INTENTS_PATH = "nlu_engine/intents.json"
 ENTITIES_FILE = "nlu_engine/entities.json"
 MODEL_DIR = "models/intent_model"
-LOG_PATH = "logs/query_history.json"
+LOG_PATH = "logs/query_history.db"
 FAQ_PATH = "faq_data.json"
+HISTORY_PREVIEW_ROWS = 200
+# st.download_button holds the whole file in server memory; larger exports stay on disk
+EXPORT_DOWNLOAD_MAX_MB = 50
 
 os.makedirs("models", exist_ok=True)
 os.makedirs("nlu_engine", exist_ok=True)
@@ -283,10 +287,7 @@ def load_entities():
     return list(out.values())
 
 def load_logs():
-    return load_json(LOG_PATH, [])
-
-def save_logs(logs):
-    save_json(LOG_PATH, logs)
+    return query_log.load_all(LOG_PATH)
 
 def dedup_entities(ents):
     uniq = []
@@ -307,34 +308,25 @@ def log_query(query, intent, confidence, entities=None):
         "entities": [f"{e.get('entity','')}: {e.get('value','')}" for e in entities],
         "date": datetime.utcnow().isoformat()
     }
-    logs = load_logs()
-    if logs:
-        last = logs[-1]
-        try:
-            last_time = datetime.fromisoformat(last.get("date", "").replace("Z",""))
-        except Exception:
-            last_time = datetime.utcnow() - timedelta(seconds=10)
-        now_time = datetime.utcnow()
-        is_same = (
-            last.get("query") == entry["query"] and
-            last.get("intent") == entry["intent"] and
-            abs(float(last.get("confidence", 0.0)) - entry["confidence"]) < 1e-6 and
-            (now_time - last_time).total_seconds() <= 2
-        )
-        if is_same:
-            return last
-    logs.append(entry)
-    save_logs(logs)
-    return entry
+    # O(1) append; repeats of the last query within 2s (Streamlit reruns) are dropped
+    return query_log.append(entry, LOG_PATH)
+
+def serving_model_dir():
+    # the registry's CURRENT version if one was published, else the legacy MODEL_DIR
+    return model_registry.resolve_model_dir(legacy_dir=MODEL_DIR)[0]
 
 def model_exists():
-    return os.path.isdir(MODEL_DIR) and any(Path(MODEL_DIR).iterdir())
+    model_dir = serving_model_dir()
+    return os.path.isdir(model_dir) and any(Path(model_dir).iterdir())
 
 # ================================
 # Classifier & extractor
 # ================================
+from nlu_engine import training_jobs, model_registry
+from nlu_engine.faq_retriever import get_faq_retriever
+
 try:
-    from nlu_engine.infer_intent import IntentClassifier
+    from nlu_engine.infer_intent import IntentClassifier, get_classifier
     from nlu_engine.entity_extractor import EntityExtractor
     classifier_available = True
 except Exception:
@@ -376,7 +368,8 @@ except Exception:
                         res.append({"entity": p["label"], "value": kw})
             return res
 
-IC = IntentClassifier(model_dir=MODEL_DIR) if classifier_available else IntentClassifier()
+# cached per model directory, so a newly published version is picked up on the next rerun
+IC = get_classifier(serving_model_dir(), load_mode="eager") if classifier_available else IntentClassifier()
 EE = EntityExtractor(ENTITIES_FILE)
 
 # ================================
@@ -431,6 +424,50 @@ def entity_color(idx):
         f"linear-gradient(135deg,{PALETTE['primary']},#60a5fa)",
     ][idx % 8]
 
+def _render_training_job_body():
+    job = training_jobs.latest_job()
+    if not job:
+        st.info("No training jobs yet.")
+        return
+    prog = training_jobs.read_progress(job["id"])
+    status = job["status"]
+    st.markdown(f"**Job** `{job['id']}` — status: **{status}**")
+    total = prog["total_steps"] or 0
+    if total:
+        st.progress(min(1.0, prog["step"] / total))
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Step", f"{prog['step']}/{total or '?'}")
+    c2.metric("Loss", f"{prog['loss']:.4f}" if prog["loss"] is not None else "—")
+    c3.metric("Eval accuracy", format_conf(prog["eval_accuracy"]) if prog["eval_accuracy"] is not None else "—")
+    if prog["losses"]:
+        loss_df = pd.DataFrame(prog["losses"], columns=["step", "loss"])
+        st.plotly_chart(px.line(loss_df, x="step", y="loss", title="Training loss"), use_container_width=True)
+
+    if status == training_jobs.STATUS_RUNNING:
+        if st.button("Cancel training", key=f"cancel_{job['id']}"):
+            training_jobs.cancel_job(job["id"])
+            st.warning("Training cancelled.")
+    elif status == training_jobs.STATUS_VALIDATING:
+        st.info("Training finished — validating the new model before it goes live.")
+    elif status == training_jobs.STATUS_PROMOTED:
+        st.success(f"New model passed validation and is now serving ({format_conf(job['validation'].get('eval_accuracy'))} held-out accuracy).")
+    elif status == training_jobs.STATUS_REJECTED:
+        st.error(f"Model rejected by validation gate: {job['validation'].get('reason', '')} The previous model is still serving.")
+    elif status == training_jobs.STATUS_FAILED:
+        st.error(f"Training failed: {job.get('error', '')}")
+        with st.expander("Training log"):
+            st.code(training_jobs.log_tail(job["id"], 40))
+    elif status == training_jobs.STATUS_CANCELLED:
+        st.warning("Training was cancelled; the previous model is still serving.")
+
+# Auto-refresh the job panel where st.fragment exists; older Streamlit gets a refresh button.
+if hasattr(st, "fragment"):
+    render_training_job = st.fragment(run_every=2)(_render_training_job_body)
+else:
+    def render_training_job():
+        _render_training_job_body()
+        st.button("🔄 Refresh progress", key="refresh_training_job")
+
 # ================================
 # Header
 # ================================
@@ -441,14 +478,13 @@ st.markdown("<h1 style='margin-bottom:6px; color:#e5e7eb;'>BankBot Admin</h1>" i
 # Dashboard
 # ================================
 if st.session_state["page"] == "Dashboard":
-    df = df_from_logs()
-    total_queries = len(df)
+    # headline numbers come from the rollup tables, not a scan of the log
+    total_queries, avg_conf = query_log.summary(LOG_PATH)
     intents_list = load_intents()
     intents_count = len(intents_list)
     entity_defs = load_entities()
     entities_count = len(entity_defs)
-    avg_conf = df["confidence"].mean() if not df.empty else 0.0
-    avg_conf_display = format_conf(avg_conf) if not df.empty else "N/A"
+    avg_conf_display = format_conf(avg_conf) if avg_conf is not None else "N/A"
 
     c1, c2, c3, c4 = st.columns(4)
     with c1:
@@ -485,15 +521,16 @@ if st.session_state["page"] == "Dashboard":
         with fcol3:
             min_conf = st.slider("Min confidence", 0.0, 1.0, 0.0, 0.01)
 
-        dff = df.copy()
-        if start: dff = dff[dff["date"] >= pd.to_datetime(start)]
-        if end: dff = dff[dff["date"] <= pd.to_datetime(end)]
-        dff = dff[dff["confidence"] >= min_conf]
-        dff = dff.sort_values("date", ascending=False).reset_index(drop=True)
+        # finished days live in Parquet partitions, compacted off the render path;
+        # the count and the newest-first preview are pushed down into the scans
+        query_archive.compact_in_background(LOG_PATH)
+        n_records = query_archive.count_filtered(start=start, end=end, min_confidence=min_conf, db_path=LOG_PATH)
+        dff = query_archive.read_recent(HISTORY_PREVIEW_ROWS, ["query", "intent", "confidence", "entities", "date"],
+                                        start=start, end=end, min_confidence=min_conf, db_path=LOG_PATH)
 
-        st.write(f"Records: {len(dff)}")
+        st.write(f"Records: {n_records}" + (f" (showing the latest {len(dff)})" if n_records > len(dff) else ""))
         if not dff.empty:
-            for _, r in dff.head(200).iterrows():
+            for _, r in dff.iterrows():
                 dt = r["date"].strftime("%Y-%m-%d %H:%M")
                 st.markdown(
                     f"<div class='history-item'>"
@@ -512,44 +549,61 @@ if st.session_state["page"] == "Dashboard":
                 except Exception:
                     dff_display["confidence"] = dff_display.get("confidence")
                 st.dataframe(dff_display, height=380)
-                dff_export = dff.copy()
-                try:
-                    dff_export["confidence"] = dff_export["confidence"].apply(format_conf)
-                except Exception:
-                    pass
-                st.download_button("Download CSV", dff_export.to_csv(index=False).encode("utf-8"), "query_history.csv", "text/csv")
+                if n_records > len(dff):
+                    st.caption(f"Latest {len(dff)} of {n_records} records; export the CSV for all of them.")
+                # written to disk batch by batch instead of encoding the DataFrame in memory;
+                # the prepared file only stands for the filters it was exported with
+                export_filters = (start, end, min_conf)
+                prepared = st.session_state.get("export")
+                if prepared and prepared[0] != export_filters:
+                    st.session_state.pop("export", None)
+                    prepared = None
+                if st.button("Prepare CSV export"):
+                    export_path, n_rows = query_archive.export_csv(start=start, end=end, min_confidence=min_conf, db_path=LOG_PATH)
+                    prepared = (export_filters, export_path)
+                    st.session_state["export"] = prepared
+                    st.caption(f"{n_rows} rows exported to {export_path}")
+                export_path = prepared[1] if prepared else None
+                if export_path and os.path.exists(export_path):
+                    size_mb = os.path.getsize(export_path) / 1e6
+                    if size_mb <= EXPORT_DOWNLOAD_MAX_MB:
+                        with open(export_path, "rb") as f:
+                            st.download_button("Download CSV", f, "query_history.csv", "text/csv")
+                    else:
+                        st.caption(f"Export is {size_mb:.0f} MB, over the {EXPORT_DOWNLOAD_MAX_MB} MB browser download "
+                                   f"limit; copy it from {export_path} on the server.")
         else:
             st.info("No records match the filters.")
 
     elif view == "confidence":
         st.markdown("### Confidence — intents")
-        if df.empty:
+        totals = query_log.intent_totals(LOG_PATH)
+        if not totals:
             st.info("No logs yet.")
         else:
-            avg_by_intent = df.groupby("intent")["confidence"].mean().reset_index().sort_values("confidence", ascending=False)
+            avg_by_intent = sorted(totals, key=lambda t: t[2], reverse=True)
             def render_intent_card(row):
-                intent_name = row["intent"]
-                avg_val = row["confidence"]
-                df_int = df[df["intent"] == intent_name]
+                intent_name, n_queries, avg_val = row
                 st.markdown(
-                    f"<div class='intent-card'><div style='font-weight:800'>{intent_name.replace('_',' ').title()}</div><div style='margin-top:6px;'>Avg: <strong>{format_conf(avg_val)}</strong> • {len(df_int)} queries</div></div>",
+                    f"<div class='intent-card'><div style='font-weight:800'>{intent_name.replace('_',' ').title()}</div><div style='margin-top:6px;'>Avg: <strong>{format_conf(avg_val)}</strong> • {n_queries} queries</div></div>",
                     unsafe_allow_html=True
                 )
                 if st.button(f"Open {intent_name}", key=f"open_conf_{intent_name}"):
                     st.session_state["selected_intent"] = intent_name
                     st.session_state["view"] = "confidence_intent"
-            render_cards([r for _, r in avg_by_intent.iterrows()], cols=2, card_fn=render_intent_card)
+            render_cards(avg_by_intent, cols=2, card_fn=render_intent_card)
 
     elif view == "confidence_intent" and st.session_state.get("selected_intent"):
         sel = st.session_state["selected_intent"]
         st.markdown(f"### {sel.replace('_',' ').title()} — confidence details")
-        df_sel = df[df["intent"] == sel].sort_values("date", ascending=False)
-        if df_sel.empty:
+        recent_sel = query_log.recent(50, LOG_PATH, intent=sel)
+        if not recent_sel:
             st.info("No queries for this intent.")
         else:
             st.markdown("#### Recent queries")
-            for _, r in df_sel.head(50).iterrows():
-                dt = r["date"].strftime("%Y-%m-%d %H:%M") if not pd.isnull(r["date"]) else ""
+            for r in recent_sel:
+                dt = pd.to_datetime(r["date"], errors="coerce")
+                dt = dt.strftime("%Y-%m-%d %H:%M") if not pd.isnull(dt) else ""
                 st.markdown(
                     f"<div class='history-item'><div class='history-query'>{r['query']}</div>"
                     f"<div style='display:flex; gap:8px; align-items:center;'>"
@@ -557,11 +611,13 @@ if st.session_state["page"] == "Dashboard":
                     f"<span class='badge badge-date'>{dt}</span></div></div>",
                     unsafe_allow_html=True
                 )
-            avg_conf_val = df_sel['confidence'].mean()
+            avg_conf_val = next((t[2] for t in query_log.intent_totals(LOG_PATH) if t[0] == sel), None)
             st.markdown(f"- Average confidence: **{format_conf(avg_conf_val)}**")
-            df_sel["bucket"] = pd.cut(df_sel["confidence"], bins=[0,0.2,0.4,0.6,0.8,1.0],
-                                      labels=["0-0.2","0.2-0.4","0.4-0.6","0.6-0.8","0.8-1.0"]) 
-            bucket_counts = df_sel["bucket"].value_counts().sort_index()
+            # fold the rollup's fine-grained buckets into five pie slices
+            bucket_names = ["0-0.2","0.2-0.4","0.4-0.6","0.6-0.8","0.8-1.0"]
+            bucket_counts = pd.Series(0, index=bucket_names)
+            for _, b, n in query_log.confidence_histogram(LOG_PATH, intent=sel):
+                bucket_counts.iloc[b * len(bucket_names) // query_log.CONF_BUCKETS] += n
             fig = px.pie(values=bucket_counts.values, names=bucket_counts.index, title="Confidence buckets",
                          hole=0.35, color_discrete_sequence=["#ef4444", "#f59e0b", "#fbbf24", "#84cc16", "#10b981"])
             st.plotly_chart(fig, use_container_width=True)
@@ -725,37 +781,41 @@ elif st.session_state["page"] == "Training":
             st.success("Training model found")
 
     st.markdown("### Parameters")
-    epochs = st.number_input("Epochs", value=50)
-    batch = st.number_input("Batch size", value=16)
-    lr = st.number_input("Learning rate", value=0.01, format="%.6f")
+    mode = st.radio("Mode", ["Full retrain", "Incremental"], horizontal=True,
+                    help="Incremental fine-tunes the serving model on pending examples plus a replay sample of old ones, "
+                         "and is rejected if held-out accuracy drops.")
+    epochs = st.number_input("Epochs", value=3, min_value=1)
+    batch = st.number_input("Batch size", value=8, min_value=1)
+    lr = st.number_input("Learning rate", value=0.00002, format="%.6f")
+    min_acc = st.slider("Validation gate — minimum held-out accuracy", 0.0, 1.0, training_jobs.MIN_ACCURACY, 0.01)
     if st.button("Start training"):
-        st.info("Training started (simulated).")
-        progress = st.progress(0)
-        status = st.empty()
-        for i in range(100):
-            time.sleep(0.03)
-            progress.progress(i+1)
-            status.text(f"Progress: {i+1}% — epochs={epochs}, batch={batch}, lr={lr}")
-        st.success("Training completed (simulated)")
-        # Create placeholder model files to indicate a trained model exists
         try:
-            Path(MODEL_DIR).mkdir(parents=True, exist_ok=True)
-            (Path(MODEL_DIR) / "model.bin").write_text("trained-placeholder")
-            st.success("Model files created.")
+            job = training_jobs.start_job(epochs=epochs, batch_size=batch, lr=lr, intents_path=INTENTS_PATH, min_accuracy=min_acc,
+                                         mode="incremental" if mode == "Incremental" else "full")
+            st.info(f"Training job {job['id']} started in the background.")
+        except RuntimeError as e:
+            st.warning(str(e))
         except Exception as e:
-            st.error(f"Failed creating model files: {e}")
-        # Promote new examples to trained
-        intents = load_intents()
-        changed = False
-        for it in intents:
-            new_ex = it.get("new_examples", [])
-            if new_ex:
-                it["examples"].extend([{"text": e, "status": "trained"} for e in new_ex])
-                it["new_examples"] = []
-                changed = True
-        if changed:
-            save_intents(intents)
-            st.info("New examples promoted to trained.")
+            st.error(f"Could not start training: {e}")
+
+    st.markdown("### Training job")
+    render_training_job()
+
+    st.markdown("### Model versions")
+    versions = model_registry.list_versions()
+    current = model_registry.current_version()
+    if not versions:
+        st.info(f"No published versions yet — serving {MODEL_DIR}.")
+    else:
+        for v in reversed(versions):
+            metrics = load_json(os.path.join(model_registry.VERSIONS_DIR, v, "metrics.json"), {})
+            acc = metrics.get("eval_accuracy")
+            marker = " — **serving**" if v == current else ""
+            st.markdown(f"- `{v}` • accuracy {format_conf(acc) if acc is not None else 'n/a'}{marker}")
+        prev = model_registry.previous_version()
+        if prev and st.button(f"Roll back to {prev}"):
+            model_registry.rollback()
+            st.success(f"Now serving {prev}. Running chat sessions switch over within seconds.")
 
 # ================================
 # Manage Intents 
@@ -816,8 +876,12 @@ elif st.session_state["page"] == "FAQs":
         "What is the interest rate on savings?": "Currently 7.5%. Check Rates page for updates.",
         "How to locate the nearest ATM?": "Ask 'Where is the nearest ATM?' and allow location access.",
     })
+    # BM25 inverted index, kept in sync with faq_data.json across reruns
+    faq_index = get_faq_retriever(FAQ_PATH)
+    if not os.path.exists(FAQ_PATH):
+        faq_index.sync(faqs)
     search = st.text_input("Search FAQs")
-    filtered = {q:a for q,a in faqs.items() if search.lower() in q.lower() or search.lower() in a.lower()} if search else faqs
+    filtered = {r["question"]: r["answer"] for r in faq_index.search(search, k=20)} if search else faqs
     if filtered:
         for q,a in filtered.items():
             with st.expander(q):
@@ -831,6 +895,7 @@ elif st.session_state["page"] == "FAQs":
         if q_text.strip() and a_text.strip():
             faqs[q_text.strip()] = a_text.strip()
             save_json(FAQ_PATH, faqs)
+            faq_index.add(q_text.strip(), a_text.strip())
             st.success("FAQ saved")
         else:
             st.warning("Provide both question and answer")
@@ -842,6 +907,7 @@ elif st.session_state["page"] == "FAQs":
                 data = json.load(uploaded)
                 if isinstance(data, dict):
                     save_json(FAQ_PATH, data)
+                    faq_index.sync({str(q): str(a) for q, a in data.items()})
                     st.success("Imported FAQs")
                 else:
                     st.error("Invalid format")
@@ -856,25 +922,28 @@ elif st.session_state["page"] == "FAQs":
 # ================================
 elif st.session_state["page"] == "Analytics":
     st.markdown("## Analytics")
-    df = df_from_logs()
-    if df.empty:
+    # everything on this page reads the rollup tables maintained by query_log
+    totals = query_log.intent_totals(LOG_PATH)
+    if not totals:
         st.info("No logs yet.")
     else:
-        unique_intents = sorted(df["intent"].unique().tolist())
+        unique_intents = sorted(t[0] for t in totals)
         palette_seq = [PALETTE["primary"], PALETTE["accent"], PALETTE["indigo"], PALETTE["purple"],
                        PALETTE["pink"], PALETTE["teal"], PALETTE["success"], PALETTE["warning"], PALETTE["amber"], PALETTE["rose"]]
         color_map = {i: c for i, c in zip(unique_intents, palette_seq)}
 
         st.markdown("### Intent distribution (donut)")
-        counts = df["intent"].value_counts().reset_index()
-        counts.columns = ["intent", "count"]
+        counts = pd.DataFrame([(t[0], t[1]) for t in totals], columns=["intent", "count"])
         fig_donut = px.pie(counts, names="intent", values="count", hole=0.5,
                            color="intent", color_discrete_map=color_map,
                            title="Intents by count")
         st.plotly_chart(fig_donut, use_container_width=True)
 
         st.markdown("### Queries over time (with rolling averages)")
-        ts = df.set_index("date").resample("D").size().reset_index()
+        daily = pd.Series(dict(query_log.daily_counts(LOG_PATH)))
+        daily.index = pd.to_datetime(daily.index)
+        # days without queries have no rollup row; fill them so the rolling windows are per calendar day
+        ts = daily.reindex(pd.date_range(daily.index.min(), daily.index.max(), freq="D"), fill_value=0).reset_index()
         ts.columns = ["date", "count"]
         ts["roll7"] = ts["count"].rolling(7).mean()
         ts["roll30"] = ts["count"].rolling(30).mean()
@@ -887,22 +956,20 @@ elif st.session_state["page"] == "Analytics":
 
         st.markdown("### Confidence distribution")
         try:
-            conf_hist = px.histogram(df, x="confidence", nbins=20, title="Confidence histogram",
-                                     color="intent", color_discrete_map=color_map, marginal="rug")
+            hist = pd.DataFrame(query_log.confidence_histogram(LOG_PATH), columns=["intent", "bucket", "count"])
+            hist["confidence"] = (hist["bucket"] + 0.5) / query_log.CONF_BUCKETS
+            conf_hist = px.bar(hist, x="confidence", y="count", title="Confidence histogram",
+                               color="intent", color_discrete_map=color_map)
+            conf_hist.update_layout(bargap=0.05)
+            conf_hist.update_xaxes(range=[0, 1])
             st.plotly_chart(conf_hist, use_container_width=True)
         except Exception:
             st.info("Not enough data for confidence histogram.")
 
         st.markdown("### Entity extraction frequency")
-        entity_series = []
-        for row in load_logs():
-            for e in row.get("entities", []):
-                label = e.split(":")[0].strip()
-                if label:
-                    entity_series.append(label)
-        if entity_series:
-            edf = pd.Series(entity_series).value_counts().reset_index()
-            edf.columns = ["entity", "count"]
+        entity_rows = query_log.entity_totals(LOG_PATH)
+        if entity_rows:
+            edf = pd.DataFrame(entity_rows, columns=["entity", "count"])
             fig_ent = px.bar(edf, x="entity", y="count", color="entity", title="Entity frequency")
             fig_ent.update_layout(showlegend=False)
             st.plotly_chart(fig_ent, use_container_width=True)
@@ -918,7 +985,7 @@ elif st.session_state["page"] == "Help":
     with colA:
         st.markdown(f"<div class='card' style='background: linear-gradient(135deg,{PALETTE['primary']}, #3b82f6); color:#fff;'><strong>Dashboard</strong><div class='metric-info'>Enhanced history view, colorful metrics.</div></div>", unsafe_allow_html=True)
         st.markdown(f"<div class='card' style='background: linear-gradient(135deg,{PALETTE['success']}, #22c55e); color:#fff;'><strong>User Queries</strong><div class='metric-info'>Analyze queries, dedup entities, log results.</div></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='card' style='background: linear-gradient(135deg,{PALETTE['warning']}, #f59e0b); color:#fff;'><strong>Training</strong><div class='metric-info'>Simulate progress; promote new examples to trained.</div></div>", unsafe_allow_html=True)
+        st.markdown(f"<div class='card' style='background: linear-gradient(135deg,{PALETTE['warning']}, #f59e0b); color:#fff;'><strong>Training</strong><div class='metric-info'>Background training with live progress; validated models go live.</div></div>", unsafe_allow_html=True)
     with colB:
         st.markdown(f"<div class='card' style='background: linear-gradient(135deg,{PALETTE['accent']}, {PALETTE['primary']}); color:#fff;'><strong>Manage Intents</strong><div class='metric-info'>Add intents and new examples; compact spacing.</div></div>", unsafe_allow_html=True)
         st.markdown(f"<div class='card' style='background: linear-gradient(135deg,{PALETTE['purple']}, {PALETTE['pink']}); color:#fff;'><strong>Entities</strong><div class='metric-info'>Pattern-only, deduped; drilldowns per entity.</div></div>", unsafe_allow_html=True)
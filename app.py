@@ -1,13 +1,16 @@
 import streamlit as st
-import datetime
 import io
 import pandas as pd
-import altair as alt
 
 from dialogue_manager.dialogue_handler import DialogueHandler
+import chat_window
+import ledger_cache
 from database.db import init_db
 from database import bank_crud
 from database import db as database_db
+from database import profiler as db_profiler
+from nlu_engine.faq_matcher import get_faq_matcher
+from monitoring import tracing, metrics, memory
 
 # Groq LLM 
 from dotenv import load_dotenv
@@ -42,10 +45,15 @@ def set_page_no_rerun(page_name: str):
 # Init DB and session
 # -------------------------
 init_db()
+# Prometheus /metrics on BANKBOT_METRICS_PORT (once per process)
+metrics.serve()
 if "handler" not in st.session_state:
     st.session_state.handler = DialogueHandler()
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+# chat_history (capped), chat_archive and the render window
+chat_window.init_state(st.session_state)
+# RSS / sessions / models sampler (once per process) and this session's footprint
+memory.start_sampler()
+memory.track_session(st.session_state.handler, st.session_state.chat_history)
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 if "user" not in st.session_state:
@@ -271,33 +279,6 @@ div.stButton > button:first-child:hover {
     unsafe_allow_html=True,
 )
 
-_AUTO_SCROLL_JS = """
-<script>
-    function scrollWindowDown() {
-        // Scroll the main window to the bottom
-        window.scrollTo({
-            top: document.body.scrollHeight,
-            behavior: 'smooth'
-        });
-        
-        // Also try scrolling the main streamlit container just in case
-        const mainContainer = window.parent.document.querySelector('.main .block-container');
-        if (mainContainer) {
-            mainContainer.scrollTop = mainContainer.scrollHeight;
-        }
-    }
-    
-    // Run on load
-    setTimeout(scrollWindowDown, 300); // Slight delay to allow render
-    
-    // Observe DOM changes (new messages)
-    const observer = new MutationObserver(() => {
-        setTimeout(scrollWindowDown, 100);
-    });
-    observer.observe(document.body, { childList: true, subtree: true });
-</script>
-"""
-
 # -------------------------
 # Sidebar
 # -------------------------
@@ -328,72 +309,11 @@ with st.sidebar:
 # Helpers
 # -------------------------
 def add_chat(role: str, text: str, indicator: str = "none"):
-    st.session_state.chat_history.append((role, text, indicator, datetime.datetime.now()))
+    chat_window.add_message(st.session_state, role, text, indicator)
 
 def render_chat():
-    # We remove the fixed height container. Just a wrapper class.
-    st.markdown("<div class='chat-wrapper'>", unsafe_allow_html=True)
-    
-    for role, text, indicator, ts in st.session_state.chat_history:
-        safe_text = str(text).replace("<", "&lt;").replace(">", "&gt;")
-        time_str = ts.strftime("%I:%M %p")
-        
-        if role == "bot":
-            st.markdown(
-                f"""
-                <div class='bot-bubble'>
-                    <div style='display:flex; align-items:center; margin-bottom:5px;'>
-                        <span style='font-size:20px; margin-right:8px;'>🤖</span>
-                        <strong style='color:#005bea;'>Bankbot</strong>
-                    </div>
-                    {safe_text}
-                    <span class='timestamp'>{time_str}</span>
-                </div>
-                """, 
-                unsafe_allow_html=True
-            )
-        else:
-            st.markdown(
-                f"""
-                <div class='user-row'>
-                    <div class='user-bubble'>
-                        {safe_text}
-                        <span class='timestamp'>{time_str}</span>
-                    </div>
-                </div>
-                """, 
-                unsafe_allow_html=True
-            )
-            
-    st.markdown("</div>", unsafe_allow_html=True)
-    # Inject the scroll script
-    st.components.v1.html(_AUTO_SCROLL_JS, height=0)
-
-def transactions_to_dataframe(txns):
-    if not txns:
-        return pd.DataFrame(columns=["ID", "From", "To", "Amount", "Date", "Type"])
-    rows = [list(t)[:6] for t in txns]
-    df = pd.DataFrame(rows, columns=["ID", "From", "To", "Amount", "Date", "Type"])
-    try:
-        df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
-        df["Amount"] = pd.to_numeric(df["Amount"], errors='coerce').fillna(0)
-    except Exception:
-        pass
-    try:
-        df["_ts"] = df["Date"].dt.round('S')
-        group_cols = ["From", "To", "Amount", "_ts"]
-        to_drop = []
-        for _, grp in df.groupby(group_cols):
-            types = set(grp["Type"].astype(str).str.lower().tolist())
-            if "debit" in types and "credit" in types and len(grp) >= 2:
-                credits = grp[grp["Type"].astype(str).str.lower() == "credit"].index.tolist()
-                to_drop.extend(credits)
-        if to_drop:
-            df = df.drop(index=to_drop).reset_index(drop=True)
-        df = df.drop(columns=["_ts"], errors='ignore')
-    except Exception:
-        pass
-    return df
+    # only the latest window of messages, as one HTML block
+    chat_window.render_chat()
 
 def get_account_card_info(account_no: str):
     try:
@@ -440,14 +360,13 @@ if st.session_state.page == "Home":
                  try_rerun()
     else:
         st.markdown(f"<h2 style='color:#333;'>Overview for {st.session_state.user}</h2>", unsafe_allow_html=True)
-        txns = bank_crud.list_transactions_for_user(st.session_state.user)
-        df = transactions_to_dataframe(txns)
+        ledger = ledger_cache.get_ledger(st.session_state.user)
         
         # Styled Metrics
         m1, m2, m3 = st.columns(3)
-        total_tx = len(df)
-        credits = df[df["Type"].astype(str).str.lower() == "credit"]["Amount"].sum()
-        debits = df[df["Type"].astype(str).str.lower() == "debit"]["Amount"].sum()
+        total_tx = ledger.total_tx
+        credits = ledger.credits
+        debits = ledger.debits
         
         def metric_card(title, val, color_grad):
             st.markdown(f"""
@@ -605,12 +524,17 @@ elif st.session_state.page == "Chat":
         resp = st.session_state.handler.handle_message(user_input.strip(), current_user=st.session_state.user)
 
         # If handler produced a clear banking response, show it
-        if resp.get("message") and resp.get("message") != "unknown":
+        handled = resp.get("message") and resp.get("message") != "unknown"
+        # Otherwise try a local FAQ answer before paying for a remote LLM round trip
+        faq_hit = None if handled else get_faq_matcher().match(user_input.strip())
+        if handled:
             add_chat("bot", resp.get("message", ""), resp.get("indicator", "none"))
+        elif faq_hit:
+            add_chat("bot", faq_hit["answer"], "none")
         else:
             # Fallback to Groq LLM when intent is unknown or low-confidence
             if "llm" in st.session_state:
-                with st.spinner("Thinking..."):
+                with st.spinner("Thinking..."), tracing.span("llm.groq"):
                     llm_response = st.session_state.llm.invoke([HumanMessage(content=user_input.strip())])
                 add_chat("bot", llm_response.content, "none")
             else:
@@ -675,16 +599,12 @@ elif st.session_state.page == "Transactions":
     if not st.session_state.logged_in:
         st.warning("Please login to view transactions.")
     else:
-        txns = bank_crud.list_transactions_for_user(st.session_state.user)
-        if not txns:
+        ledger = ledger_cache.get_ledger(st.session_state.user)
+        if not ledger.txn_count:
             st.info("No transactions found for this user.")
         else:
-            df = transactions_to_dataframe(txns)
-            if not df.empty and "Date" in df.columns:
-                df["Date"] = df["Date"].dt.strftime('%Y-%m-%d %H:%M')
-
             st.dataframe(
-                df,
+                ledger.display_df(),
                 use_container_width=True,
                 hide_index=True,
                 column_config={
@@ -752,37 +672,22 @@ elif st.session_state.page == "Dashboard":
     if not st.session_state.logged_in:
         st.warning("Please login.")
     else:
-        txns = bank_crud.list_transactions_for_user(st.session_state.user)
-        if not txns:
+        ledger = ledger_cache.get_ledger(st.session_state.user)
+        if not ledger.txn_count:
             st.info("No activity to analyze.")
         else:
-            df = transactions_to_dataframe(txns)
-            
             # Layout
             c_left, c_right = st.columns([2, 1])
             
             with c_left:
                 st.subheader("Cash Flow Trend")
-                if not df.empty and "Date" in df.columns:
-                    chart_data = df.groupby(df["Date"].dt.date)["Amount"].sum().reset_index()
-                    c = alt.Chart(chart_data).mark_area(
-                        line={'color':'#764ba2'},
-                        color=alt.Gradient(
-                            gradient='linear',
-                            stops=[alt.GradientStop(color='rgba(118, 75, 162, 0.5)', offset=0),
-                                   alt.GradientStop(color='rgba(118, 75, 162, 0.0)', offset=1)],
-                            x1=1, x2=1, y1=1, y2=0
-                        )
-                    ).encode(
-                        x=alt.X('Date:T', axis=alt.Axis(format='%b %d', title='Date')),
-                        y=alt.Y('Amount:Q', title='Volume (₹)'),
-                        tooltip=['Date', 'Amount']
-                    ).properties(height=350).configure_view(strokeWidth=0)
+                c = ledger.cashflow_chart()
+                if c is not None:
                     st.altair_chart(c, use_container_width=True)
 
             with c_right:
                 st.subheader("Recent Activity")
-                recent = df.sort_values("Date", ascending=False).head(4)
+                recent = ledger.recent()
                 for _, r in recent.iterrows():
                     typ = str(r["Type"]).upper()
                     amt = r["Amount"]
@@ -813,45 +718,16 @@ elif st.session_state.page == "Dashboard":
             
             with col1:
                 # Pie chart for credits vs debits
-                try:
-                    pie_df = df.groupby(df["Type"].astype(str).str.title()).agg({"Amount":"sum"}).reset_index()
-                    pie_df.columns = ["Type","Amount"]
-                    pie = alt.Chart(pie_df).mark_arc(innerRadius=60, outerRadius=100).encode(
-                        theta=alt.Theta(field="Amount", type="quantitative"),
-                        color=alt.Color(field="Type", type="nominal", scale=alt.Scale(range=['#10B981','#EF4444']), legend=None),
-                        tooltip=['Type','Amount']
-                    ).properties(height=300)
+                pie = ledger.type_pie_chart()
+                if pie is not None:
                     st.altair_chart(pie, use_container_width=True)
                     st.caption("Green: Credit (In), Red: Debit (Out)")
-                except Exception:
-                    pass
 
             with col2:
                 # Bar chart for top counterparties
-                try:
-                    accs = bank_crud.list_user_accounts(st.session_state.user)
-                    acc_set = set([a[0] for a in accs])
-                    def counterpart(row):
-                        f = row.get('From') if isinstance(row, dict) else row['From']
-                        t = row.get('To') if isinstance(row, dict) else row['To']
-                        if f in acc_set and t not in acc_set: return t
-                        if t in acc_set and f not in acc_set: return f
-                        return t if f in acc_set else f
-
-                    cp = df.copy()
-                    cp['Counterparty'] = cp.apply(lambda r: counterpart(r), axis=1)
-                    top_cp = cp.groupby('Counterparty')['Amount'].sum().abs().reset_index().sort_values('Amount', ascending=False).head(5)
-                    
-                    if not top_cp.empty:
-                        bar = alt.Chart(top_cp).mark_bar(cornerRadius=5).encode(
-                            x=alt.X('Amount:Q', title='Volume'),
-                            y=alt.Y('Counterparty:N', sort='-x'),
-                            color=alt.Color('Amount:Q', scale=alt.Scale(scheme='purples')),
-                            tooltip=['Counterparty','Amount']
-                        ).properties(height=300)
-                        st.altair_chart(bar, use_container_width=True)
-                except Exception:
-                    pass
+                bar = ledger.counterparty_chart()
+                if bar is not None:
+                    st.altair_chart(bar, use_container_width=True)
 
 # --- ADMIN ---
 elif st.session_state.page == "Admin":
@@ -859,7 +735,7 @@ elif st.session_state.page == "Admin":
     
     with st.container():
         st.markdown("<div style='background:white; padding:20px; border-radius:15px; box-shadow:0 5px 15px rgba(0,0,0,0.05);'>", unsafe_allow_html=True)
-        t1, t2 = st.tabs(["👤 Create User", "🏦 Create Account"])
+        t1, t2, t3, t4 = st.tabs(["👤 Create User", "🏦 Create Account", "⏱ Latency", "🧠 Memory"])
         
         with t1:
             c1, c2 = st.columns(2)
@@ -890,6 +766,58 @@ elif st.session_state.page == "Admin":
                     st.success(f"Account {acc_no} created.")
                 else:
                     st.error("Invalid input.")
+
+        with t3:
+            spans = tracing.snapshot()
+            if spans:
+                st.caption("Per-stage latency in ms since the app process started (slowest p95 first).")
+                st.dataframe(pd.DataFrame(spans), use_container_width=True, hide_index=True)
+                with st.expander("Prometheus export"):
+                    st.code(tracing.export_text(), language="text")
+            else:
+                st.info("No spans recorded yet. Send a few chat messages first.")
+            if st.button("Reset latency stats"):
+                tracing.reset()
+                try_rerun()
+
+            st.markdown("**SQL statements**")
+            if db_profiler.PROFILE_ENABLED:
+                st.caption(f"Top statements by total time; slower than {db_profiler.SLOW_MS:.0f} ms are logged to {db_profiler.SLOW_LOG_PATH} with their query plan.")
+                top = db_profiler.summary(top=20)
+                if top:
+                    st.dataframe(pd.DataFrame(top)[["statement", "calls", "total_ms", "mean_ms", "max_ms", "rows", "slow"]],
+                                 use_container_width=True, hide_index=True)
+                slow = db_profiler.recent_slow()
+                if slow:
+                    with st.expander(f"Recent slow statements ({len(slow)})"):
+                        for s in reversed(slow[-20:]):
+                            st.code(f"{s['time']}  {s['ms']:.1f} ms  rows={s['rows']}\n{s['statement']}\n" + "\n".join(s["plan"] or []), language="text")
+            else:
+                st.caption("Statement profiling is off. Start the app with BANKBOT_DB_PROFILE=1 to record it.")
+
+        with t4:
+            if st.button("Sample now"):
+                memory.sample()
+            mem = memory.latest()
+            if mem:
+                m1, m2, m3, m4 = st.columns(4)
+                m1.metric("Process RSS", f"{mem['rss_mb']:.0f} MB" if mem["rss_mb"] else "n/a")
+                m2.metric("Models", f"{mem['models_mb']:.0f} MB")
+                m3.metric("Live sessions", mem["sessions"])
+                m4.metric("Avg chat turns", f"{mem['chat_history']['avg_turns']:.1f}")
+                st.caption(f"Sampled {mem['time']}. Average session ≈ {mem['avg_session_kb']:.1f} KB "
+                           f"(history + dialogue state); live objects: {mem['live']}")
+                hist = pd.DataFrame([{"time": s["time"], "RSS MB": s["rss_mb"], "models MB": s["models_mb"]}
+                                     for s in memory.samples()])
+                if len(hist) > 1:
+                    st.line_chart(hist.set_index("time"))
+                if mem["models"]:
+                    st.dataframe(pd.DataFrame(mem["models"]), use_container_width=True, hide_index=True)
+                if mem["top_allocators"]:
+                    st.markdown("**Top allocators (tracemalloc)**")
+                    st.dataframe(pd.DataFrame(mem["top_allocators"]), use_container_width=True, hide_index=True)
+                else:
+                    st.caption("Start the app with BANKBOT_TRACEMALLOC=1 to see top allocating source lines.")
         st.markdown("</div>", unsafe_allow_html=True)
 
 # -------------------------
@@ -0,0 +1,139 @@
+# benchmarks/common.py
+#
+# Shared pieces for the benchmark and load-test scripts: a throwaway seeded
+# database, a keyword stub for the NLU (so dialogue numbers measure the dialogue
+# manager and SQLite, not the transformer), scripted chat flows and a timer.
+#
+# The database modules read BANKBOT_DB_PATH when they are imported, so call
+# use_temp_db() before anything imports database.* / dialogue_manager.*.
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def use_temp_db(path=None):
+    """Point BANKBOT_DB_PATH at a fresh file and seed it with init_sample_data."""
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="bankbot-bench-"), "bankbot.db")
+    if os.path.exists(path):
+        os.remove(path)
+    os.environ["BANKBOT_DB_PATH"] = path
+
+    from database import init_sample_data
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        init_sample_data.seed()
+    return path
+
+
+def drop_temp_db(path):
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+# -----------------------
+# Stub NLU
+# -----------------------
+STUB_RULES = (
+    ("transfer_money", ("transfer", "send money", "pay ")),
+    ("check_balance", ("balance", "how much")),
+    ("card_block", ("block", "lost card", "stolen")),
+    ("find_atm", ("atm",)),
+)
+
+
+class StubNLU:
+    """Keyword intent rules plus the real regex EntityExtractor; same process() contract as NLUProcessor."""
+
+    def __init__(self, latency_s=0.0):
+        from nlu_engine.entity_extractor import EntityExtractor
+
+        self.latency_s = latency_s
+        self.entity_extractor = EntityExtractor()
+
+    def process(self, text):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        low = str(text).lower()
+        entities = self.entity_extractor.extract(text)
+        for intent, words in STUB_RULES:
+            if any(w in low for w in words):
+                return intent, 0.99, entities
+        return "unknown", 0.30, entities
+
+
+# -----------------------
+# Scripted flows (seed users from database/init_sample_data.py)
+# -----------------------
+# (text, from_control): from_control turns are what the chat UI sends from its
+# dropdown / PIN / amount / confirm widgets.
+TRANSFER_FLOW = [
+    ("I want to transfer money", False),
+    ("Rani", True),
+    ("Priya", True),
+    ("Sneha", True),
+    ("1111", True),
+    ("10", True),
+    ("yes", True),
+]
+BALANCE_FLOW = [
+    ("check my balance", False),
+    ("Malar", True),
+    ("1111", True),
+    ("yes", True),
+]
+CARD_BLOCK_FLOW = [
+    ("please block my card", False),
+    ("Raj", True),
+    ("1111", True),
+    ("yes", True),
+]
+FLOWS = {"transfer": TRANSFER_FLOW, "balance": BALANCE_FLOW, "card_block": CARD_BLOCK_FLOW}
+FLOW_USER = "Monika"
+
+
+def run_flow(handler, turns, user=FLOW_USER):
+    """Drive one scripted flow; returns the final response."""
+    resp = None
+    for text, from_control in turns:
+        resp = handler.handle_message(text, current_user=user, from_control=from_control)
+    return resp
+
+
+# -----------------------
+# Timing
+# -----------------------
+def percentile(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+def summarize_ms(samples_ms, items_per_call=1):
+    vals = sorted(samples_ms)
+    total_s = sum(vals) / 1000.0
+    return {
+        "calls": len(vals),
+        "mean_ms": total_s * 1000.0 / len(vals) if vals else None,
+        "p50_ms": percentile(vals, 0.50),
+        "p95_ms": percentile(vals, 0.95),
+        "p99_ms": percentile(vals, 0.99),
+        "ops_per_s": (len(vals) * items_per_call) / total_s if total_s else None,
+    }
+
+
+def bench(fn, repeat=200, warmup=10, items_per_call=1, min_time_s=0.0):
+    """Time fn() repeat times (and at least min_time_s) after warmup calls."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < repeat or time.perf_counter() - start < min_time_s:
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return summarize_ms(samples, items_per_call)
@@ -0,0 +1,240 @@
+# benchmarks/load_test.py
+#
+# Multi-session load generator for one BankBot node.
+#
+#   python -m benchmarks.load_test --users 32 --rate 20 --duration 60
+#
+# Chat sessions arrive as a Poisson process at --rate sessions/s and are served
+# by --users concurrent simulated users, each with its own DialogueHandler (as
+# every Streamlit session has). A session is one seed customer from
+# database/init_sample_data.py playing a complete multi-turn conversation:
+# transfers, balance checks and card blocks through the UI control inputs, plus
+# cancels, mid-flow intent switches and off-topic questions answered by a stub
+# LLM with a fixed latency. Everything runs locally against a throwaway copy of
+# the seed database; the NLU is the keyword stub from benchmarks.common unless
+# --real_nlu is given.
+#
+# Reported: sessions and turns per second, turn/session latency percentiles,
+# how late sessions started versus their scheduled arrival (saturation shows up
+# here first), errors, and SQLite lock retries/failures.
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.common import StubNLU, drop_temp_db, percentile, use_temp_db
+
+# seed customers and their PINs (database/init_sample_data.py)
+SEED_PINS = {"Monika": "1111", "Priya": "1234", "Neha": "5678"}
+SCENARIO_WEIGHTS = {
+    "transfer": 0.35,
+    "balance": 0.25,
+    "card_block": 0.10,
+    "cancel": 0.10,
+    "switch": 0.10,
+    "off_topic": 0.10,
+}
+OFF_TOPIC = ["what is a mutual fund", "explain compound interest", "who is the RBI governor",
+             "how does a credit score work"]
+
+
+class StubLLM:
+    """Stands in for the Groq fallback: sleeps for a jittered latency, returns canned text."""
+
+    def __init__(self, latency_ms=300.0, jitter=0.3, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def invoke(self, text):
+        with self._lock:
+            self.calls += 1
+            factor = 1.0 + self._rng.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, self.latency_ms * factor) / 1000.0)
+        return f"(stub answer to: {text})"
+
+
+def _accounts(bank_crud):
+    """{user: [account display names]} for the seed users."""
+    return {u: [a[1] for a in bank_crud.list_user_accounts(u)] for u in SEED_PINS}
+
+
+def build_script(scenario, user, accounts, rng):
+    """Turns [(text, from_control)] for one session of ``scenario`` as ``user``."""
+    pin = SEED_PINS[user]
+    own = rng.choice(accounts[user])
+    if scenario == "transfer":
+        other = rng.choice([u for u in SEED_PINS if u != user])
+        return [("I want to transfer money", False), (own, True), (other, True),
+                (rng.choice(accounts[other]), True), (pin, True), (str(rng.randint(1, 50)), True), ("yes", True)]
+    if scenario == "balance":
+        return [("check my balance", False), (own, True), (pin, True), ("yes", True)]
+    if scenario == "card_block":
+        return [("please block my card", False), (own, True), (pin, True), ("yes", True)]
+    if scenario == "cancel":
+        return [("send money to my sister", False), (own, True), ("cancel", False)]
+    if scenario == "switch":
+        # a started flow is intent-locked, so the typed switch is re-prompted as flow
+        # input; the user cancels and starts the other flow, then declines to confirm
+        return [("check my balance", False), ("block card now", False), ("cancel", False),
+                ("block card now", False), (own, True), (pin, True), ("no", True)]
+    return [(rng.choice(OFF_TOPIC), False)]
+
+
+class LoadStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turn_ms = []
+        self.session_ms = []
+        self.start_lag_ms = []
+        self.llm_ms = []
+        self.scenarios = Counter()
+        self.outcomes = Counter()
+        self.errors = Counter()
+
+    def add_session(self, scenario, turn_ms, session_ms, lag_ms, llm_ms, outcome, error=None):
+        with self._lock:
+            self.turn_ms.extend(turn_ms)
+            self.session_ms.append(session_ms)
+            self.start_lag_ms.append(lag_ms)
+            self.llm_ms.extend(llm_ms)
+            self.scenarios[scenario] += 1
+            self.outcomes[outcome] += 1
+            if error:
+                self.errors[error] += 1
+
+
+def run_session(handler_factory, llm, scenario, user, turns, scheduled, stats):
+    lag_ms = (time.perf_counter() - scheduled) * 1000.0
+    handler = handler_factory()
+    turn_ms, llm_ms = [], []
+    outcome, error = "incomplete", None
+    start = time.perf_counter()
+    try:
+        for text, from_control in turns:
+            t0 = time.perf_counter()
+            resp = handler.handle_message(text, current_user=user, from_control=from_control)
+            if resp.get("message") == "unknown":
+                # the chat UI's fallback path
+                l0 = time.perf_counter()
+                llm.invoke(text)
+                llm_ms.append((time.perf_counter() - l0) * 1000.0)
+            turn_ms.append((time.perf_counter() - t0) * 1000.0)
+            msg = resp.get("message", "")
+            if resp.get("end_flow"):
+                outcome = "locked" if "database is locked" in msg.lower() else resp.get("indicator") or "none"
+    except Exception as e:
+        outcome, error = "exception", f"{type(e).__name__}: {e}"
+    stats.add_session(scenario, turn_ms, (time.perf_counter() - start) * 1000.0, lag_ms, llm_ms, outcome, error)
+
+
+def _pcts(vals):
+    vals = sorted(vals)
+    return {"count": len(vals), "p50_ms": percentile(vals, 0.5), "p95_ms": percentile(vals, 0.95),
+            "p99_ms": percentile(vals, 0.99), "max_ms": vals[-1] if vals else None}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=16, help="concurrent simulated users (worker threads)")
+    parser.add_argument("--rate", type=float, default=10.0, help="target session arrivals per second (Poisson)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of arrivals")
+    parser.add_argument("--llm_ms", type=float, default=300.0, help="stub LLM latency")
+    parser.add_argument("--nlu_ms", type=float, default=0.0, help="extra latency added to each stub NLU call")
+    parser.add_argument("--real_nlu", action="store_true", help="use NLUProcessor instead of the keyword stub")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="write the report to this file")
+    args = parser.parse_args()
+
+    db_path = use_temp_db()
+    from database import bank_crud
+    from dialogue_manager.dialogue_handler import DialogueHandler
+    from monitoring import metrics
+
+    if args.real_nlu:
+        from nlu_engine.nlu_router import NLUProcessor
+        nlu = NLUProcessor()
+    else:
+        nlu = StubNLU(latency_s=args.nlu_ms / 1000.0)
+    handler_factory = lambda: DialogueHandler(nlu=nlu)
+    llm = StubLLM(latency_ms=args.llm_ms, seed=args.seed)
+    accounts = _accounts(bank_crud)
+    metrics.reset()
+
+    rng = random.Random(args.seed)
+    names, weights = zip(*SCENARIO_WEIGHTS.items())
+    stats = LoadStats()
+    print(f"Load test: {args.users} users, {args.rate}/s arrivals for {args.duration}s, "
+          f"stub LLM {args.llm_ms:.0f}ms, NLU {'real' if args.real_nlu else 'stub'}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users, thread_name_prefix="loaduser") as pool:
+        next_at = start
+        while True:
+            next_at += rng.expovariate(args.rate)
+            if next_at - start > args.duration:
+                break
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            scenario = rng.choices(names, weights)[0]
+            user = rng.choice(list(SEED_PINS))
+            turns = build_script(scenario, user, accounts, rng)
+            pool.submit(run_session, handler_factory, llm, scenario, user, turns, next_at, stats)
+    elapsed = time.perf_counter() - start
+
+    lock_retries = sum(v for _, v in metrics.DB_LOCK_RETRIES.samples())
+    transfers = {f"{labels['result']}:{labels['reason']}": int(v) for labels, v in metrics.TRANSFERS.samples()}
+    sessions = len(stats.session_ms)
+    report = {
+        "config": vars(args),
+        "elapsed_s": elapsed,
+        "sessions": sessions,
+        "sessions_per_s": sessions / elapsed if elapsed else None,
+        "turns": len(stats.turn_ms),
+        "turns_per_s": len(stats.turn_ms) / elapsed if elapsed else None,
+        "turn_latency": _pcts(stats.turn_ms),
+        "session_latency": _pcts(stats.session_ms),
+        "start_lag": _pcts(stats.start_lag_ms),
+        "llm_calls": llm.calls,
+        "scenarios": dict(stats.scenarios),
+        "outcomes": dict(stats.outcomes),
+        "error_rate": stats.outcomes["exception"] / sessions if sessions else 0.0,
+        "errors": dict(stats.errors.most_common(10)),
+        "db_lock_retries": int(lock_retries),
+        "lock_failure_rate": stats.outcomes["locked"] / sessions if sessions else 0.0,
+        "transfers": transfers,
+    }
+    drop_temp_db(db_path)
+
+    def line(label, p):
+        fmt = lambda v: f"{v:8.2f}" if v is not None else "       -"
+        return f"  {label:<16} p50={fmt(p['p50_ms'])}  p95={fmt(p['p95_ms'])}  p99={fmt(p['p99_ms'])}  max={fmt(p['max_ms'])} ms"
+
+    print(f"\n{sessions} sessions / {report['turns']} turns in {elapsed:.1f}s  "
+          f"({report['sessions_per_s']:.1f} sessions/s, {report['turns_per_s']:.1f} turns/s)")
+    print(line("turn latency", report["turn_latency"]))
+    print(line("session", report["session_latency"]))
+    print(line("start lag", report["start_lag"]))
+    print(f"  outcomes         {report['outcomes']}")
+    print(f"  errors           {report['error_rate']:.2%} {report['errors'] or ''}")
+    print(f"  db lock retries  {report['db_lock_retries']}  lock failures {report['lock_failure_rate']:.2%}")
+    print(f"  transfers        {transfers}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
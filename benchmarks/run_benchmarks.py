@@ -0,0 +1,309 @@
+# benchmarks/run_benchmarks.py
+#
+# Reproducible micro-benchmarks for the hot paths:
+#
+#   python -m benchmarks.run_benchmarks                         # all suites
+#   python -m benchmarks.run_benchmarks --suites entities db    # a subset
+#   python -m benchmarks.run_benchmarks --suites ledger --ledger_rows 500000
+#   python -m benchmarks.run_benchmarks --save_baseline         # record a baseline
+#   python -m benchmarks.run_benchmarks --fail_on_regression    # CI gate
+#
+# Every run uses a fresh database seeded from database/init_sample_data.py, so
+# numbers do not depend on the state of bankbot.db. Results are written as JSON
+# (one entry per benchmark with calls, mean/p50/p95/p99 ms and ops/s) and, when
+# a baseline file exists, compared against it by p50 latency. The committed
+# benchmarks/baseline.json was recorded with the stub NLU on the seed data; p50s
+# are machine-specific, so re-record it with --save_baseline on the machine that
+# gates. --fail_on_regression without a baseline file is an error, and so is a
+# baseline recorded with different run parameters (RUN_PARAMS); without the
+# flag that comparison is skipped.
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.common import (FLOWS, FLOW_USER, StubNLU, bench, drop_temp_db, run_flow,
+                               use_temp_db)
+
+SUITES = ("nlu", "entities", "dialogue", "db", "ledger")
+RESULTS_PATH = "benchmarks/results/latest.json"
+BASELINE_PATH = "benchmarks/baseline.json"
+# p50 may grow by this fraction over the baseline before it counts as a regression
+DEFAULT_TOLERANCE = 0.15
+# meta fields that change what a benchmark measures; p50s are only comparable when they match
+RUN_PARAMS = ("repeat", "batch_size", "ledger_rows", "nlu")
+
+SHORT_TEXT = "send 5000 to account 700002"
+LONG_TEXT = (
+    "Hi, last week I tried to transfer ₹12,500 from my savings account ending 0001 to my "
+    "brother's current account 100002 but the app timed out, and my debit card ending 4821 "
+    "was charged twice for 2,000 at the ATM. Can you check the balance on account 700001, "
+    "move 5k to 200003 and block the card if it is compromised? "
+) * 4
+PREDICT_TEXTS = [
+    "what's my balance",
+    "transfer 500 to savings",
+    "my card was stolen, block it",
+    "where is the nearest atm",
+    "how do I open a fixed deposit",
+    "send money to Priya",
+    "show my account balance please",
+    "I lost my debit card",
+]
+
+
+def _row(name, stats, **extra):
+    stats = dict(stats)
+    stats.update(extra)
+    return name, stats
+
+
+# -----------------------
+# Suites
+# -----------------------
+def suite_nlu(args):
+    from nlu_engine import model_registry
+    from nlu_engine.infer_intent import IntentClassifier
+
+    model_dir, version = model_registry.resolve_model_dir(legacy_dir=args.model_dir)
+    if not os.path.isdir(model_dir):
+        return [("nlu.skipped", {"reason": f"no trained model at {model_dir}"})]
+    clf = IntentClassifier(model_dir=model_dir, load_mode="eager", warmup=True)
+    texts = (PREDICT_TEXTS * (args.batch_size // len(PREDICT_TEXTS) + 1))[:args.batch_size]
+    rng = random.Random(0)
+    single = lambda: clf.predict(rng.choice(PREDICT_TEXTS))
+    extra = {"model": version or model_dir, "weights": clf.weights_source}
+    return [
+        _row("nlu.predict.single", bench(single, repeat=args.repeat, warmup=5), **extra),
+        _row(f"nlu.predict.batch{args.batch_size}",
+             bench(lambda: clf.predict_batch(texts), repeat=max(10, args.repeat // 10), warmup=2,
+                   items_per_call=len(texts)), **extra),
+    ]
+
+
+def suite_entities(args):
+    from nlu_engine.entity_extractor import EntityExtractor
+
+    ex = EntityExtractor()
+    return [
+        _row("entities.extract.short", bench(lambda: ex.extract(SHORT_TEXT), repeat=args.repeat * 10),
+             chars=len(SHORT_TEXT)),
+        _row("entities.extract.long", bench(lambda: ex.extract(LONG_TEXT), repeat=args.repeat * 2),
+             chars=len(LONG_TEXT)),
+    ]
+
+
+def suite_dialogue(args):
+    from dialogue_manager.dialogue_handler import DialogueHandler
+
+    if args.real_nlu:
+        handler = DialogueHandler()
+    else:
+        handler = DialogueHandler(nlu=StubNLU())
+    rows = []
+    for name, turns in FLOWS.items():
+        stats = bench(lambda: run_flow(handler, turns), repeat=max(20, args.repeat // 4), warmup=2)
+        stats["turns"] = len(turns)
+        stats["ms_per_turn"] = stats["mean_ms"] / len(turns)
+        rows.append((f"dialogue.flow.{name}", stats))
+    return rows
+
+
+def suite_db(args):
+    from database import bank_crud
+
+    rng = random.Random(0)
+    accounts = [a[0] for a in bank_crud.list_user_accounts(FLOW_USER)]
+    # some history so the transaction query has rows to join
+    for _ in range(200):
+        bank_crud.transfer_money("100001", rng.choice(accounts), 1, "1234")
+
+    rows = [
+        _row("db.read.get_account", bench(lambda: bank_crud.get_account(rng.choice(accounts)), repeat=args.repeat * 5)),
+        _row("db.read.list_user_accounts", bench(lambda: bank_crud.list_user_accounts(FLOW_USER), repeat=args.repeat * 5)),
+        _row("db.read.list_transactions_for_user",
+             bench(lambda: bank_crud.list_transactions_for_user(FLOW_USER), repeat=args.repeat)),
+        _row("db.write.transfer_money",
+             bench(lambda: bank_crud.transfer_money("700001", "100002", 1, "1111"), repeat=args.repeat)),
+    ]
+
+    def card_cycle():
+        bank_crud.add_card("700003", "debit", "12/30")
+        bank_crud.block_card_for_account("700003")
+
+    rows.append(_row("db.write.add_then_block_card", bench(card_cycle, repeat=args.repeat)))
+    return rows
+
+
+def synthetic_ledger(n_rows, own_accounts=4, counterparties=2000, seed=0):
+    """(DataFrame shaped like transactions_to_dataframe output, set of own account numbers)."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    own = np.array([f"7{i:05d}" for i in range(own_accounts)], dtype=object)
+    others = np.array([f"9{i:05d}" for i in range(counterparties)], dtype=object)
+    mine = own[rng.integers(0, own_accounts, n_rows)]
+    # mostly transfers with outsiders, some between the user's own accounts
+    theirs = np.where(rng.random(n_rows) < 0.1, own[rng.integers(0, own_accounts, n_rows)],
+                      others[rng.integers(0, counterparties, n_rows)])
+    outgoing = rng.random(n_rows) < 0.5
+    df = pd.DataFrame({
+        "ID": np.arange(n_rows),
+        "From": np.where(outgoing, mine, theirs),
+        "To": np.where(outgoing, theirs, mine),
+        "Amount": rng.integers(1, 50000, n_rows),
+        "Date": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365 * 86400, n_rows), unit="s"),
+        "Type": np.where(outgoing, "debit", "credit"),
+    })
+    return df, set(own)
+
+
+def _top_counterparties_rowwise(df, acc_set, n=5):
+    # the per-row version the Dashboard used before ledger_cache.top_counterparties
+    def counterpart(row):
+        f, t = row["From"], row["To"]
+        if f in acc_set and t not in acc_set: return t
+        if t in acc_set and f not in acc_set: return f
+        return t if f in acc_set else f
+
+    cp = df.copy()
+    cp["Counterparty"] = cp.apply(counterpart, axis=1)
+    return cp.groupby("Counterparty")["Amount"].sum().abs().reset_index().sort_values("Amount", ascending=False).head(n)
+
+
+def suite_ledger(args):
+    import ledger_cache
+
+    df, own = synthetic_ledger(args.ledger_rows)
+    fast = ledger_cache.top_counterparties(df, own)
+    slow = _top_counterparties_rowwise(df, own)
+    if not fast.reset_index(drop=True).equals(slow.reset_index(drop=True)):
+        raise AssertionError("vectorized top_counterparties disagrees with the row-wise version")
+    return [
+        _row("ledger.top_counterparties", bench(lambda: ledger_cache.top_counterparties(df, own),
+                                                repeat=max(10, args.repeat // 10), warmup=2,
+                                                items_per_call=len(df)), rows=len(df)),
+        _row("ledger.top_counterparties.rowwise", bench(lambda: _top_counterparties_rowwise(df, own),
+                                                        repeat=3, warmup=0, items_per_call=len(df)), rows=len(df)),
+    ]
+
+
+SUITE_FUNCS = {"nlu": suite_nlu, "entities": suite_entities, "dialogue": suite_dialogue, "db": suite_db,
+               "ledger": suite_ledger}
+
+
+# -----------------------
+# Baseline comparison
+# -----------------------
+def compare(results, baseline, tolerance):
+    """[(name, baseline_p50, current_p50, ratio, regressed)] for benchmarks present in both."""
+    rows = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("p50_ms") or not cur.get("p50_ms"):
+            continue
+        ratio = cur["p50_ms"] / base["p50_ms"]
+        rows.append((name, base["p50_ms"], cur["p50_ms"], ratio, ratio > 1.0 + tolerance))
+    return rows
+
+
+def param_mismatches(meta, baseline_meta):
+    """[(field, baseline_value, current_value)] for RUN_PARAMS that differ."""
+    return [(k, baseline_meta.get(k), meta.get(k)) for k in RUN_PARAMS if baseline_meta.get(k) != meta.get(k)]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def _fmt(v):
+    return f"{v:9.3f}" if isinstance(v, (int, float)) else f"{'-':>9}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suites", nargs="+", default=list(SUITES), choices=SUITES)
+    parser.add_argument("--repeat", type=int, default=200, help="base iteration count per benchmark")
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--model_dir", default="models/intent_model")
+    parser.add_argument("--ledger_rows", type=int, default=200000, help="synthetic ledger size for the ledger suite")
+    parser.add_argument("--real_nlu", action="store_true", help="dialogue suite uses the real NLUProcessor instead of the stub")
+    parser.add_argument("--out", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save_baseline", action="store_true", help="also write the results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--fail_on_regression", action="store_true")
+    args = parser.parse_args()
+
+    db_path = use_temp_db()
+    results = {}
+    try:
+        for suite in args.suites:
+            for name, stats in SUITE_FUNCS[suite](args):
+                results[name] = stats
+                print(f"{name:<40} p50={_fmt(stats.get('p50_ms'))}ms  p95={_fmt(stats.get('p95_ms'))}ms  "
+                      f"ops/s={_fmt(stats.get('ops_per_s'))}" if "p50_ms" in stats else f"{name:<40} {stats}")
+    finally:
+        drop_temp_db(db_path)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "suites": args.suites,
+            "repeat": args.repeat,
+            "batch_size": args.batch_size,
+            "ledger_rows": args.ledger_rows,
+            "nlu": "real" if args.real_nlu else "stub",
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        if args.fail_on_regression:
+            sys.exit(f"No baseline at {args.baseline}; record one with --save_baseline first")
+        print(f"\nNo baseline at {args.baseline}; nothing to compare against.")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    mismatches = param_mismatches(report["meta"], baseline.get("meta", {}))
+    if mismatches:
+        detail = ", ".join(f"{k}={cur} (baseline {base})" for k, base, cur in mismatches)
+        if args.fail_on_regression:
+            sys.exit(f"Run parameters differ from {args.baseline}: {detail}")
+        print(f"\nRun parameters differ from {args.baseline}: {detail}; skipping the comparison.")
+        return
+    rows = compare(results, baseline.get("results", {}), args.tolerance)
+    print(f"\nvs baseline {baseline.get('meta', {}).get('commit') or args.baseline} (p50, tolerance {args.tolerance:.0%}):")
+    for name, base, cur, ratio, regressed in rows:
+        print(f"  {name:<40} {base:9.3f} -> {cur:9.3f} ms  x{ratio:5.2f}{'  REGRESSION' if regressed else ''}")
+    regressions = [r for r in rows if r[4]]
+    if regressions and args.fail_on_regression:
+        sys.exit(f"{len(regressions)} benchmark(s) regressed beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# benchmarks/worker_rss.py
+#
+# Measure the memory cost of running several intent-model workers on one host.
+#
+#   python -m benchmarks.worker_rss --workers 1 4 8 --compare
+#
+# Each worker loads IntentClassifier, runs a prediction and then waits until every
+# worker is up before sampling /proc/self/smaps_rollup, so the numbers reflect all
+# processes holding their model at the same time. PSS (proportional set size)
+# splits shared pages between the processes mapping them, which is what shows the
+# effect of memory-mapped weights; RSS counts shared pages in full for every worker.
+
+import os
+import sys
+import json
+import argparse
+import multiprocessing as mp
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def memory_kb():
+    """Return memory counters (kB) for the current process; Linux gives the full breakdown."""
+    out = {}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in SMAPS_FIELDS:
+                    out[key] = int(rest.split()[0])
+        return out
+    except OSError:
+        pass
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, kB elsewhere
+        out["Rss"] = rss // 1024 if sys.platform == "darwin" else rss
+    except Exception:
+        pass
+    return out
+
+
+def _worker(model_dir, mmap_weights, barrier, release, results):
+    try:
+        from nlu_engine.infer_intent import IntentClassifier
+        clf = IntentClassifier(model_dir=model_dir, load_mode="eager", warmup=True, mmap_weights=mmap_weights)
+        clf.predict("What's my account balance?")
+        error = None
+        source = clf.weights_source
+    except Exception as e:
+        error = str(e)
+        source = None
+    barrier.wait()
+    mem = memory_kb()
+    results.put({"pid": os.getpid(), "weights": source, "error": error, **mem})
+    release.wait()
+
+
+def measure(model_dir, workers, mmap_weights):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers + 1)
+    release = ctx.Event()
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(model_dir, mmap_weights, barrier, release, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    barrier.wait()
+    rows = [results.get() for _ in range(workers)]
+    release.set()
+    for p in procs:
+        p.join()
+    return rows
+
+
+def summarize(rows, workers, mmap_weights):
+    def avg(key):
+        vals = [r.get(key, 0) for r in rows]
+        return sum(vals) / len(vals) / 1024.0 if vals else 0.0
+
+    private = [r.get("Private_Clean", 0) + r.get("Private_Dirty", 0) for r in rows]
+    return {
+        "workers": workers,
+        "mmap": mmap_weights,
+        "weights": sorted({str(r.get("weights")) for r in rows}),
+        "errors": [r["error"] for r in rows if r.get("error")],
+        "rss_mb_per_worker": round(avg("Rss"), 1),
+        "pss_mb_per_worker": round(avg("Pss"), 1),
+        "private_mb_per_worker": round(sum(private) / len(private) / 1024.0, 1) if private else 0.0,
+        "total_pss_mb": round(sum(r.get("Pss", 0) for r in rows) / 1024.0, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_dir", default="models/intent_model")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--no_mmap", action="store_true", help="load with from_pretrained instead of mapping")
+    parser.add_argument("--compare", action="store_true", help="run both mmap and from_pretrained loads")
+    parser.add_argument("--json", default=None, help="write the summary rows to this file")
+    args = parser.parse_args()
+
+    modes = [True, False] if args.compare else [not args.no_mmap]
+    summary = []
+    for mmap_weights in modes:
+        for n in args.workers:
+            row = summarize(measure(args.model_dir, n, mmap_weights), n, mmap_weights)
+            summary.append(row)
+            print(f"workers={row['workers']:<3} mmap={str(row['mmap']):<5} "
+                  f"rss/worker={row['rss_mb_per_worker']:>8.1f}MB  pss/worker={row['pss_mb_per_worker']:>8.1f}MB  "
+                  f"private/worker={row['private_mb_per_worker']:>8.1f}MB  total pss={row['total_pss_mb']:>8.1f}MB"
+                  + (f"  errors={row['errors'][0]}" if row["errors"] else ""))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# chat_window.py
+#
+# Chat history storage and rendering shared by app.py, main.py and chatbot.py.
+#
+# st.session_state.chat_history holds the newest MAX_HISTORY messages as
+# (role, text, indicator, timestamp) tuples; older ones move to a bounded
+# st.session_state.chat_archive, so a long-running session stops growing.
+# render_chat() draws only the last CHAT_WINDOW messages (more via the
+# "load earlier" button, until the next message arrives) as a single HTML
+# block, and injects the auto-scroll iframe only when a message was added
+# since the previous render.
+
+import datetime
+from collections import deque
+
+import streamlit as st
+
+CHAT_WINDOW = 40
+LOAD_EARLIER_STEP = 40
+MAX_HISTORY = 200
+ARCHIVE_MAX = 2000
+
+_AUTO_SCROLL_JS = """
+<script>
+    function scrollWindowDown() {
+        // Scroll the main window to the bottom
+        window.scrollTo({
+            top: document.body.scrollHeight,
+            behavior: 'smooth'
+        });
+
+        // Also try scrolling the main streamlit container just in case
+        const mainContainer = window.parent.document.querySelector('.main .block-container');
+        if (mainContainer) {
+            mainContainer.scrollTop = mainContainer.scrollHeight;
+        }
+    }
+
+    // Run on load
+    setTimeout(scrollWindowDown, 300); // Slight delay to allow render
+
+    // Observe DOM changes (new messages)
+    const observer = new MutationObserver(() => {
+        setTimeout(scrollWindowDown, 100);
+    });
+    observer.observe(document.body, { childList: true, subtree: true });
+</script>
+"""
+
+_BOT_BUBBLE = """<div class='bot-bubble'>
+<div style='display:flex; align-items:center; margin-bottom:5px;'>
+<span style='font-size:20px; margin-right:8px;'>🤖</span>
+<strong style='color:#005bea;'>Bankbot</strong>
+</div>
+{text}
+<span class='timestamp'>{time}</span>
+</div>"""
+
+_USER_BUBBLE = """<div class='user-row'>
+<div class='user-bubble'>
+{text}
+<span class='timestamp'>{time}</span>
+</div>
+</div>"""
+
+
+def init_state(state):
+    if "chat_history" not in state:
+        state.chat_history = []
+    if "chat_archive" not in state:
+        state.chat_archive = deque(maxlen=ARCHIVE_MAX)
+    if "chat_window" not in state:
+        state.chat_window = CHAT_WINDOW
+    if "chat_seq" not in state:
+        state.chat_seq = 0           # messages ever added in this session
+    if "chat_scrolled_seq" not in state:
+        state.chat_scrolled_seq = 0  # chat_seq at the last auto-scroll
+
+
+def add_message(state, role, text, indicator="none", ts=None):
+    init_state(state)
+    history = state.chat_history
+    history.append((role, text, indicator, ts or datetime.datetime.now()))
+    overflow = len(history) - MAX_HISTORY
+    if overflow > 0:
+        # trim in place: the list object is what monitoring.memory tracks
+        state.chat_archive.extend(history[:overflow])
+        del history[:overflow]
+    state.chat_seq += 1
+    # a new message brings the view back to the latest window
+    state.chat_window = CHAT_WINDOW
+
+
+def visible_messages(state):
+    """(messages to draw, number of earlier messages not drawn)."""
+    init_state(state)
+    history = state.chat_history
+    window = state.chat_window
+    if window <= len(history):
+        return history[-window:], len(history) - window + len(state.chat_archive)
+    archive = state.chat_archive
+    from_archive = min(window - len(history), len(archive))
+    earlier = list(archive)[len(archive) - from_archive:] if from_archive else []
+    return earlier + history, len(archive) - from_archive
+
+
+def messages_html(messages):
+    parts = ["<div class='chat-wrapper'>"]
+    for role, text, indicator, ts in messages:
+        safe_text = str(text).replace("<", "&lt;").replace(">", "&gt;")
+        bubble = _BOT_BUBBLE if role == "bot" else _USER_BUBBLE
+        parts.append(bubble.format(text=safe_text, time=ts.strftime("%I:%M %p")))
+    parts.append("</div>")
+    return "\n".join(parts)
+
+
+def _load_earlier():
+    st.session_state.chat_window += LOAD_EARLIER_STEP
+    # keep the viewport where the user is reading
+    st.session_state.chat_scrolled_seq = st.session_state.chat_seq
+
+
+def render_chat():
+    state = st.session_state
+    messages, hidden = visible_messages(state)
+    if hidden:
+        st.button(f"⬆ Load earlier messages ({hidden} more)", key="chat_load_earlier", on_click=_load_earlier)
+    st.markdown(messages_html(messages), unsafe_allow_html=True)
+    if state.chat_seq != state.chat_scrolled_seq:
+        state.chat_scrolled_seq = state.chat_seq
+        st.components.v1.html(_AUTO_SCROLL_JS, height=0)
@@ -1,17 +1,53 @@
 # database/bank_crud.py
 
 import sqlite3
+import time
 import datetime
+import functools
 import pandas as pd
 from typing import List, Tuple, Optional
-from . import db, security
+from . import db, security, profiler
+from monitoring import metrics
+from monitoring.tracing import traced
 
 DB_PATH = db.get_db_path()
+# writes that hit "database is locked" are retried with exponential backoff
+DB_LOCK_RETRIES = 3
+DB_LOCK_BACKOFF_S = 0.05
 
 def get_conn():
-    return sqlite3.connect(DB_PATH)
+    # plain sqlite3 connection unless BANKBOT_DB_PROFILE=1
+    return profiler.connect(DB_PATH)
+
+def _bump_ledger_versions(cur, account_nos):
+    # same transaction as the write, so a reader never sees new rows under an old version
+    marks = ",".join("?" * len(account_nos))
+    cur.execute(f"""
+    INSERT INTO ledger_versions(username, version)
+    SELECT DISTINCT username, 1 FROM accounts WHERE account_no IN ({marks})
+    ON CONFLICT(username) DO UPDATE SET version = version + 1
+    """, tuple(account_nos))
+
+def _is_locked(e: Exception) -> bool:
+    return isinstance(e, sqlite3.OperationalError) and "locked" in str(e).lower()
+
+def retry_on_lock(fn):
+    """Re-run a write when SQLite reports the database is locked; each retry is counted."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        for attempt in range(DB_LOCK_RETRIES + 1):
+            try:
+                return fn(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not _is_locked(e) or attempt == DB_LOCK_RETRIES:
+                    raise
+                metrics.DB_LOCK_RETRIES.inc(op=fn.__name__)
+                time.sleep(DB_LOCK_BACKOFF_S * (2 ** attempt))
+    return wrapper
 
 # Users
+@traced("db.create_user")
+@retry_on_lock
 def create_user(username: str, password: str):
     conn = get_conn()
     cur = conn.cursor()
@@ -20,6 +56,7 @@ def create_user(username: str, password: str):
     conn.commit()
     conn.close()
 
+@traced("db.verify_user_login")
 def verify_user_login(username: str, password: str) -> bool:
     if not username or not password:
         return False
@@ -30,6 +67,7 @@ def verify_user_login(username: str, password: str) -> bool:
     conn.close()
     return bool(row and int(row[1]) == 1 and security.verify_password(password.strip(), row[0]))
 
+@traced("db.list_users")
 def list_users() -> List[Tuple[str]]:
     conn = get_conn()
     cur = conn.cursor()
@@ -39,6 +77,8 @@ def list_users() -> List[Tuple[str]]:
     return rows
 
 # Accounts
+@traced("db.create_account")
+@retry_on_lock
 def create_account(user_name: str, acc_no: str, acc_name: str, acc_type: str, balance: int, pin: str):
     conn = get_conn()
     cur = conn.cursor()
@@ -50,9 +90,12 @@ def create_account(user_name: str, acc_no: str, acc_name: str, acc_type: str, ba
     INSERT OR IGNORE INTO accounts(account_no, username, display_name, type, balance, pin)
     VALUES (?, ?, ?, ?, ?, ?)
     """, (acc_no, user_name, acc_name, acc_type, balance, pin))
+    # the account set decides which side of a transfer is the counterparty
+    _bump_ledger_versions(cur, [acc_no])
     conn.commit()
     conn.close()
 
+@traced("db.list_user_accounts")
 def list_user_accounts(user_name: str):
     conn = get_conn()
     cur = conn.cursor()
@@ -61,6 +104,7 @@ def list_user_accounts(user_name: str):
     conn.close()
     return rows
 
+@traced("db.get_account")
 def get_account(acc_no: str):
     conn = get_conn()
     cur = conn.cursor()
@@ -69,6 +113,7 @@ def get_account(acc_no: str):
     conn.close()
     return row
 
+@traced("db.verify_account_password")
 def verify_account_password(acc_no: str, pin: str) -> bool:
     conn = get_conn()
     cur = conn.cursor()
@@ -78,7 +123,29 @@ def verify_account_password(acc_no: str, pin: str) -> bool:
     return bool(row and str(row[0]) == str(pin))
 
 # Transfers
+@traced("db.transfer_money")
 def transfer_money(from_acc: str, to_acc: str, amount: int, pin: str) -> str:
+    try:
+        msg = _transfer_money(from_acc, to_acc, amount, pin)
+    except sqlite3.OperationalError as e:
+        # still locked after every retry
+        metrics.TRANSFERS.inc(result="failure", reason="locked")
+        return f"❌ Transfer failed: {e}"
+    if msg.startswith("✅"):
+        metrics.TRANSFERS.inc(result="success", reason="ok")
+    else:
+        metrics.TRANSFERS.inc(result="failure", reason=_TRANSFER_FAILURES.get(msg, "error"))
+    return msg
+
+_TRANSFER_FAILURES = {
+    "❌ Invalid sender account": "invalid_sender",
+    "❌ Incorrect PIN": "incorrect_pin",
+    "❌ Insufficient balance": "insufficient_balance",
+    "❌ Recipient account not found": "recipient_not_found",
+}
+
+@retry_on_lock
+def _transfer_money(from_acc: str, to_acc: str, amount: int, pin: str) -> str:
     conn = get_conn()
     cur = conn.cursor()
     cur.execute("SELECT balance, pin FROM accounts WHERE account_no=?", (from_acc,))
@@ -107,15 +174,20 @@ def transfer_money(from_acc: str, to_acc: str, amount: int, pin: str) -> str:
                     (from_acc, to_acc, amount, now, "debit", f"Transfer to {to_acc}"))
         cur.execute("INSERT INTO transactions(from_acc, to_acc, amount, date, type, description) VALUES (?,?,?,?,?,?)",
                     (from_acc, to_acc, amount, now, "credit", f"Received from {from_acc}"))
+        _bump_ledger_versions(cur, [from_acc, to_acc])
         conn.commit()
         return f"✅ Transferred ₹{amount} from {from_acc} to {to_acc}."
     except Exception as e:
         conn.rollback()
+        if _is_locked(e):
+            raise  # nothing was applied; let retry_on_lock run it again
         return f"❌ Transfer failed: {e}"
     finally:
         conn.close()
 
 # Cards
+@traced("db.add_card")
+@retry_on_lock
 def add_card(account_no: str, card_number: str, expiry: str = "12/30"):
     conn = get_conn()
     cur = conn.cursor()
@@ -123,6 +195,8 @@ def add_card(account_no: str, card_number: str, expiry: str = "12/30"):
     conn.commit()
     conn.close()
 
+@traced("db.block_card_for_account")
+@retry_on_lock
 def block_card_for_account(account_no: str) -> str:
     conn = get_conn()
     cur = conn.cursor()
@@ -136,11 +210,14 @@ def block_card_for_account(account_no: str) -> str:
             return f"⚠️ No card found for account {account_no}."
     except Exception as e:
         conn.rollback()
+        if _is_locked(e):
+            raise
         return f"❌ Error blocking card: {e}"
     finally:
         conn.close()
 
 # Transactions / History
+@traced("db.list_transactions_for_user")
 def list_transactions_for_user(user_name: str):
     conn = get_conn()
     cur = conn.cursor()
@@ -155,6 +232,15 @@ def list_transactions_for_user(user_name: str):
     conn.close()
     return rows
 
+@traced("db.get_ledger_version")
+def get_ledger_version(user_name: str) -> int:
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT version FROM ledger_versions WHERE username=?", (user_name,))
+    row = cur.fetchone()
+    conn.close()
+    return int(row[0]) if row else 0
+
 def transactions_to_dataframe(txns: List[Tuple]) -> pd.DataFrame:
     if not txns:
         return pd.DataFrame(columns=["id","from","to","amount","date","type"])
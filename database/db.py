@@ -1,9 +1,11 @@
 # database/db.py
 import sqlite3
 import os
+from . import profiler
 
 DB_FILENAME = "bankbot.db"
-DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", DB_FILENAME))
+# BANKBOT_DB_PATH points the app (or a benchmark) at a different database file
+DB_PATH = os.path.abspath(os.getenv("BANKBOT_DB_PATH") or os.path.join(os.path.dirname(__file__), "..", DB_FILENAME))
 
 MIGRATION_SQL = """
 PRAGMA foreign_keys = ON;
@@ -51,6 +53,13 @@ CREATE TABLE IF NOT EXISTS transactions (
   FOREIGN KEY (from_acc) REFERENCES accounts(account_no),
   FOREIGN KEY (to_acc) REFERENCES accounts(account_no)
 );
+
+-- bumped whenever a user's ledger (transactions or account list) changes;
+-- lets the UI reuse prepared dashboard data until then
+CREATE TABLE IF NOT EXISTS ledger_versions (
+  username TEXT PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 0
+);
 """
 
 def get_db_path() -> str:
@@ -59,7 +68,7 @@ def get_db_path() -> str:
 
 def get_conn():
     """Return a sqlite3 connection to the DB (creates file if missing)."""
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+    return profiler.connect(DB_PATH, check_same_thread=False)
 
 def init_db() -> str:
     """Create tables if they do not exist and return DB path."""
@@ -0,0 +1,283 @@
+# database/profiler.py
+#
+# Opt-in per-statement profiler for the bank database.
+#
+#   BANKBOT_DB_PROFILE=1 BANKBOT_DB_SLOW_MS=20 streamlit run app.py
+#
+# connect() hands out a thin wrapper around sqlite3.Connection whose cursors
+# time every statement from execute() until its rows have been fetched (SQLite
+# does most of a SELECT's work while stepping through rows) and count the rows
+# returned. Statements are aggregated by normalized text (literals replaced by
+# '?', whitespace collapsed). A statement slower than the threshold is logged to
+# logs/db_slow_queries.log together with its EXPLAIN QUERY PLAN, taken once per
+# normalized statement. With profiling off connect() returns a plain
+# sqlite3.Connection, so there is no overhead.
+
+import os
+import re
+import json
+import time
+import atexit
+import logging
+import sqlite3
+import threading
+from collections import deque
+
+PROFILE_ENABLED = os.getenv("BANKBOT_DB_PROFILE", "0") == "1"
+SLOW_MS = float(os.getenv("BANKBOT_DB_SLOW_MS", "50"))
+SLOW_LOG_PATH = "logs/db_slow_queries.log"
+# written at interpreter exit when profiling is on
+PROFILE_DUMP_PATH = "logs/db_profile.json"
+RECENT_SLOW = 200
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_stats = {}
+_plans = {}
+_recent_slow = deque(maxlen=RECENT_SLOW)
+_logger = None
+
+
+def normalize(sql):
+    """Statement text with literals replaced so calls differing only in values group together."""
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("IN (?, ...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+def _slow_logger():
+    global _logger
+    if _logger is None:
+        logger = logging.getLogger("bankbot.db.slow")
+        if not logger.handlers:
+            os.makedirs(os.path.dirname(SLOW_LOG_PATH), exist_ok=True)
+            handler = logging.FileHandler(SLOW_LOG_PATH, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        _logger = logger
+    return _logger
+
+
+def _explain(conn, sql, params):
+    if not sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")):
+        return None
+    try:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+    except sqlite3.Error as e:
+        return [f"(no plan: {e})"]
+    return [r[-1] for r in rows]
+
+
+def _record(conn, sql, params, ms, rows, threshold_ms):
+    key = normalize(sql)
+    slow = ms >= threshold_ms
+    with _lock:
+        s = _stats.get(key)
+        if s is None:
+            s = _stats[key] = {"statement": key, "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "slow": 0}
+        s["calls"] += 1
+        s["total_ms"] += ms
+        s["max_ms"] = max(s["max_ms"], ms)
+        s["rows"] += rows
+        s["slow"] += slow
+        need_plan = slow and key not in _plans
+    if not slow:
+        return
+    if need_plan:
+        plan = _explain(conn, sql, params)
+        with _lock:
+            _plans[key] = plan
+    plan = _plans.get(key)
+    with _lock:
+        _recent_slow.append({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "statement": key,
+                             "ms": ms, "rows": rows, "plan": plan})
+    _slow_logger().info("%.1fms rows=%d %s | plan: %s", ms, rows, key, " / ".join(plan or ["-"]))
+
+
+class ProfiledCursor:
+    """sqlite3.Cursor wrapper; a statement's time runs from execute() until it is fully fetched,
+    the next statement starts, or the cursor/connection is closed."""
+
+    def __init__(self, conn, cursor):
+        self._conn = conn
+        self._cursor = cursor
+        self._pending = None  # [sql, params, elapsed_ms, rows]
+
+    def _finish(self):
+        p = self._pending
+        if p is None:
+            return
+        self._pending = None
+        _record(self._conn._conn, p[0], p[1], p[2], p[3], self._conn.slow_ms)
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            if self._pending is not None:
+                self._pending[2] += (time.perf_counter() - start) * 1000.0
+
+    def execute(self, sql, params=()):
+        self._finish()
+        self._pending = [sql, params, 0.0, 0]
+        self._timed(self._cursor.execute, sql, params)
+        if self._cursor.description is None:
+            # no result set (INSERT/UPDATE/DELETE/BEGIN): done once executed
+            self._pending[3] = max(self._cursor.rowcount, 0)
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq):
+        self._finish()
+        self._pending = [sql, None, 0.0, 0]
+        self._timed(self._cursor.executemany, sql, seq)
+        self._pending[3] = max(self._cursor.rowcount, 0)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if self._pending is not None:
+            if row is None:
+                self._finish()
+            else:
+                self._pending[3] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(self._cursor.fetchmany, *(() if size is None else (size,)))
+        if self._pending is not None:
+            self._pending[3] += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        if self._pending is not None:
+            self._pending[3] += len(rows)
+            self._finish()
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class ProfiledConnection:
+    def __init__(self, conn, slow_ms=SLOW_MS):
+        self._conn = conn
+        self.slow_ms = slow_ms
+        self._cursors = []
+
+    def cursor(self):
+        cur = ProfiledCursor(self, self._conn.cursor())
+        # only cursors with an unfinished statement need finishing later
+        self._cursors = [c for c in self._cursors if c._pending is not None]
+        self._cursors.append(cur)
+        return cur
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+    def _finish_all(self):
+        for cur in self._cursors:
+            cur._finish()
+
+    def commit(self):
+        self._finish_all()
+        # the journal write and fsync happen here, not in the statements
+        start = time.perf_counter()
+        self._conn.commit()
+        _record(self._conn, "COMMIT", None, (time.perf_counter() - start) * 1000.0, 0, self.slow_ms)
+
+    def close(self):
+        self._finish_all()
+        self._conn.close()
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._finish_all()
+        return self._conn.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def connect(path, **kwargs):
+    """sqlite3.connect(), profiled when BANKBOT_DB_PROFILE=1."""
+    conn = sqlite3.connect(path, **kwargs)
+    if not PROFILE_ENABLED:
+        return conn
+    return ProfiledConnection(conn)
+
+
+# -----------------------
+# Reports
+# -----------------------
+def summary(top=20, by="total_ms"):
+    """Top statements by ``by`` (total_ms, max_ms, calls, rows or slow)."""
+    with _lock:
+        rows = [dict(s, plan=_plans.get(k)) for k, s in _stats.items()]
+    for r in rows:
+        r["mean_ms"] = r["total_ms"] / r["calls"] if r["calls"] else 0.0
+    rows.sort(key=lambda r: r[by], reverse=True)
+    return rows[:top] if top else rows
+
+
+def recent_slow():
+    with _lock:
+        return list(_recent_slow)
+
+
+def report_text(top=20):
+    lines = [f"{'total ms':>10} {'calls':>7} {'mean ms':>8} {'max ms':>8} {'rows':>8} {'slow':>5}  statement"]
+    for r in summary(top):
+        lines.append(f"{r['total_ms']:10.1f} {r['calls']:7d} {r['mean_ms']:8.2f} {r['max_ms']:8.1f} "
+                     f"{r['rows']:8d} {r['slow']:5d}  {r['statement']}")
+    return "\n".join(lines)
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _plans.clear()
+        _recent_slow.clear()
+
+
+def dump(path=PROFILE_DUMP_PATH):
+    rows = summary(top=None)
+    if not rows:
+        return None
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"slow_ms": SLOW_MS, "statements": rows, "recent_slow": recent_slow()}, f, indent=2)
+    return path
+
+
+if PROFILE_ENABLED:
+    atexit.register(dump)
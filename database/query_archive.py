@@ -0,0 +1,342 @@
+# database/query_archive.py
+#
+# Columnar archive of the query log. Every finished UTC day is compacted out
+# of the SQLite log (database/query_log.py) into its own Parquet partition:
+#
+#   logs/query_history_parquet/day=YYYY-MM-DD/part-0.parquet
+#
+# Filtered reads go through pyarrow.dataset: the day filter prunes whole
+# partitions, the confidence/date filter is pushed into the Parquet scan, and
+# only the requested columns are mapped (LocalFileSystem(use_mmap=True)).
+# Today's rows, not yet compacted, are read from SQLite with the same filters.
+# Page renders call compact_in_background(), which runs compact() on a daemon
+# thread at most every COMPACT_INTERVAL_S; until a day is compacted its rows are
+# simply read from SQLite. read_recent() serves previews newest first and stops
+# scanning partitions once it has enough rows.
+#
+# pyarrow is optional; without it reads and exports fall back to streaming
+# rows straight out of SQLite.
+
+import os
+import csv
+import time
+import threading
+from datetime import datetime, date, timedelta
+
+from database import query_log
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pa_ds
+    import pyarrow.parquet as pq
+    from pyarrow import fs as pa_fs
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+PARQUET_DIR = "logs/query_history_parquet"
+EXPORT_DIR = "logs/exports"
+# older exports in EXPORT_DIR are removed once a new one is written
+KEEP_EXPORTS = 3
+COLUMNS = ["query", "intent", "confidence", "entities", "date"]
+EXPORT_BATCH_ROWS = 10000
+COMPACT_INTERVAL_S = 300
+
+_compact_lock = threading.Lock()
+_compact_state = {}  # (db_path, out_dir) -> [last start (monotonic), running]
+
+
+def _schema():
+    return pa.schema([
+        ("query", pa.string()),
+        ("intent", pa.string()),
+        ("confidence", pa.float64()),
+        ("entities", pa.list_(pa.string())),
+        ("date", pa.timestamp("us")),
+    ])
+
+
+def _parse_date(value):
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", ""))
+    except ValueError:
+        return None
+
+
+def compacted_days(out_dir=PARQUET_DIR):
+    if not os.path.isdir(out_dir):
+        return []
+    return sorted(
+        d.split("=", 1)[1] for d in os.listdir(out_dir)
+        if d.startswith("day=") and os.path.exists(os.path.join(out_dir, d, "part-0.parquet"))
+    )
+
+
+def _live_since(out_dir=PARQUET_DIR):
+    """First day whose rows still have to be read from SQLite."""
+    days = compacted_days(out_dir)
+    if not days:
+        return None
+    return (date.fromisoformat(days[-1]) + timedelta(days=1)).isoformat()
+
+
+def compact(db_path=query_log.LOG_DB_PATH, out_dir=PARQUET_DIR, today=None):
+    """Write a Parquet partition for every finished day that does not have one yet.
+
+    Days are found through the intent_daily rollup, so this costs one small query
+    when there is nothing to do. Returns the days written."""
+    if not PARQUET_AVAILABLE:
+        return []
+    today = today or datetime.utcnow().date().isoformat()
+    done = set(compacted_days(out_dir))
+    conn = query_log.get_conn(db_path)
+    days = [r[0] for r in conn.execute("SELECT DISTINCT day FROM intent_daily WHERE day < ? ORDER BY day", (today,))]
+    written = []
+    for day in days:
+        if day in done:
+            continue
+        next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+        cols = {c: [] for c in COLUMNS}
+        for e in query_log.iter_entries(db_path, since=day, before=next_day):
+            cols["query"].append(e["query"])
+            cols["intent"].append(e["intent"])
+            cols["confidence"].append(float(e["confidence"]))
+            cols["entities"].append([str(x) for x in e["entities"]])
+            cols["date"].append(_parse_date(e["date"]))
+        table = pa.Table.from_pydict(cols, schema=_schema())
+
+        part_dir = os.path.join(out_dir, f"day={day}")
+        os.makedirs(part_dir, exist_ok=True)
+        tmp = os.path.join(part_dir, "part-0.parquet.tmp")
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, os.path.join(part_dir, "part-0.parquet"))
+        written.append(day)
+    return written
+
+
+def compact_in_background(db_path=query_log.LOG_DB_PATH, out_dir=PARQUET_DIR, interval=COMPACT_INTERVAL_S):
+    """Start compact() on a daemon thread unless one is running or ran within ``interval``
+    seconds. Returns True if a run was started."""
+    if not PARQUET_AVAILABLE:
+        return False
+    key = (db_path, out_dir)
+    now = time.monotonic()
+    with _compact_lock:
+        state = _compact_state.setdefault(key, [None, False])
+        if state[1] or (state[0] is not None and now - state[0] < interval):
+            return False
+        state[0], state[1] = now, True
+
+    def run():
+        try:
+            compact(db_path, out_dir)
+        except Exception:
+            pass  # retried on the next interval; reads fall back to SQLite meanwhile
+        finally:
+            with _compact_lock:
+                state[1] = False
+
+    threading.Thread(target=run, name="query-archive-compact", daemon=True).start()
+    return True
+
+
+def _dataset(out_dir=PARQUET_DIR):
+    # declare the partition key as a string so day filters compare ISO dates lexically
+    partitioning = pa_ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive")
+    return pa_ds.dataset(out_dir, format="parquet", partitioning=partitioning,
+                         filesystem=pa_fs.LocalFileSystem(use_mmap=True))
+
+
+def _arrow_filter(start=None, end=None, min_confidence=None):
+    expr = None
+
+    def _and(e):
+        return e if expr is None else expr & e
+
+    # the day partition key prunes whole files; confidence is evaluated inside the Parquet scan
+    if start:
+        expr = _and(pa_ds.field("day") >= start.isoformat())
+    if end:
+        expr = _and(pa_ds.field("day") <= end.isoformat())
+    if min_confidence:
+        expr = _and(pa_ds.field("confidence") >= float(min_confidence))
+    return expr
+
+
+def _sql_bounds(start, end, live_since):
+    since = start.isoformat() if start else None
+    if live_since and (since is None or since < live_since):
+        since = live_since
+    before = (end + timedelta(days=1)).isoformat() if end else None
+    return since, before
+
+
+def _scan_batches(columns, start=None, end=None, min_confidence=None, out_dir=PARQUET_DIR):
+    """Yield pyarrow RecordBatches from the compacted partitions."""
+    if not PARQUET_AVAILABLE or not compacted_days(out_dir):
+        return
+    scanner = _dataset(out_dir).scanner(columns=columns, filter=_arrow_filter(start, end, min_confidence),
+                                        batch_size=EXPORT_BATCH_ROWS)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch
+
+
+def _live_entries(start=None, end=None, min_confidence=None, db_path=query_log.LOG_DB_PATH, out_dir=PARQUET_DIR):
+    """Rows that are only in SQLite (everything when pyarrow is missing)."""
+    live_since = _live_since(out_dir) if PARQUET_AVAILABLE else None
+    since, before = _sql_bounds(start, end, live_since)
+    if since and before and since >= before:
+        return
+    yield from query_log.iter_entries(db_path, since=since, before=before, min_confidence=min_confidence or None)
+
+
+def _split_sources(start=None, end=None, out_dir=PARQUET_DIR):
+    """(compacted days within [start, end], first day to read from SQLite), from one
+    listing so a compaction finishing meanwhile is neither missed nor counted twice."""
+    all_days = compacted_days(out_dir) if PARQUET_AVAILABLE else []
+    days = [d for d in all_days if (not start or d >= start.isoformat()) and (not end or d <= end.isoformat())]
+    live_since = (date.fromisoformat(all_days[-1]) + timedelta(days=1)).isoformat() if all_days else None
+    return days, live_since
+
+
+def _day_filter(days, min_confidence=None):
+    expr = pa_ds.field("day").isin(days)
+    if min_confidence:
+        expr = expr & (pa_ds.field("confidence") >= float(min_confidence))
+    return expr
+
+
+def count_filtered(start=None, end=None, min_confidence=None, db_path=query_log.LOG_DB_PATH, out_dir=PARQUET_DIR):
+    """Number of entries read_filtered() would return, from Parquet metadata/scan counts
+    and one SQLite COUNT, without materializing rows."""
+    days, live_since = _split_sources(start, end, out_dir)
+    total = _dataset(out_dir).count_rows(filter=_day_filter(days, min_confidence)) if days else 0
+    since, before = _sql_bounds(start, end, live_since)
+    if not (since and before and since >= before):
+        total += query_log.count_entries(db_path, since=since, before=before, min_confidence=min_confidence or None)
+    return total
+
+
+def read_recent(limit, columns=None, start=None, end=None, min_confidence=None,
+                db_path=query_log.LOG_DB_PATH, out_dir=PARQUET_DIR):
+    """DataFrame of the newest ``limit`` matching entries, newest first.
+
+    Uncompacted rows come from SQLite with ORDER BY id DESC LIMIT; compacted days are
+    then read newest day first, one partition at a time, until ``limit`` rows are found."""
+    import pandas as pd
+
+    columns = list(columns or COLUMNS)
+    days, live_since = _split_sources(start, end, out_dir)
+    since, before = _sql_bounds(start, end, live_since)
+    rows = []
+    if not (since and before and since >= before):
+        rows = [{c: e[c] for c in columns} for e in query_log.iter_entries(
+            db_path, since=since, before=before, min_confidence=min_confidence or None,
+            newest_first=True, limit=limit)]
+    frames = [pd.DataFrame(rows, columns=columns)] if rows else []
+    need = limit - len(rows)
+    if days and need > 0:
+        dataset = _dataset(out_dir)
+        for day in reversed(days):
+            table = dataset.to_table(columns=columns, filter=_day_filter([day], min_confidence))
+            if not table.num_rows:
+                continue
+            # a partition holds one day in log order; keep its newest rows, newest first
+            part = table.slice(max(0, table.num_rows - need)).to_pandas().iloc[::-1]
+            frames.append(part)
+            need -= len(part)
+            if need <= 0:
+                break
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(frames, ignore_index=True)
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    return df
+
+
+def read_filtered(columns=None, start=None, end=None, min_confidence=None,
+                  db_path=query_log.LOG_DB_PATH, out_dir=PARQUET_DIR):
+    """DataFrame of the requested columns for entries between the ``start`` and
+    ``end`` dates (inclusive) with confidence >= ``min_confidence``."""
+    import pandas as pd
+
+    columns = list(columns or COLUMNS)
+    frames = [b.to_pandas() for b in _scan_batches(columns, start, end, min_confidence, out_dir)]
+    live = [{c: e[c] for c in columns} for e in _live_entries(start, end, min_confidence, db_path, out_dir)]
+    if live:
+        frames.append(pd.DataFrame(live, columns=columns))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(frames, ignore_index=True)
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    return df
+
+
+def _csv_value(column, value):
+    if column == "entities":
+        return "; ".join(value or [])
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_csv(path=None, columns=None, start=None, end=None, min_confidence=None,
+               db_path=query_log.LOG_DB_PATH, out_dir=PARQUET_DIR):
+    """Stream the filtered log into a CSV file batch by batch; return (path, rows).
+
+    At most one record batch is in memory at a time."""
+    columns = list(columns or COLUMNS)
+    managed = path is None
+    if managed:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, datetime.utcnow().strftime("query_history_%Y%m%d-%H%M%S.csv"))
+    rows = 0
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for batch in _scan_batches(columns, start, end, min_confidence, out_dir):
+            data = batch.to_pydict()
+            for i in range(batch.num_rows):
+                writer.writerow([_csv_value(c, data[c][i]) for c in columns])
+            rows += batch.num_rows
+        for e in _live_entries(start, end, min_confidence, db_path, out_dir):
+            writer.writerow([_csv_value(c, e[c]) for c in columns])
+            rows += 1
+    os.replace(tmp, path)
+    if managed:
+        prune_exports()
+    return path, rows
+
+
+def prune_exports(export_dir=EXPORT_DIR, keep=KEEP_EXPORTS):
+    """Delete all but the ``keep`` newest CSV exports in ``export_dir``."""
+    try:
+        names = sorted(n for n in os.listdir(export_dir) if n.startswith("query_history_") and n.endswith(".csv"))
+    except FileNotFoundError:
+        return []
+    removed = []
+    # names embed a sortable UTC timestamp, so lexical order is age order
+    for name in names[:-keep] if keep else names:
+        try:
+            os.remove(os.path.join(export_dir, name))
+            removed.append(name)
+        except OSError:
+            pass
+    return removed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compact the query log into daily Parquet partitions.")
+    parser.add_argument("--db", default=query_log.LOG_DB_PATH)
+    parser.add_argument("--out_dir", default=PARQUET_DIR)
+    args = parser.parse_args()
+    if not PARQUET_AVAILABLE:
+        raise SystemExit("pyarrow is not installed.")
+    days = compact(args.db, args.out_dir)
+    print(f"Compacted {len(days)} day(s)" + (f": {days[0]} .. {days[-1]}" if days else ""))
@@ -0,0 +1,303 @@
+# database/query_log.py
+#
+# Append-only store for the admin query log. Replaces logs/query_history.json,
+# which was parsed and rewritten in full on every logged query.
+#
+# Entries go into a SQLite table in WAL mode: an append is a single INSERT,
+# readers never block the writer, and concurrent Streamlit sessions/processes
+# serialize on SQLite's write lock (busy_timeout) instead of clobbering each
+# other's rewrites. Duplicate suppression looks at an in-memory tail of recent
+# entries, not at the whole log.
+#
+# Rollup tables (per-day counts per intent, confidence histogram buckets,
+# entity label counts) are updated in the same transaction as each insert, so
+# the admin Dashboard and Analytics pages read a few hundred rows no matter how
+# long the log gets.
+
+import os
+import json
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime
+
+LOG_DB_PATH = "logs/query_history.db"
+LEGACY_JSON_PATH = "logs/query_history.json"
+BUSY_TIMEOUT_MS = 5000
+DEDUP_WINDOW_S = 2.0
+TAIL_SIZE = 64
+CONF_BUCKETS = 20
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS queries (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  query TEXT NOT NULL,
+  intent TEXT,
+  confidence REAL NOT NULL DEFAULT 0,
+  entities TEXT NOT NULL DEFAULT '[]',
+  date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_queries_date ON queries(date);
+
+CREATE TABLE IF NOT EXISTS intent_daily (
+  day TEXT NOT NULL,
+  intent TEXT NOT NULL,
+  count INTEGER NOT NULL DEFAULT 0,
+  conf_sum REAL NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, intent)
+);
+
+CREATE TABLE IF NOT EXISTS confidence_hist (
+  intent TEXT NOT NULL,
+  bucket INTEGER NOT NULL,
+  count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (intent, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS entity_counts (
+  label TEXT PRIMARY KEY,
+  count INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_local = threading.local()
+_tails = {}  # path -> deque of that log's most recent entries
+_tail_lock = threading.Lock()
+
+
+def get_conn(path=LOG_DB_PATH):
+    """One connection per thread and path; the schema (and legacy import) runs on first use."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.executescript(SCHEMA_SQL)
+        # the JSON log this DB replaces sits next to it (LEGACY_JSON_PATH for the default)
+        migrate_legacy_json(conn, os.path.splitext(path)[0] + ".json")
+        # logs written before the rollup tables existed
+        if conn.execute("SELECT 1 FROM intent_daily LIMIT 1").fetchone() is None and \
+                conn.execute("SELECT 1 FROM queries LIMIT 1").fetchone() is not None:
+            rebuild_rollups(conn)
+        conns[path] = conn
+    return conn
+
+
+def _row_to_entry(row):
+    return {
+        "query": row["query"],
+        "intent": row["intent"],
+        "confidence": row["confidence"],
+        "entities": json.loads(row["entities"] or "[]"),
+        "date": row["date"],
+    }
+
+
+def conf_bucket(confidence):
+    return min(CONF_BUCKETS - 1, max(0, int(float(confidence) * CONF_BUCKETS)))
+
+
+def entity_label(entity):
+    # entities are logged as "label: value" strings
+    return str(entity).split(":")[0].strip()
+
+
+def _insert(conn, entry):
+    intent = entry.get("intent") or ""
+    conf = float(entry.get("confidence", 0.0))
+    conn.execute(
+        "INSERT INTO queries (query, intent, confidence, entities, date) VALUES (?, ?, ?, ?, ?)",
+        (entry["query"], intent, conf, json.dumps(entry.get("entities") or [], ensure_ascii=False), entry["date"]),
+    )
+    _update_rollups(conn, entry["date"][:10], intent, conf, entry.get("entities") or [])
+
+
+def _update_rollups(conn, day, intent, conf, entities):
+    conn.execute(
+        "INSERT INTO intent_daily (day, intent, count, conf_sum) VALUES (?, ?, 1, ?) "
+        "ON CONFLICT(day, intent) DO UPDATE SET count = count + 1, conf_sum = conf_sum + excluded.conf_sum",
+        (day, intent, conf),
+    )
+    conn.execute(
+        "INSERT INTO confidence_hist (intent, bucket, count) VALUES (?, ?, 1) "
+        "ON CONFLICT(intent, bucket) DO UPDATE SET count = count + 1",
+        (intent, conf_bucket(conf)),
+    )
+    for label in filter(None, (entity_label(e) for e in entities)):
+        conn.execute(
+            "INSERT INTO entity_counts (label, count) VALUES (?, 1) "
+            "ON CONFLICT(label) DO UPDATE SET count = count + 1",
+            (label,),
+        )
+
+
+def rebuild_rollups(conn):
+    """Recompute every rollup from the raw rows (one pass over the log)."""
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM intent_daily")
+        conn.execute("DELETE FROM confidence_hist")
+        conn.execute("DELETE FROM entity_counts")
+        for row in conn.execute("SELECT intent, confidence, entities, date FROM queries").fetchall():
+            _update_rollups(conn, row["date"][:10], row["intent"] or "", row["confidence"],
+                            json.loads(row["entities"] or "[]"))
+
+
+def migrate_legacy_json(conn, json_path=LEGACY_JSON_PATH):
+    """Import the old JSON log once, then rename it so it is not imported again."""
+    if not os.path.exists(json_path):
+        return 0
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
+    except Exception:
+        return 0
+    rows = [e for e in legacy if isinstance(e, dict) and e.get("query") and e.get("date")]
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        # another process may have finished the import while we waited for the lock
+        if not os.path.exists(json_path):
+            return 0
+        for e in rows:
+            _insert(conn, e)
+        os.replace(json_path, json_path + ".migrated")
+    return len(rows)
+
+
+def _prime_tail(conn, path):
+    tail = _tails.get(path)
+    if tail is None:
+        rows = conn.execute("SELECT * FROM queries ORDER BY id DESC LIMIT ?", (TAIL_SIZE,)).fetchall()
+        tail = _tails[path] = deque((_row_to_entry(r) for r in reversed(rows)), maxlen=TAIL_SIZE)
+    return tail
+
+
+def _is_duplicate(entry, last, window_s):
+    try:
+        last_time = datetime.fromisoformat(last.get("date", "").replace("Z", ""))
+        gap = (datetime.fromisoformat(entry["date"].replace("Z", "")) - last_time).total_seconds()
+    except Exception:
+        return False
+    return (
+        last.get("query") == entry["query"] and
+        last.get("intent") == entry.get("intent") and
+        abs(float(last.get("confidence", 0.0)) - float(entry.get("confidence", 0.0))) < 1e-6 and
+        gap <= window_s
+    )
+
+
+def append(entry, path=LOG_DB_PATH, dedup_window_s=DEDUP_WINDOW_S):
+    """Append one entry; return the stored entry, or the earlier one if this is a repeat
+    of the last logged query within ``dedup_window_s`` (Streamlit reruns)."""
+    conn = get_conn(path)
+    with _tail_lock:
+        tail = _prime_tail(conn, path)
+        if tail and _is_duplicate(entry, tail[-1], dedup_window_s):
+            return tail[-1]
+        with conn:
+            _insert(conn, entry)
+        tail.append(entry)
+    return entry
+
+
+def _where(since=None, until=None, before=None, min_confidence=None):
+    clauses, params = [], []
+    if since:
+        clauses.append("date >= ?")
+        params.append(since)
+    if until:
+        clauses.append("date <= ?")
+        params.append(until)
+    if before:
+        clauses.append("date < ?")
+        params.append(before)
+    if min_confidence is not None:
+        clauses.append("confidence >= ?")
+        params.append(float(min_confidence))
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def iter_entries(path=LOG_DB_PATH, since=None, until=None, min_confidence=None, batch_size=1000, before=None,
+                 newest_first=False, limit=None):
+    """Yield entries oldest first (or newest first), optionally filtered by ISO date
+    bounds and confidence.
+
+    ``since``/``until`` are inclusive; ``before`` is an exclusive upper bound."""
+    where, params = _where(since, until, before, min_confidence)
+    sql = f"SELECT * FROM queries {where} ORDER BY id" + (" DESC" if newest_first else "")
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    cur = get_conn(path).execute(sql, params)
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        for r in rows:
+            yield _row_to_entry(r)
+
+
+def count_entries(path=LOG_DB_PATH, since=None, until=None, min_confidence=None, before=None):
+    where, params = _where(since, until, before, min_confidence)
+    return get_conn(path).execute(f"SELECT COUNT(*) FROM queries {where}", params).fetchone()[0]
+
+
+def load_all(path=LOG_DB_PATH):
+    return list(iter_entries(path))
+
+
+def recent(n=100, path=LOG_DB_PATH, intent=None):
+    if intent is None:
+        rows = get_conn(path).execute("SELECT * FROM queries ORDER BY id DESC LIMIT ?", (int(n),)).fetchall()
+    else:
+        rows = get_conn(path).execute(
+            "SELECT * FROM queries WHERE intent = ? ORDER BY id DESC LIMIT ?", (intent, int(n))).fetchall()
+    return [_row_to_entry(r) for r in rows]
+
+
+def count(path=LOG_DB_PATH):
+    return get_conn(path).execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+
+
+# -----------------------
+# Rollup reads
+# -----------------------
+def summary(path=LOG_DB_PATH):
+    """(total queries, average confidence or None)."""
+    total, conf_sum = get_conn(path).execute(
+        "SELECT COALESCE(SUM(count), 0), COALESCE(SUM(conf_sum), 0) FROM intent_daily").fetchone()
+    return total, (conf_sum / total if total else None)
+
+
+def intent_totals(path=LOG_DB_PATH):
+    """[(intent, count, avg confidence)] ordered by count."""
+    rows = get_conn(path).execute(
+        "SELECT intent, SUM(count) AS n, SUM(conf_sum) AS s FROM intent_daily GROUP BY intent ORDER BY n DESC").fetchall()
+    return [(r["intent"], r["n"], r["s"] / r["n"] if r["n"] else 0.0) for r in rows]
+
+
+def daily_counts(path=LOG_DB_PATH):
+    """[(day, count)] ordered by day."""
+    rows = get_conn(path).execute("SELECT day, SUM(count) FROM intent_daily GROUP BY day ORDER BY day").fetchall()
+    return [(r[0], r[1]) for r in rows]
+
+
+def confidence_histogram(path=LOG_DB_PATH, intent=None):
+    """[(intent, bucket index, count)]; bucket i covers [i, i+1) / CONF_BUCKETS."""
+    sql = "SELECT intent, bucket, count FROM confidence_hist"
+    params = ()
+    if intent is not None:
+        sql += " WHERE intent = ?"
+        params = (intent,)
+    return [(r[0], r[1], r[2]) for r in get_conn(path).execute(sql + " ORDER BY bucket", params).fetchall()]
+
+
+def entity_totals(path=LOG_DB_PATH):
+    rows = get_conn(path).execute("SELECT label, count FROM entity_counts ORDER BY count DESC").fetchall()
+    return [(r[0], r[1]) for r in rows]
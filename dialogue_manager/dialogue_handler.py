@@ -3,6 +3,7 @@
 from typing import Dict, Any, List, Optional
 from nlu_engine.nlu_router import NLUProcessor
 from database import bank_crud
+from monitoring import tracing, metrics, memory
 
 CANCEL_WORDS = {"cancel", "abort", "stop", "exit"}
 RESTART_WORDS = {"restart", "reset", "start over"}
@@ -79,14 +80,20 @@ def _is_banking_like(text: str, intent: Optional[str]) -> bool:
     return any(w in low for w in merged)
 
 class DialogueHandler:
-    def __init__(self):
-        self.nlu = NLUProcessor()
+    def __init__(self, nlu=None):
+        # anything with process(text) -> (intent, confidence, entities) can stand in for the NLU
+        self.nlu = nlu or NLUProcessor()
+        memory.track("dialogue_handler", self)
         self.state: Dict[str, Any] = {"intent": None, "step": 0, "ctx": {}, "intent_lock": False}
 
     def reset(self):
         self.state = {"intent": None, "step": 0, "ctx": {}, "intent_lock": False}
 
     def handle_message(self, user_text: str, current_user: Optional[str] = None, from_control: bool = False) -> Dict[str, Any]:
+        with tracing.span("dialogue.handle_message"):
+            return self._handle_message(user_text, current_user, from_control)
+
+    def _handle_message(self, user_text: str, current_user: Optional[str], from_control: bool) -> Dict[str, Any]:
         low = user_text.strip().lower()
         if low in CANCEL_WORDS:
             self.reset()
@@ -98,6 +105,7 @@ class DialogueHandler:
         # Detect strongly general knowledge queries and force non-banking
         if not from_control and _text_has_any(low, NON_BANK_QUESTION_PATTERNS):
             self.reset()
+            metrics.FALLBACKS.inc(reason="general_question")
             return {"message": "unknown", "indicator": "none", "end_flow": True}
 
         if not from_control:
@@ -111,10 +119,17 @@ class DialogueHandler:
 
 
         is_supported_intent = intent in BANK_INTENTS
-        looks_banking = _is_banking_like(user_text, intent)
+        with tracing.span("dialogue.lexicon_gate"):
+            looks_banking = _is_banking_like(user_text, intent)
 
         if (not is_supported_intent) or (confidence < UNKNOWN_CONF_THRESHOLD) or (not looks_banking and confidence < 0.95):
             self.reset()
+            if not is_supported_intent:
+                metrics.FALLBACKS.inc(reason="unsupported_intent")
+            elif confidence < UNKNOWN_CONF_THRESHOLD:
+                metrics.FALLBACKS.inc(reason="low_confidence")
+            else:
+                metrics.FALLBACKS.inc(reason="not_banking")
             return {"message": "unknown", "indicator": "none", "end_flow": True}
 
         if not self.state["intent"]:
@@ -151,6 +166,11 @@ class DialogueHandler:
     # Start flows
     # -------------------------
     def _start_intent(self, intent: str, entities: List[Dict[str, Any]], current_user: Optional[str], confidence: float = 1.0) -> Dict[str, Any]:
+        metrics.INTENTS_SERVED.inc(intent=intent)
+        with tracing.span(f"dialogue.{intent}.start"):
+            return self._start_intent_flow(intent, entities, current_user, confidence)
+
+    def _start_intent_flow(self, intent: str, entities: List[Dict[str, Any]], current_user: Optional[str], confidence: float) -> Dict[str, Any]:
         self.state["intent"] = intent
         self.state["step"] = 1
         self.state["ctx"] = {"entities": entities, "confidence": confidence}
@@ -210,12 +230,13 @@ class DialogueHandler:
         intent = self.state["intent"]
         step = self.state["step"]
 
-        if intent == "transfer_money":
-            return self._flow_transfer(user_text, entities, step, current_user)
-        if intent == "check_balance":
-            return self._flow_balance(user_text, step, current_user)
-        if intent == "card_block":
-            return self._flow_card_block(user_text, step, current_user)
+        with tracing.span(f"dialogue.{intent}.step{step}"):
+            if intent == "transfer_money":
+                return self._flow_transfer(user_text, entities, step, current_user)
+            if intent == "check_balance":
+                return self._flow_balance(user_text, step, current_user)
+            if intent == "card_block":
+                return self._flow_card_block(user_text, step, current_user)
 
         self.reset()
         return {"message": "unknown", "indicator": "none", "end_flow": True}
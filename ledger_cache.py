@@ -0,0 +1,187 @@
+# ledger_cache.py
+#
+# Per-user dashboard data shared by app.py, main.py and chatbot.py.
+#
+# The Home, Transactions and Dashboard pages used to query the transactions
+# and rebuild DataFrames and Altair charts on every Streamlit rerun. Here the
+# prepared data for a user is built once and kept, process-wide, under that
+# user's ledger version (bank_crud.get_ledger_version, bumped inside
+# transfer_money and create_account). A rerun costs one single-row SELECT
+# until the user's ledger actually changes. Charts are built on first use
+# and cached with the data.
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import altair as alt
+
+from database import bank_crud
+from monitoring import metrics
+
+MAX_CACHED_USERS = 256
+RECENT_ROWS = 4
+TOP_COUNTERPARTIES = 5
+
+LEDGER_CACHE = metrics.counter("bankbot_ledger_cache_total", "Dashboard data lookups by result.", ("result",))
+
+
+def transactions_to_dataframe(txns):
+    if not txns:
+        return pd.DataFrame(columns=["ID", "From", "To", "Amount", "Date", "Type"])
+    rows = [list(t)[:6] for t in txns]
+    df = pd.DataFrame(rows, columns=["ID", "From", "To", "Amount", "Date", "Type"])
+    try:
+        df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
+        df["Amount"] = pd.to_numeric(df["Amount"], errors='coerce').fillna(0)
+    except Exception:
+        pass
+    try:
+        df["_ts"] = df["Date"].dt.round('S')
+        group_cols = ["From", "To", "Amount", "_ts"]
+        to_drop = []
+        for _, grp in df.groupby(group_cols):
+            types = set(grp["Type"].astype(str).str.lower().tolist())
+            if "debit" in types and "credit" in types and len(grp) >= 2:
+                credits = grp[grp["Type"].astype(str).str.lower() == "credit"].index.tolist()
+                to_drop.extend(credits)
+        if to_drop:
+            df = df.drop(index=to_drop).reset_index(drop=True)
+        df = df.drop(columns=["_ts"], errors='ignore')
+    except Exception:
+        pass
+    return df
+
+
+def top_counterparties(df, account_set, n=TOP_COUNTERPARTIES):
+    """Top ``n`` counterparties by absolute volume, as a Counterparty/Amount frame.
+
+    The counterparty of a row is the side that is not one of the user's own
+    accounts. When both sides are the user's (own-account transfer) it is the
+    receiving side, and when neither is, the sending side. That reduces to
+    To where From is an own account, else From.
+    """
+    own_from = df["From"].isin(account_set).to_numpy()
+    counterparty = np.where(own_from, df["To"].to_numpy(), df["From"].to_numpy())
+    totals = df["Amount"].groupby(counterparty).sum().abs()
+    totals.index.name = "Counterparty"
+    return totals.reset_index().sort_values("Amount", ascending=False).head(n)
+
+
+class LedgerView:
+    """Prepared, read-only ledger data for one user at one ledger version."""
+
+    def __init__(self, user, version, txns, accounts):
+        self.user = user
+        self.version = version
+        self.txn_count = len(txns)
+        self.account_set = set(a[0] for a in accounts)
+        self.df = transactions_to_dataframe(txns)
+        types = self.df["Type"].astype(str).str.lower()
+        self.total_tx = len(self.df)
+        self.credits = self.df[types == "credit"]["Amount"].sum()
+        self.debits = self.df[types == "debit"]["Amount"].sum()
+        self._built = {}
+        self._lock = threading.RLock()  # counterparty_chart builds on top_counterparties
+
+    def _memo(self, name, build):
+        with self._lock:
+            if name not in self._built:
+                try:
+                    self._built[name] = build()
+                except Exception:
+                    self._built[name] = None
+            return self._built[name]
+
+    def display_df(self):
+        """Transactions page table (timestamps as text)."""
+        def build():
+            df = self.df.copy()
+            if not df.empty and "Date" in df.columns:
+                df["Date"] = df["Date"].dt.strftime('%Y-%m-%d %H:%M')
+            return df
+        return self._memo("display_df", build)
+
+    def recent(self):
+        return self._memo("recent", lambda: self.df.sort_values("Date", ascending=False).head(RECENT_ROWS))
+
+    def cashflow_chart(self):
+        def build():
+            if self.df.empty or "Date" not in self.df.columns:
+                return None
+            chart_data = self.df.groupby(self.df["Date"].dt.date)["Amount"].sum().reset_index()
+            return alt.Chart(chart_data).mark_area(
+                line={'color':'#764ba2'},
+                color=alt.Gradient(
+                    gradient='linear',
+                    stops=[alt.GradientStop(color='rgba(118, 75, 162, 0.5)', offset=0),
+                           alt.GradientStop(color='rgba(118, 75, 162, 0.0)', offset=1)],
+                    x1=1, x2=1, y1=1, y2=0
+                )
+            ).encode(
+                x=alt.X('Date:T', axis=alt.Axis(format='%b %d', title='Date')),
+                y=alt.Y('Amount:Q', title='Volume (₹)'),
+                tooltip=['Date', 'Amount']
+            ).properties(height=350).configure_view(strokeWidth=0)
+        return self._memo("cashflow_chart", build)
+
+    def type_pie_chart(self):
+        def build():
+            pie_df = self.df.groupby(self.df["Type"].astype(str).str.title()).agg({"Amount":"sum"}).reset_index()
+            pie_df.columns = ["Type","Amount"]
+            return alt.Chart(pie_df).mark_arc(innerRadius=60, outerRadius=100).encode(
+                theta=alt.Theta(field="Amount", type="quantitative"),
+                color=alt.Color(field="Type", type="nominal", scale=alt.Scale(range=['#10B981','#EF4444']), legend=None),
+                tooltip=['Type','Amount']
+            ).properties(height=300)
+        return self._memo("type_pie_chart", build)
+
+    def top_counterparties(self):
+        return self._memo("top_counterparties", lambda: top_counterparties(self.df, self.account_set))
+
+    def counterparty_chart(self):
+        def build():
+            top_cp = self.top_counterparties()
+            if top_cp is None or top_cp.empty:
+                return None
+            return alt.Chart(top_cp).mark_bar(cornerRadius=5).encode(
+                x=alt.X('Amount:Q', title='Volume'),
+                y=alt.Y('Counterparty:N', sort='-x'),
+                color=alt.Color('Amount:Q', scale=alt.Scale(scheme='purples')),
+                tooltip=['Counterparty','Amount']
+            ).properties(height=300)
+        return self._memo("counterparty_chart", build)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_ledger(user):
+    """LedgerView for ``user``, rebuilt only when their ledger version moved."""
+    version = bank_crud.get_ledger_version(user)
+    with _cache_lock:
+        view = _cache.get(user)
+        if view is not None and view.version == version:
+            _cache.move_to_end(user)
+            LEDGER_CACHE.inc(result="hit")
+            return view
+    LEDGER_CACHE.inc(result="miss")
+    # a transfer landing between the version read and these reads only makes the
+    # view newer than its version, which costs one extra rebuild, never stale data
+    view = LedgerView(user, version, bank_crud.list_transactions_for_user(user), bank_crud.list_user_accounts(user))
+    with _cache_lock:
+        _cache[user] = view
+        _cache.move_to_end(user)
+        while len(_cache) > MAX_CACHED_USERS:
+            _cache.popitem(last=False)
+    return view
+
+
+def invalidate(user=None):
+    with _cache_lock:
+        if user is None:
+            _cache.clear()
+        else:
+            _cache.pop(user, None)
@@ -0,0 +1,211 @@
+# monitoring/memory.py
+#
+# Periodic memory sampling for the chat app process. A daemon thread records,
+# every BANKBOT_MEM_SAMPLE_S seconds:
+#
+#   - process RSS (and peak RSS)
+#   - live chat sessions, DialogueHandlers and intent models, tracked through
+#     weak references so tracking never keeps anything alive
+#   - chat_history length and approximate bytes per session
+#   - resident parameter/vector bytes of each model
+#   - tracemalloc's top allocating source lines (BANKBOT_TRACEMALLOC=1; it
+#     slows every allocation, so it is off by default)
+#
+# Samples are kept in a short ring for the Admin memory tab and mirrored into
+# monitoring.metrics gauges for /metrics.
+
+import os
+import sys
+import weakref
+import logging
+import datetime
+import threading
+import tracemalloc
+from collections import deque
+
+from monitoring import metrics
+
+SAMPLE_INTERVAL_S = float(os.getenv("BANKBOT_MEM_SAMPLE_S", "30"))
+TRACEMALLOC_ENABLED = os.getenv("BANKBOT_TRACEMALLOC", "0") == "1"
+TRACEMALLOC_FRAMES = 1
+TOP_ALLOCATORS = 15
+HISTORY_SAMPLES = 120
+
+RSS_BYTES = metrics.gauge("bankbot_process_rss_bytes", "Resident set size of the app process.")
+LIVE_OBJECTS = metrics.gauge("bankbot_live_objects", "Live tracked objects by kind.", ("kind",))
+CHAT_HISTORY_AVG = metrics.gauge("bankbot_chat_history_avg_turns", "Average chat_history length per live session.")
+SAMPLE_FAILURES = metrics.counter("bankbot_memory_sample_failures_total", "Memory samples that raised.")
+
+_log = logging.getLogger("bankbot.memory")
+
+_tracked = {}           # kind -> WeakSet
+_sessions = weakref.WeakKeyDictionary()  # DialogueHandler -> that session's chat_history list
+_lock = threading.Lock()
+_samples = deque(maxlen=HISTORY_SAMPLES)
+_sampler = None
+
+
+def track(kind, obj):
+    """Count ``obj`` under ``kind`` while it is alive."""
+    with _lock:
+        _tracked.setdefault(kind, weakref.WeakSet()).add(obj)
+
+
+def track_session(handler, chat_history):
+    """Called on every Streamlit rerun; the entry disappears with the session's handler."""
+    with _lock:
+        _sessions[handler] = chat_history
+
+
+# -----------------------
+# Measurements
+# -----------------------
+def rss_bytes():
+    """(current, peak) resident set size in bytes; current is None where /proc is unavailable."""
+    current = None
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    peak = None
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        pass
+    return current, peak
+
+
+def deep_size(obj, _seen=None, _depth=0):
+    """Approximate bytes held by obj and the containers/strings/datetimes inside it."""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen or _depth > 6:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    # session threads keep mutating these; copy first (one C call) and walk the copy
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, _seen, _depth + 1) + deep_size(v, _seen, _depth + 1) for k, v in obj.copy().items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_size(v, _seen, _depth + 1) for v in list(obj))
+    return size
+
+
+def model_bytes(model):
+    """Resident bytes of an IntentClassifier / EmbeddingIntentIndex (0 if not loaded)."""
+    total = 0
+    net = getattr(model, "model", None)
+    if net is not None and hasattr(net, "parameters"):
+        total += sum(p.numel() * p.element_size() for p in net.parameters())
+    vectors = getattr(model, "_vectors", None)
+    if vectors is not None:
+        total += vectors.nbytes
+    encoder = getattr(model, "encoder", None)
+    if encoder is not None and encoder is not model:
+        total += model_bytes(encoder)
+    return total
+
+
+def _top_allocators(limit=TOP_ALLOCATORS):
+    if not tracemalloc.is_tracing():
+        return []
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    rows = []
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        rows.append({"where": f"{frame.filename}:{frame.lineno}", "size_kb": stat.size / 1024.0, "count": stat.count})
+    return rows
+
+
+def sample():
+    """Take one sample now, store it in the ring and update the gauges."""
+    current, peak = rss_bytes()
+    with _lock:
+        live = {kind: list(objs) for kind, objs in _tracked.items()}
+        sessions = list(_sessions.items())
+
+    lengths = [len(h) for _, h in sessions]
+    history_bytes = [deep_size(h) for _, h in sessions]
+    handler_bytes = [deep_size(getattr(handler, "state", None)) for handler, _ in sessions]
+    models = []
+    for kind in ("intent_model", "embedding_index"):
+        for m in live.get(kind, []):
+            models.append({
+                "kind": kind,
+                "source": getattr(m, "model_dir", None) or getattr(m, "index_dir", None),
+                "loaded": bool(getattr(m, "is_loaded", True)),
+                "mb": model_bytes(m) / 1e6,
+            })
+    n = len(sessions)
+    row = {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "rss_mb": current / 1e6 if current else None,
+        "peak_rss_mb": peak / 1e6 if peak else None,
+        "sessions": n,
+        "live": {kind: len(objs) for kind, objs in live.items()},
+        "chat_history": {
+            "avg_turns": sum(lengths) / n if n else 0.0,
+            "max_turns": max(lengths) if lengths else 0,
+            "total_turns": sum(lengths),
+            "avg_kb": sum(history_bytes) / n / 1024.0 if n else 0.0,
+        },
+        "avg_session_kb": (sum(history_bytes) + sum(handler_bytes)) / n / 1024.0 if n else 0.0,
+        "models": models,
+        "models_mb": sum(m["mb"] for m in models),
+        "top_allocators": _top_allocators(),
+    }
+    with _lock:
+        _samples.append(row)
+
+    if current:
+        RSS_BYTES.set(current)
+    LIVE_OBJECTS.set(n, kind="session")
+    for kind, objs in live.items():
+        LIVE_OBJECTS.set(len(objs), kind=kind)
+    CHAT_HISTORY_AVG.set(row["chat_history"]["avg_turns"])
+    return row
+
+
+def samples():
+    with _lock:
+        return list(_samples)
+
+
+def latest():
+    with _lock:
+        return _samples[-1] if _samples else None
+
+
+def _run(interval, stop):
+    while not stop.wait(interval):
+        try:
+            sample()
+        except Exception:
+            # a failed sample must never take the app down, but should not vanish either
+            SAMPLE_FAILURES.inc()
+            _log.warning("memory sample failed", exc_info=True)
+
+
+def start_sampler(interval=SAMPLE_INTERVAL_S, trace_allocations=TRACEMALLOC_ENABLED):
+    """Start the sampling thread once per process (safe to call on every rerun)."""
+    global _sampler
+    with _lock:
+        if _sampler is not None:
+            return _sampler
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        stop = threading.Event()
+        thread = threading.Thread(target=_run, args=(interval, stop), name="memory-sampler", daemon=True)
+        thread.start()
+        _sampler = (thread, stop)
+    sample()
+    return _sampler
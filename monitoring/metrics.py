@@ -0,0 +1,172 @@
+# monitoring/metrics.py
+#
+# Process-wide Prometheus counters/gauges and a tiny scrape endpoint.
+#
+#   metrics.INTENTS_SERVED.inc(intent="check_balance")
+#
+# An increment is one dict update under a lock, so call sites can count every
+# request. serve() starts a daemon http.server thread answering GET /metrics
+# with every metric plus the tracing latency summaries in text format 0.0.4.
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from monitoring import tracing
+
+METRICS_HOST = os.getenv("BANKBOT_METRICS_HOST", "127.0.0.1")
+# 0 disables the endpoint (metrics are still counted)
+METRICS_PORT = int(os.getenv("BANKBOT_METRICS_PORT", "9108") or 0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format(v):
+    # whole numbers verbatim: "%g" would round large counters to 6 significant digits
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(dict(zip(self.labelnames, key)), v) for key, v in items]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, v in self.samples():
+            label_str = ",".join(f'{k}="{_escape(val)}"' for k, val in labels.items())
+            lines.append(f"{self.name}{{{label_str}}} {_format(v)}" if label_str else f"{self.name} {_format(v)}")
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+_metrics = {}
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name, documentation, labelnames):
+    with _registry_lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, documentation, labelnames)
+    return metric
+
+
+def counter(name, documentation, labelnames=()):
+    return _register(Counter, name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=()):
+    return _register(Gauge, name, documentation, labelnames)
+
+
+# -----------------------
+# BankBot metrics
+# -----------------------
+NLU_PREDICTIONS = counter("bankbot_nlu_predictions_total", "Intent predictions made by the NLU router.", ("intent",))
+INTENTS_SERVED = counter("bankbot_intents_served_total", "Banking flows started by the dialogue handler.", ("intent",))
+FALLBACKS = counter("bankbot_fallback_total", "Messages the dialogue handler answered as unknown.", ("reason",))
+TRANSFERS = counter("bankbot_transfers_total", "Transfer attempts by outcome.", ("result", "reason"))
+DB_LOCK_RETRIES = counter("bankbot_db_lock_retries_total", "SQLite writes retried after 'database is locked'.", ("op",))
+MODEL_CACHE = counter("bankbot_model_cache_total", "Intent model lookups served from memory (hit) or that had to load (miss).", ("cache", "result"))
+
+
+def export_text():
+    """Every registered metric plus the tracing latency summaries."""
+    with _registry_lock:
+        metrics = [_metrics[name] for name in sorted(_metrics)]
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n" + tracing.export_text()
+
+
+def reset():
+    with _registry_lock:
+        metrics = list(_metrics.values())
+    for metric in metrics:
+        metric.reset()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = export_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per scrape would drown the app log
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve(port=METRICS_PORT, host=METRICS_HOST):
+    """Start the /metrics endpoint once per process; returns the bound port or None.
+
+    Streamlit re-runs the page script on every interaction, so repeated calls
+    are no-ops. A port already taken (e.g. a second app process) leaves the
+    endpoint off rather than failing the app.
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server.server_address[1]
+        if not port:
+            return None
+        try:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError:
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server.server_address[1]
@@ -0,0 +1,152 @@
+# monitoring/tracing.py
+#
+# In-process latency tracing. Code marks stages with
+#
+#   with tracing.span("nlu.forward"):
+#       ...
+#
+# or @tracing.traced("db.get_account"), and every finished span is recorded in
+# a per-name histogram. Each histogram keeps exact count/sum/min/max plus a
+# fixed-size reservoir sample for p50/p95/p99, so memory stays bounded however
+# long the process runs. snapshot() feeds the Admin latency tab; export_text()
+# renders the same numbers as Prometheus-style summary lines.
+
+import os
+import time
+import random
+import threading
+import functools
+
+# BANKBOT_TRACING=0 turns every span into a no-op
+TRACING_ENABLED = os.getenv("BANKBOT_TRACING", "1") != "0"
+RESERVOIR_SIZE = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    def __init__(self, name, reservoir_size=RESERVOIR_SIZE):
+        self.name = name
+        self.reservoir_size = reservoir_size
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._samples = []
+        self._rng = random.Random(0)
+        self._lock = threading.Lock()
+
+    def record(self, ms):
+        with self._lock:
+            self.count += 1
+            self.total += ms
+            if self.min is None or ms < self.min:
+                self.min = ms
+            if self.max is None or ms > self.max:
+                self.max = ms
+            if len(self._samples) < self.reservoir_size:
+                self._samples.append(ms)
+            else:
+                # reservoir sampling (Algorithm R): every value so far is kept with equal probability
+                j = self._rng.randrange(self.count)
+                if j < self.reservoir_size:
+                    self._samples[j] = ms
+
+    def quantiles(self, qs=QUANTILES):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {q: None for q in qs}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in qs}
+
+    def summary(self):
+        qs = self.quantiles()
+        return {
+            "name": self.name,
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else None,
+            "p50_ms": qs[0.5],
+            "p95_ms": qs[0.95],
+            "p99_ms": qs[0.99],
+            "max_ms": self.max,
+            "total_ms": self.total,
+        }
+
+
+_histograms = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(name):
+    h = _histograms.get(name)
+    if h is None:
+        with _registry_lock:
+            h = _histograms.setdefault(name, Histogram(name))
+    return h
+
+
+def record(name, ms):
+    """Record an already-measured duration (milliseconds)."""
+    if TRACING_ENABLED:
+        histogram(name).record(ms)
+
+
+class span:
+    """Context manager timing one stage; the duration is recorded even if the block raises."""
+
+    __slots__ = ("name", "start", "ms")
+
+    def __init__(self, name):
+        self.name = name
+        self.ms = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.ms = (time.perf_counter() - self.start) * 1000.0
+        record(self.name, self.ms)
+        return False
+
+
+def traced(name=None):
+    """Decorator form of span(); the span name defaults to module.function."""
+    def decorate(fn):
+        span_name = name or f"{fn.__module__}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACING_ENABLED:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram(span_name).record((time.perf_counter() - start) * 1000.0)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    """Summaries of every span, slowest p95 first."""
+    with _registry_lock:
+        hists = list(_histograms.values())
+    rows = [h.summary() for h in hists if h.count]
+    return sorted(rows, key=lambda r: r["p95_ms"] or 0.0, reverse=True)
+
+
+def export_text(prefix="bankbot_span_latency_ms"):
+    """Prometheus text-format summaries, one block per span name."""
+    lines = [f"# HELP {prefix} Stage latency in milliseconds.", f"# TYPE {prefix} summary"]
+    for row in sorted(snapshot(), key=lambda r: r["name"]):
+        label = row["name"].replace("\\", "\\\\").replace('"', '\\"')
+        for q, key in ((0.5, "p50_ms"), (0.95, "p95_ms"), (0.99, "p99_ms")):
+            lines.append(f'{prefix}{{span="{label}",quantile="{q}"}} {row[key]:.3f}')
+        lines.append(f'{prefix}_sum{{span="{label}"}} {row["total_ms"]:.3f}')
+        lines.append(f'{prefix}_count{{span="{label}"}} {row["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _registry_lock:
+        _histograms.clear()
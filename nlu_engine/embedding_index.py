@@ -0,0 +1,274 @@
+# nlu_engine/embedding_index.py
+#
+# Nearest-neighbour intent classifier. Every example in intents.json (trained
+# and pending) is encoded once with a small sentence encoder and kept as a row
+# of one L2-normalised float32 matrix; a query is classified by a single
+# matrix-vector product (cosine similarity) and a top-k vote over the nearest
+# examples.
+#
+# New examples or whole new intents only need their own vectors appended, so
+# an intent added on the admin "Manage Intents" page is served within seconds,
+# without a transformer retrain. Vectors are cached under models/intent_index
+# and reused across restarts.
+
+import os
+import json
+import time
+import threading
+
+import numpy as np
+
+from monitoring import memory
+
+INTENTS_PATH = "nlu_engine/intents.json"
+INDEX_DIR = "models/intent_index"
+ENCODER_NAME = os.getenv("BANKBOT_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# nearest examples that vote on the intent
+NEIGHBOURS = 5
+# softmax temperature over per-intent similarity; cosine scores sit close together
+TEMPERATURE = 0.05
+# how often (seconds) classifier() may stat intents.json for edits
+SYNC_INTERVAL = 2.0
+
+
+class SentenceEncoder:
+    """Mean-pooled transformer sentence embeddings (MiniLM by default)."""
+
+    def __init__(self, model_name=ENCODER_NAME, max_length=64):
+        from transformers import AutoTokenizer, AutoModel
+
+        self.model_name = model_name
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name)
+        self.model.eval()
+        self.dim = self.model.config.hidden_size
+
+    def encode(self, texts, batch_size=64):
+        import torch
+
+        texts = [str(t) for t in texts]
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        # similar lengths per batch keep padding small
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for b in range(0, len(order), batch_size):
+            idx = order[b:b + batch_size]
+            enc = self.tokenizer([texts[i] for i in idx], padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors="pt")
+            with torch.no_grad():
+                hidden = self.model(**enc).last_hidden_state
+            mask = enc["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+            out[idx] = torch.nn.functional.normalize(pooled, dim=1).numpy()
+        return out
+
+
+def _intent_examples(intents_path):
+    """[(text, intent)] for every trained and pending example."""
+    with open(intents_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    pairs = []
+    for intent in data.get("intents", []):
+        for ex in list(intent.get("examples", [])) + list(intent.get("new_examples", [])):
+            txt = ex.get("text", "") if isinstance(ex, dict) else str(ex)
+            if txt.strip():
+                pairs.append((txt.strip(), intent["name"]))
+    return pairs
+
+
+class EmbeddingIntentIndex:
+    """Drop-in alternative to IntentClassifier: predict(text, top_k) -> [{"intent", "confidence"}]."""
+
+    def __init__(self, intents_path=INTENTS_PATH, index_dir=INDEX_DIR, encoder=None,
+                 neighbours=NEIGHBOURS, temperature=TEMPERATURE, sync_interval=SYNC_INTERVAL):
+        self.intents_path = intents_path
+        self.index_dir = index_dir
+        self.encoder = encoder or SentenceEncoder()
+        self.neighbours = neighbours
+        self.temperature = temperature
+        self.sync_interval = sync_interval
+
+        self.intent_names = []          # label id -> intent name
+        self._label_ids = {}            # intent name -> label id
+        self.texts = []                 # row -> example text
+        self._vectors = np.zeros((0, self.encoder.dim), dtype=np.float32)  # capacity >= n
+        self._labels = np.zeros(0, dtype=np.int32)
+        self.n = 0
+
+        self._lock = threading.Lock()
+        # one sync at a time, so concurrent requests never encode and append the same examples twice
+        self._sync_lock = threading.Lock()
+        self._mtime = None
+        self._last_check = 0.0
+        memory.track("embedding_index", self)
+        self._load_cache()
+        self.sync()
+
+    # -----------------------
+    # Storage
+    # -----------------------
+    @property
+    def vectors(self):
+        return self._vectors[:self.n]
+
+    @property
+    def labels(self):
+        return self._labels[:self.n]
+
+    def _label_id(self, name):
+        if name not in self._label_ids:
+            self._label_ids[name] = len(self.intent_names)
+            self.intent_names.append(name)
+        return self._label_ids[name]
+
+    def _append(self, vecs, label_ids, texts):
+        """Append rows, doubling capacity when full so appends stay amortised O(rows).
+
+        Rows below self.n are never written again, so a reader's [:n] views stay valid."""
+        need = self.n + len(vecs)
+        if need > len(self._vectors):
+            cap = max(need, 2 * len(self._vectors), 64)
+            grown = np.zeros((cap, self._vectors.shape[1]), dtype=np.float32)
+            grown[:self.n] = self.vectors
+            grown_labels = np.zeros(cap, dtype=np.int32)
+            grown_labels[:self.n] = self.labels
+            self._vectors, self._labels = grown, grown_labels
+        self._vectors[self.n:need] = vecs
+        self._labels[self.n:need] = label_ids
+        self.texts.extend(texts)
+        self.n = need
+
+    def _cache_paths(self):
+        return os.path.join(self.index_dir, "vectors.npy"), os.path.join(self.index_dir, "meta.json")
+
+    def _load_cache(self):
+        vec_path, meta_path = self._cache_paths()
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("encoder") != self.encoder.model_name:
+                return
+            vecs = np.load(vec_path)
+        except (OSError, ValueError):
+            return
+        if len(vecs) != len(meta["texts"]):
+            return
+        label_ids = [self._label_id(name) for name in meta["intents"]]
+        self._append(vecs, label_ids, meta["texts"])
+
+    def save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        vec_path, meta_path = self._cache_paths()
+        with self._lock:
+            vecs = self.vectors.copy()
+            meta = {"encoder": self.encoder.model_name, "texts": list(self.texts),
+                    "intents": [self.intent_names[i] for i in self.labels]}
+        np.save(vec_path + ".tmp.npy", vecs)
+        os.replace(vec_path + ".tmp.npy", vec_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    # -----------------------
+    # Updates
+    # -----------------------
+    def add_examples(self, texts, intent):
+        """Encode and append examples for ``intent`` (new intents are created on the fly)."""
+        texts = [t.strip() for t in texts if t and t.strip()]
+        if not texts:
+            return 0
+        vecs = self.encoder.encode(texts)
+        with self._lock:
+            self._append(vecs, [self._label_id(intent)] * len(texts), texts)
+        return len(texts)
+
+    def sync(self):
+        """Match the index to intents.json: encode only examples it has not seen and drop
+        rows whose example was removed. Returns the number of rows encoded."""
+        with self._sync_lock:
+            return self._sync()
+
+    def _sync(self):
+        try:
+            mtime = os.stat(self.intents_path).st_mtime_ns
+        except OSError:
+            return 0
+        if mtime == self._mtime:
+            return 0
+        wanted = _intent_examples(self.intents_path)
+        wanted_set = set(wanted)
+        with self._lock:
+            have = list(zip(self.texts, (self.intent_names[i] for i in self.labels)))
+            keep = [i for i, pair in enumerate(have) if pair in wanted_set]
+            if len(keep) < self.n:
+                # compact into new arrays and swap them in; predictions holding views of
+                # the old buffer keep a consistent vectors/labels pair
+                keep_idx = np.asarray(keep, dtype=np.int64)
+                self._vectors, self._labels = self.vectors[keep_idx], self.labels[keep_idx]
+                self.texts = [self.texts[i] for i in keep]
+                self.n = len(keep)
+            have_set = {have[i] for i in keep}
+        missing = [pair for pair in dict.fromkeys(wanted) if pair not in have_set]
+        if missing:
+            vecs = self.encoder.encode([t for t, _ in missing])
+            with self._lock:
+                self._append(vecs, [self._label_id(name) for _, name in missing], [t for t, _ in missing])
+        self._mtime = mtime
+        if missing or len(keep) < len(have):
+            self.save()
+        return len(missing)
+
+    def classifier(self):
+        """ModelSwapper-compatible accessor: re-syncs with intents.json at most every sync_interval."""
+        now = time.monotonic()
+        if now - self._last_check >= self.sync_interval:
+            self._last_check = now
+            self.sync()
+        return self
+
+    # -----------------------
+    # Prediction
+    # -----------------------
+    def _scores(self, query_vecs):
+        """(queries x intents) probabilities from a top-k neighbour vote."""
+        with self._lock:
+            # views are safe outside the lock: rows below n are never rewritten (see _append)
+            vectors, labels, n_intents = self.vectors, self.labels, len(self.intent_names)
+        sims = query_vecs @ vectors.T                     # cosine: rows are unit length
+        k = min(self.neighbours, sims.shape[1])
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        best = np.full((len(query_vecs), n_intents), -1.0, dtype=np.float32)
+        rows = np.arange(len(query_vecs))[:, None]
+        # per intent: similarity of its closest example among the k neighbours
+        np.maximum.at(best, (np.broadcast_to(rows, top.shape), labels[top]), sims[rows, top])
+        logits = np.where(best > -1.0, best / self.temperature, -np.inf)
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def _top_k(self, probs, top_k):
+        k = max(1, min(top_k, len(probs)))
+        idx = np.argsort(-probs)[:k]
+        return [{"intent": self.intent_names[i], "confidence": float(probs[i])} for i in idx]
+
+    def predict_batch(self, texts, top_k=1):
+        if not self.n:
+            return [[{"intent": "unknown", "confidence": 0.0}] for _ in texts]
+        probs = self._scores(self.encoder.encode(texts))
+        return [self._top_k(p, top_k) for p in probs]
+
+    def predict(self, text, top_k=1):
+        return self.predict_batch([text], top_k=top_k)[0]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_embedding_index(intents_path=INTENTS_PATH):
+    """Process-wide index, built (or loaded from cache) on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = EmbeddingIntentIndex(intents_path=intents_path)
+    return _index
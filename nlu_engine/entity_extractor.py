@@ -22,16 +22,14 @@ class EntityExtractor:
                     "pattern": re.compile(rp["pattern"], flags)
                 })
 
-        self.used_spans = []
-
     # -----------------------
     # Avoid overlapping spans
     # -----------------------
-    def _reserve(self, start, end):
-        for s, e in self.used_spans:
+    def _reserve(self, used_spans, start, end):
+        for s, e in used_spans:
             if not (end <= s or start >= e):
                 return False
-        self.used_spans.append((start, end))
+        used_spans.append((start, end))
         return True
 
     # -----------------------
@@ -47,7 +45,8 @@ class EntityExtractor:
     # Main extraction
     # -----------------------
     def extract(self, text):
-        self.used_spans = []
+        # spans are kept local so one extractor can serve concurrent callers
+        used_spans = []
         results = []
 
         text = str(text)
@@ -60,7 +59,7 @@ class EntityExtractor:
 
             for match in pattern.finditer(text):
                 start, end = match.span()
-                if not self._reserve(start, end):
+                if not self._reserve(used_spans, start, end):
                     continue
 
                 value = match.group(1) if match.groups() else match.group()
@@ -81,7 +80,7 @@ class EntityExtractor:
             keyword = p["pattern"][0]["LOWER"]
 
             for m in re.finditer(rf"\b{keyword}\b", lower):
-                if self._reserve(m.start(), m.end()):
+                if self._reserve(used_spans, m.start(), m.end()):
                     results.append({
                         "entity": label,
                         "value": text[m.start():m.end()],
@@ -0,0 +1,100 @@
+# nlu_engine/faq_matcher.py
+#
+# Local FAQ answer tier for the chat pipeline. When the dialogue handler does
+# not recognise a message, the chat UI asks this matcher first and only calls
+# the remote LLM if no FAQ question is similar enough.
+#
+# The FAQ questions are turned into an L2-normalised TF-IDF matrix (word uni-
+# and bigrams over the same stemmed tokens as faq_retriever) once per version
+# of faq_data.json; a match is one sparse vector-matrix product. Words the FAQ
+# vocabulary has never seen would otherwise just vanish from the query vector,
+# so the cosine is scaled down by how much of the query the vocabulary covers.
+
+import os
+import json
+import threading
+
+from nlu_engine.faq_retriever import FAQ_PATH, tokenize
+
+# cosine similarity a question must reach before its answer is used
+FAQ_MATCH_THRESHOLD = float(os.getenv("BANKBOT_FAQ_THRESHOLD", "0.6"))
+
+
+class FAQMatcher:
+    def __init__(self, faq_path=FAQ_PATH, threshold=FAQ_MATCH_THRESHOLD):
+        self.faq_path = faq_path
+        self.threshold = threshold
+        self.questions = []
+        self.answers = []
+        self.vectorizer = None
+        self.matrix = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Rebuild the matrix if faq_data.json changed since it was last built."""
+        try:
+            mtime = os.stat(self.faq_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.faq_path, "r", encoding="utf-8") as f:
+                faqs = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(faqs, dict):
+            return
+        questions = [str(q) for q in faqs]
+        answers = [str(faqs[q]) for q in faqs]
+        vectorizer, matrix = None, None
+        if questions:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+
+            vectorizer = TfidfVectorizer(tokenizer=tokenize, lowercase=False, token_pattern=None,
+                                         ngram_range=(1, 2), sublinear_tf=True)
+            try:
+                # answers widen the vocabulary/IDF; only questions are matched against
+                vectorizer.fit(questions + answers)
+                matrix = vectorizer.transform(questions)
+            except ValueError:  # every question was stopwords only
+                vectorizer = None
+        with self._lock:
+            self.questions, self.answers = questions, answers
+            self.vectorizer, self.matrix = vectorizer, matrix
+            self._mtime = mtime
+
+    def match(self, text):
+        """Best FAQ as {"question", "answer", "score"} if it clears the threshold, else None."""
+        with self._lock:
+            vectorizer, matrix = self.vectorizer, self.matrix
+            questions, answers = self.questions, self.answers
+        if vectorizer is None or not str(text).strip():
+            return None
+        tokens = tokenize(text)
+        if not tokens:
+            return None
+        coverage = sum(t in vectorizer.vocabulary_ for t in tokens) / len(tokens)
+        # rows are L2-normalised, so the dot product is the cosine similarity
+        scores = (matrix @ vectorizer.transform([str(text)]).T).toarray().ravel()
+        best = int(scores.argmax())
+        score = float(scores[best]) * coverage ** 0.5
+        if score < self.threshold:
+            return None
+        return {"question": questions[best], "answer": answers[best], "score": score}
+
+
+_matchers = {}
+
+
+def get_faq_matcher(faq_path=FAQ_PATH):
+    """Process-wide matcher per file; picks up edits to the FAQ file on the next call."""
+    key = os.path.abspath(faq_path)
+    matcher = _matchers.get(key)
+    if matcher is None:
+        matcher = _matchers[key] = FAQMatcher(faq_path)
+    else:
+        matcher.refresh()
+    return matcher
@@ -0,0 +1,182 @@
+# nlu_engine/faq_retriever.py
+#
+# Ranked FAQ search over faq_data.json ({question: answer}). An inverted index
+# (term -> {question: term frequency}) is built once and kept in sync with the
+# file by adding/removing only the entries that changed; queries are scored
+# with BM25 over the postings of their own terms, so a lookup touches a few
+# short lists instead of every FAQ.
+
+import os
+import re
+import json
+import math
+import heapq
+import threading
+
+FAQ_PATH = "faq_data.json"
+# question words count double: "how do I block my card" should match the
+# question about blocking cards before an answer that merely mentions cards
+QUESTION_WEIGHT = 2
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "to", "of", "in", "on", "for", "and", "or",
+    "i", "me", "my", "you", "your", "it", "do", "does", "can", "how", "what", "which",
+    "please", "with", "at", "by", "from", "this", "that", "there", "whats",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9₹]+")
+
+
+def stem(word):
+    """Light suffix stripping (plural, -ing, -ed, -ly) — enough to fold the
+    inflections that show up in banking questions without a stemmer dependency."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    for suffix, repl in (("ies", "y"), ("sses", "ss"), ("ing", ""), ("ed", ""), ("ly", ""), ("s", "")):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith("ss"):
+            word = word[: -len(suffix)] + repl
+            break
+    # "transferred" -> "transfer"; a final e goes so "rate", "rates" and "rated" meet
+    if len(word) > 4 and word[-1] == word[-2] and word[-1] not in "lsz":
+        word = word[:-1]
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    # single letters are mostly contraction debris ("what's" -> "what", "s")
+    return [stem(t) for t in _TOKEN_RE.findall(str(text).lower())
+            if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+class FAQRetriever:
+    def __init__(self, faq_path=FAQ_PATH, k1=BM25_K1, b=BM25_B):
+        self.faq_path = faq_path
+        self.k1 = k1
+        self.b = b
+        self.faqs = {}       # question -> answer
+        self.postings = {}   # term -> {question: weighted tf}
+        self.doc_len = {}    # question -> weighted length
+        self.total_len = 0
+        self._norms = None   # question -> BM25 length normalisation, rebuilt after edits
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    # -----------------------
+    # Index maintenance
+    # -----------------------
+    def _terms(self, question, answer):
+        tf = {}
+        for t in tokenize(question):
+            tf[t] = tf.get(t, 0) + QUESTION_WEIGHT
+        for t in tokenize(answer):
+            tf[t] = tf.get(t, 0) + 1
+        return tf
+
+    def _add(self, question, answer):
+        tf = self._terms(question, answer)
+        for term, n in tf.items():
+            self.postings.setdefault(term, {})[question] = n
+        length = sum(tf.values())
+        self.doc_len[question] = length
+        self.total_len += length
+        self.faqs[question] = answer
+        self._norms = None
+
+    def _remove(self, question):
+        answer = self.faqs.pop(question, None)
+        if answer is None:
+            return
+        for term in self._terms(question, answer):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(question, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_len -= self.doc_len.pop(question, 0)
+        self._norms = None
+
+    def add(self, question, answer):
+        with self._lock:
+            self._remove(question)
+            self._add(question, answer)
+
+    def remove(self, question):
+        with self._lock:
+            self._remove(question)
+
+    def sync(self, faqs):
+        """Bring the index in line with ``faqs``, touching only added, edited or deleted entries."""
+        with self._lock:
+            for q in [q for q in self.faqs if q not in faqs]:
+                self._remove(q)
+            for q, a in faqs.items():
+                if self.faqs.get(q) != a:
+                    self._remove(q)
+                    self._add(q, a)
+
+    def refresh(self):
+        """Re-sync from faq_path if the file changed since the last load (one stat() otherwise)."""
+        try:
+            mtime = os.stat(self.faq_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.faq_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict):
+            self.sync({str(q): str(a) for q, a in data.items()})
+        self._mtime = mtime
+
+    def __len__(self):
+        return len(self.faqs)
+
+    # -----------------------
+    # Search
+    # -----------------------
+    def search(self, query, k=5):
+        """Top-k FAQs for ``query`` as [{"question", "answer", "score"}], best first."""
+        terms = set(tokenize(query))
+        # under the lock: sync() from another session may be editing the postings
+        with self._lock:
+            n = len(self.faqs)
+            if not terms or not n:
+                return []
+            norms = self._norms
+            if norms is None:
+                avg_len = self.total_len / n
+                norms = self._norms = {q: self.k1 * (1 - self.b + self.b * length / avg_len)
+                                       for q, length in self.doc_len.items()}
+            k1p1 = self.k1 + 1
+            scores = {}
+            for term in terms:
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for q, tf in docs.items():
+                    scores[q] = scores.get(q, 0.0) + idf * tf * k1p1 / (tf + norms[q])
+            best = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+            return [{"question": q, "answer": self.faqs[q], "score": s} for q, s in best]
+
+
+_retrievers = {}
+
+
+def get_faq_retriever(faq_path=FAQ_PATH):
+    """Process-wide retriever per file, re-synced from disk when the file changes."""
+    key = os.path.abspath(faq_path)
+    retriever = _retrievers.get(key)
+    if retriever is None:
+        retriever = _retrievers[key] = FAQRetriever(faq_path)
+    else:
+        retriever.refresh()
+    return retriever
@@ -2,15 +2,79 @@
 
 import os
 import json
-import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+import time
+import threading
+from collections import OrderedDict
+
+from nlu_engine.student_model import is_student_dir, load_student, pack_ids
+from monitoring import tracing, metrics, memory
+
+# torch / transformers are imported inside _load() so that importing this
+# module stays cheap for pages that never run the classifier.
+
+INTENTS_PATH = "nlu_engine/intents.json"
+
+# lazy: load on first predict; eager: load (and warm up) in __init__;
+# background: start loading in a daemon thread from __init__
+LOAD_MODES = ("lazy", "eager", "background")
+WARMUP_PER_INTENT = 2
+# map model.safetensors instead of copying weights into private memory
+MMAP_WEIGHTS = os.getenv("BANKBOT_MMAP_WEIGHTS", "1") != "0"
+
+
+def warmup_texts(intents_path=INTENTS_PATH, per_intent=WARMUP_PER_INTENT):
+    """Pick a few representative utterances per intent from intents.json."""
+    try:
+        with open(intents_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return []
+    texts = []
+    for intent in data.get("intents", []):
+        picked = 0
+        for ex in intent.get("examples", []):
+            txt = ex.get("text", "") if isinstance(ex, dict) else str(ex)
+            if txt.strip():
+                texts.append(txt.strip())
+                picked += 1
+            if picked >= per_intent:
+                break
+    return texts
 
 
 class IntentClassifier:
-    def __init__(self, model_dir="models/intent_model"):
+    def __init__(self, model_dir="models/intent_model", load_mode="eager", warmup=None, intents_path=INTENTS_PATH,
+                 mmap_weights=MMAP_WEIGHTS):
+        if load_mode not in LOAD_MODES:
+            raise ValueError(f"load_mode must be one of {LOAD_MODES}, got '{load_mode}'")
         self.model_dir = model_dir
+        self.load_mode = load_mode
+        # warm-up is on by default for the modes that load ahead of the first request
+        self.warmup = (load_mode != "lazy") if warmup is None else warmup
+        self.intents_path = intents_path
+        self.mmap_weights = mmap_weights
+
+        self.tokenizer = None
+        self.model = None
+        self.weights_source = None
+        self.student_config = None
+        self.load_time = None
+        self.warmup_time = None
+        self.load_error = None
+        self._loaded = threading.Event()
+        self._attempted = threading.Event()
+        self._load_lock = threading.Lock()
+
+        self.label_map = self._load_label_map(model_dir)
+        memory.track("intent_model", self)
 
-        self.label_map = None
+        if load_mode == "eager":
+            self._ensure_loaded()
+        elif load_mode == "background":
+            threading.Thread(target=self._background_load, name="intent-preload", daemon=True).start()
+
+    @staticmethod
+    def _load_label_map(model_dir):
         id2label_path = os.path.join(model_dir, "id2label.json")
         label2id_path = os.path.join(model_dir, "label2id.json")
         labels_path = os.path.join(model_dir, "labels.json")
@@ -19,29 +83,74 @@ class IntentClassifier:
             with open(id2label_path, "r", encoding="utf-8") as f:
                 raw = json.load(f)
             # ensure keys are strings matching model output indices
-            self.label_map = {str(int(k)): v for k, v in raw.items()}
-        elif os.path.exists(label2id_path):
+            return {str(int(k)): v for k, v in raw.items()}
+        if os.path.exists(label2id_path):
             with open(label2id_path, "r", encoding="utf-8") as f:
                 raw = json.load(f)
-            self.label_map = {str(v): k for k, v in raw.items()}
-        elif os.path.exists(labels_path):
+            return {str(v): k for k, v in raw.items()}
+        if os.path.exists(labels_path):
             with open(labels_path, "r", encoding="utf-8") as f:
-                self.label_map = json.load(f)
-        else:
-            # fallback to id2label in model config
-            model_config_path = os.path.join(model_dir, "config.json")
-            if os.path.exists(model_config_path):
-                from transformers import AutoConfig
-                config = AutoConfig.from_pretrained(model_dir)
-                # config.id2label is usually a dict mapping ints->str
-                self.label_map = {str(int(k)): v for k, v in config.id2label.items()}
-            else:
-                raise FileNotFoundError("No label map found in model directory (id2label.json, label2id.json or labels.json).")
+                return json.load(f)
+
+        # fallback to id2label in model config (read directly, no transformers import)
+        model_config_path = os.path.join(model_dir, "config.json")
+        if os.path.exists(model_config_path):
+            with open(model_config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            # config id2label is usually a dict mapping ints->str
+            return {str(int(k)): v for k, v in config.get("id2label", {}).items()}
+        raise FileNotFoundError("No label map found in model directory (id2label.json, label2id.json or labels.json).")
 
+    # -----------------------
+    # Loading
+    # -----------------------
+    def _background_load(self):
+        try:
+            self._ensure_loaded()
+        except Exception as e:
+            # predict() retries the load on the request thread and raises from there
+            self.load_error = e
+        finally:
+            self._attempted.set()
+
+    def _ensure_loaded(self):
+        if self._loaded.is_set():
+            return
+        with self._load_lock:
+            if self._loaded.is_set():
+                return
+            self.load_error = None
+            start = time.perf_counter()
+            self._load()
+            self.load_time = time.perf_counter() - start
+            self._loaded.set()
+        if self.warmup:
+            self._run_warmup()
+
+    def _load(self):
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        model_dir = self.model_dir
         # Load tokenizer + model
         self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        if is_student_dir(model_dir):
+            # distilled bag-of-embeddings model written by train_intent.py --mode distill
+            self.model, self.student_config = load_student(model_dir)
+            self.weights_source = "student"
+            return
+        if self.mmap_weights:
+            from nlu_engine.mmap_weights import load_mmap_model
+            try:
+                self.model = load_mmap_model(model_dir)
+            except Exception:
+                self.model = None
+            if self.model is not None:
+                self.weights_source = "mmap"
+                self.model.eval()
+                return
         try:
             self.model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+            self.weights_source = "from_pretrained"
         except Exception as e:
             msg = str(e)
             if "meta tensor" in msg or "Cannot copy out of meta tensor" in msg or "no data" in msg.lower():
@@ -66,40 +175,144 @@ class IntentClassifier:
 
         self.model.eval()
 
-    def predict(self, text, top_k=1):
-        """
-        Return top_k predicted intents for a given text
-        """
-        try:
-            inputs = self.tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-        except Exception:
-            inputs = self.tokenizer(str(text), return_tensors="pt", truncation=True, padding=True)
+    def _run_warmup(self):
+        texts = warmup_texts(self.intents_path)
+        if not texts:
+            self.warmup_time = 0.0
+            return
+        start = time.perf_counter()
+        # one padded batch plus one single-sentence call, the two shapes served in practice
+        self.predict_batch(texts, top_k=1)
+        self.predict(texts[0], top_k=1)
+        self.warmup_time = time.perf_counter() - start
+
+    def wait_until_loaded(self, timeout=None):
+        """Block until a background load finishes; returns True if the model is ready."""
+        if self.load_mode != "background":
+            self._ensure_loaded()
+            return True
+        self._attempted.wait(timeout)
+        if self.load_error is not None and not self._loaded.is_set():
+            raise self.load_error
+        return self._loaded.is_set()
 
-        with torch.no_grad():
+    @property
+    def is_loaded(self):
+        return self._loaded.is_set()
+
+    def stats(self):
+        return {
+            "model_dir": self.model_dir,
+            "load_mode": self.load_mode,
+            "loaded": self.is_loaded,
+            "weights": self.weights_source,
+            "load_time_s": self.load_time,
+            "warmup_time_s": self.warmup_time,
+        }
+
+    # -----------------------
+    # Inference
+    # -----------------------
+    def _probs(self, texts):
+        import torch
+
+        metrics.MODEL_CACHE.inc(cache="weights", result="hit" if self._loaded.is_set() else "miss")
+        self._ensure_loaded()
+        if self.weights_source == "student":
+            with tracing.span("nlu.tokenize"):
+                input_ids, offsets = pack_ids(self.tokenizer, texts, self.student_config.get("max_length", 128))
+            with tracing.span("nlu.forward"), torch.no_grad():
+                logits = self.model(input_ids, offsets)
+            return torch.softmax(logits, dim=1)
+
+        with tracing.span("nlu.tokenize"):
+            try:
+                inputs = self.tokenizer(texts, return_tensors="pt", truncation=True, padding=True)
+            except Exception:
+                inputs = self.tokenizer([str(t) for t in texts], return_tensors="pt", truncation=True, padding=True)
+
+        with tracing.span("nlu.forward"), torch.no_grad():
             outputs = self.model(**inputs)
 
-        probs = torch.softmax(outputs.logits, dim=1)[0]
-        top_indices = torch.topk(probs, top_k).indices.tolist()
+        return torch.softmax(outputs.logits, dim=1)
+
+    def _top_k(self, probs, top_k):
+        import torch
 
+        top_indices = torch.topk(probs, min(top_k, probs.shape[-1])).indices.tolist()
         results = []
         for idx in top_indices:
             key = str(int(idx))
             intent_name = self.label_map.get(key, key)
             confidence = float(probs[idx])
             results.append({"intent": intent_name, "confidence": confidence})
-
         return results
 
+    def predict(self, text, top_k=1):
+        """
+        Return top_k predicted intents for a given text
+        """
+        probs = self._probs([text] if isinstance(text, str) else [str(text)])[0]
+        return self._top_k(probs, top_k)
+
+    def predict_batch(self, texts, top_k=1):
+        """
+        Return a list of top_k predictions, one per input text
+        """
+        if not texts:
+            return []
+        probs = self._probs(list(texts))
+        return [self._top_k(row, top_k) for row in probs]
+
+
+# -----------------------
+# Process-wide cache
+# -----------------------
+# current and previous model: enough for a rollback without reloading, while every
+# other version published over a long-lived process is released
+MAX_CACHED_CLASSIFIERS = 2
+
+_classifiers = OrderedDict()
+_classifiers_lock = threading.Lock()
+
+
+def get_classifier(model_dir="models/intent_model", load_mode="background", warmup=None):
+    """Return the shared IntentClassifier for model_dir, creating it once per process.
+
+    Every chat session builds its own NLUProcessor; sharing the classifier means
+    the tokenizer, weights and warm-up are paid once rather than per session. Only
+    the MAX_CACHED_CLASSIFIERS most recently requested directories stay cached.
+    """
+    key = os.path.abspath(model_dir)
+    with _classifiers_lock:
+        clf = _classifiers.get(key)
+        metrics.MODEL_CACHE.inc(cache="classifier", result="miss" if clf is None else "hit")
+        if clf is None:
+            clf = IntentClassifier(model_dir=model_dir, load_mode=load_mode, warmup=warmup)
+            _classifiers[key] = clf
+        _classifiers.move_to_end(key)
+        while len(_classifiers) > MAX_CACHED_CLASSIFIERS:
+            _classifiers.popitem(last=False)
+    return clf
+
 
 # Example usage
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_dir", default="models/intent_model")
+    parser.add_argument("--load_mode", default="eager", choices=LOAD_MODES)
+    args = parser.parse_args()
     try:
-        ic = IntentClassifier()
+        ic = IntentClassifier(model_dir=args.model_dir, load_mode=args.load_mode)
+        ic.wait_until_loaded()
         predictions = ic.predict(
             "Please transfer 5000 to my savings account",
             top_k=3
         )
         for i, p in enumerate(predictions, 1):
             print(f"{i}. Intent: {p['intent']}, Confidence: {p['confidence']:.4f}")
+        print("Startup:", ic.stats())
     except Exception as e:
-        print("Error:", e)
\ No newline at end of file
+        print("Error:", e)
@@ -0,0 +1,134 @@
+# nlu_engine/mmap_weights.py
+#
+# Load model weights straight out of a memory-mapped model.safetensors file.
+# Parameters end up backed by the file mapping instead of private heap copies,
+# so several worker processes on one host share the same page-cache pages.
+
+import os
+import json
+import struct
+import tempfile
+
+SAFETENSORS_NAME = "model.safetensors"
+PYTORCH_BIN_NAME = "pytorch_model.bin"
+
+_DTYPE_NAMES = {
+    "F64": "float64",
+    "F32": "float32",
+    "F16": "float16",
+    "BF16": "bfloat16",
+    "I64": "int64",
+    "I32": "int32",
+    "I16": "int16",
+    "I8": "int8",
+    "U8": "uint8",
+    "BOOL": "bool",
+}
+
+
+def ensure_safetensors(model_dir):
+    """Return the path of model.safetensors, converting pytorch_model.bin once if needed.
+
+    Called when a model is saved or published, not on the serving path, so
+    worker processes never race each other converting the same directory.
+    """
+    st_path = os.path.join(model_dir, SAFETENSORS_NAME)
+    if os.path.exists(st_path):
+        return st_path
+    bin_path = os.path.join(model_dir, PYTORCH_BIN_NAME)
+    if not os.path.exists(bin_path):
+        return None
+
+    import torch
+    from safetensors.torch import save_file
+
+    state = torch.load(bin_path, map_location="cpu")
+    # safetensors refuses aliased tensors; give every entry its own contiguous buffer
+    state = {k: v.detach().clone().contiguous() for k, v in state.items()}
+    fd, tmp_path = tempfile.mkstemp(dir=model_dir, prefix=".model-", suffix=".safetensors.tmp")
+    os.close(fd)
+    try:
+        save_file(state, tmp_path, metadata={"format": "pt"})
+        os.replace(tmp_path, st_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return st_path
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        header_len = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_len))
+    header.pop("__metadata__", None)
+    return header, 8 + header_len
+
+
+def load_mmap_state_dict(path):
+    """Map a safetensors file and return a state dict of tensors that view the mapping.
+
+    The file is mapped copy-on-write (MAP_PRIVATE): pages stay shared with other
+    processes as long as nobody writes to them, which holds for an eval-only model.
+    """
+    import torch
+
+    header, data_start = read_header(path)
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+
+    state = {}
+    for name, info in header.items():
+        dtype = getattr(torch, _DTYPE_NAMES[info["dtype"]])
+        begin, _ = info["data_offsets"]
+        shape = list(info["shape"])
+        elem_size = torch.empty(0, dtype=dtype).element_size()
+        offset = data_start + begin
+        if offset % elem_size:
+            raise ValueError(f"Tensor '{name}' in {path} is not aligned for {info['dtype']}")
+
+        stride = []
+        acc = 1
+        for dim in reversed(shape):
+            stride.insert(0, acc)
+            acc *= dim
+        t = torch.empty(0, dtype=dtype)
+        t.set_(storage, offset // elem_size, shape, stride)
+        state[name] = t
+    return state
+
+
+def load_mmap_model(model_dir):
+    """Build the classifier from config and attach memory-mapped weights.
+
+    Returns None when the directory or the installed torch cannot support it
+    (no model.safetensors, torch < 2.1 without load_state_dict(assign=...), or a key
+    layout that needs from_pretrained's prefix handling); callers then fall back
+    to a regular from_pretrained load.
+    """
+    import torch
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+
+    # converted at save/publish time (ensure_safetensors); never written from here
+    path = os.path.join(model_dir, SAFETENSORS_NAME)
+    if not os.path.exists(path):
+        return None
+
+    config = AutoConfig.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_config(config)
+    state = load_mmap_state_dict(path)
+    try:
+        with torch.no_grad():
+            result = model.load_state_dict(state, strict=False, assign=True)
+    except TypeError:
+        return None
+
+    tied = set(getattr(model, "_tied_weights_keys", None) or [])
+    missing = [k for k in result.missing_keys if k not in tied]
+    if missing or result.unexpected_keys:
+        return None
+    if tied:
+        model.tie_weights()
+
+    for p in model.parameters():
+        p.requires_grad_(False)
+    return model
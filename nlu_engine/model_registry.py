@@ -0,0 +1,130 @@
+# nlu_engine/model_registry.py
+#
+# Versioned intent models. Every published model gets its own directory
+#
+#   models/intent_versions/<version>/
+#
+# and models/intent_versions/CURRENT holds the name of the version being
+# served. CURRENT is replaced with os.replace, so readers always see either
+# the old or the new version, never a half-written pointer. Older versions
+# stay on disk for instant rollback.
+
+import os
+import time
+import shutil
+
+VERSIONS_DIR = "models/intent_versions"
+POINTER_NAME = "CURRENT"
+# legacy single-directory model used before versioning existed
+LEGACY_MODEL_DIR = "models/intent_model"
+KEEP_VERSIONS = 5
+
+
+def _pointer_path(versions_dir=VERSIONS_DIR):
+    return os.path.join(versions_dir, POINTER_NAME)
+
+
+def list_versions(versions_dir=VERSIONS_DIR):
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(
+        d for d in os.listdir(versions_dir)
+        if os.path.isdir(os.path.join(versions_dir, d)) and not d.startswith(".")
+    )
+
+
+def current_version(versions_dir=VERSIONS_DIR):
+    try:
+        with open(_pointer_path(versions_dir), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    return version if version and os.path.isdir(os.path.join(versions_dir, version)) else None
+
+
+def set_current(version, versions_dir=VERSIONS_DIR):
+    if not os.path.isdir(os.path.join(versions_dir, version)):
+        raise FileNotFoundError(f"Model version '{version}' does not exist in {versions_dir}")
+    tmp = _pointer_path(versions_dir) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, _pointer_path(versions_dir))
+
+
+def resolve_model_dir(versions_dir=VERSIONS_DIR, legacy_dir=LEGACY_MODEL_DIR):
+    """Return (model_dir, version) to serve: the CURRENT version, else the legacy directory."""
+    version = current_version(versions_dir)
+    if version:
+        return os.path.join(versions_dir, version), version
+    return legacy_dir, None
+
+
+def pointer_mtime(versions_dir=VERSIONS_DIR):
+    """Cheap change check for pollers: one stat() per call."""
+    try:
+        return os.stat(_pointer_path(versions_dir)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _ensure_safetensors(model_dir):
+    # models saved before safe_serialization only carry pytorch_model.bin;
+    # convert here so serving workers can memory-map without writing to the dir
+    try:
+        from nlu_engine.mmap_weights import ensure_safetensors
+        ensure_safetensors(model_dir)
+    except Exception as e:
+        print(f"Warning: could not write model.safetensors for {model_dir}: {e}")
+
+
+def publish(src_dir, versions_dir=VERSIONS_DIR, make_current=True, move=True):
+    """Copy (or move) a finished model directory in as a new version and point CURRENT at it."""
+    os.makedirs(versions_dir, exist_ok=True)
+    version = time.strftime("v%Y%m%d-%H%M%S")
+    suffix = 1
+    while os.path.exists(os.path.join(versions_dir, version)):
+        suffix += 1
+        version = time.strftime("v%Y%m%d-%H%M%S") + f"-{suffix}"
+
+    # stage under a hidden name first so list_versions never sees a partial copy
+    staging = os.path.join(versions_dir, f".{version}.tmp")
+    if move:
+        shutil.move(src_dir, staging)
+    else:
+        shutil.copytree(src_dir, staging)
+    _ensure_safetensors(staging)
+    os.replace(staging, os.path.join(versions_dir, version))
+
+    if make_current:
+        set_current(version, versions_dir)
+        prune(versions_dir)
+    return version
+
+
+def previous_version(versions_dir=VERSIONS_DIR):
+    versions = list_versions(versions_dir)
+    cur = current_version(versions_dir)
+    if cur not in versions:
+        return None
+    i = versions.index(cur)
+    return versions[i - 1] if i > 0 else None
+
+
+def rollback(versions_dir=VERSIONS_DIR):
+    """Point CURRENT at the version published before the current one."""
+    prev = previous_version(versions_dir)
+    if not prev:
+        raise RuntimeError("No earlier model version to roll back to.")
+    set_current(prev, versions_dir)
+    return prev
+
+
+def prune(versions_dir=VERSIONS_DIR, keep=KEEP_VERSIONS):
+    """Delete the oldest versions beyond ``keep``; CURRENT is never removed."""
+    cur = current_version(versions_dir)
+    versions = list_versions(versions_dir)
+    for version in versions[:-keep] if keep > 0 else []:
+        if version != cur:
+            shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
@@ -1,18 +1,203 @@
 # nlu_engine/nlu_router.py
 
+import os
+import time
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
 from nlu_engine.infer_intent import IntentClassifier
 from nlu_engine.entity_extractor import EntityExtractor
+from nlu_engine import model_registry
+from monitoring import tracing, metrics
 
 MODEL_DIR = "models/intent_model"
+# lazy | eager | background (see infer_intent.LOAD_MODES)
+LOAD_MODE = os.getenv("BANKBOT_NLU_LOAD_MODE", "background")
+# how often (seconds) a request may stat the CURRENT pointer for a new version
+MODEL_CHECK_INTERVAL = 2.0
+# transformer: fine-tuned IntentClassifier from the model registry
+# embedding: nearest-neighbour EmbeddingIntentIndex over intents.json (no retrain needed)
+INTENT_BACKEND = os.getenv("BANKBOT_INTENT_BACKEND", "transformer")
+
+# Shared by every NLUProcessor in the process; torch releases the GIL during
+# the forward pass, so the regex extraction can run alongside it.
+NLU_WORKERS = 4
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=NLU_WORKERS, thread_name_prefix="nlu")
+    return _executor
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, (time.perf_counter() - start) * 1000.0
+
+
+@dataclass
+class NLUResult:
+    intent: str
+    confidence: float
+    entities: List[Dict[str, Any]]
+    # per-stage wall time in milliseconds: "intent", "entities", "total"
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def __iter__(self):
+        # keeps `intent, confidence, entities = nlu.process(text)` working
+        return iter((self.intent, self.confidence, self.entities))
+
+
+class ModelSwapper:
+    """Process-wide holder of the serving IntentClassifier.
+
+    Requests call classifier(), which at most every MODEL_CHECK_INTERVAL seconds
+    stats the registry's CURRENT pointer. A new version is loaded and warmed up
+    on a background thread while the old one keeps serving, then swapped in with
+    a single reference assignment, so a request always runs start to finish on
+    one model. The replaced model is kept in memory for instant rollback.
+    """
+
+    def __init__(self, check_interval=MODEL_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._pointer_mtime = model_registry.pointer_mtime()
+        model_dir, version = model_registry.resolve_model_dir(legacy_dir=MODEL_DIR)
+        self.current = (version, IntentClassifier(model_dir=model_dir, load_mode=LOAD_MODE))
+        self.previous = None
+        self.loading = None
+        self.last_error = None
+        self._last_check = time.monotonic()
+
+    def classifier(self):
+        self._maybe_check()
+        return self.current[1]
+
+    @property
+    def version(self):
+        return self.current[0]
+
+    def _maybe_check(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        mtime = model_registry.pointer_mtime()
+        if mtime == self._pointer_mtime:
+            return
+        model_dir, version = model_registry.resolve_model_dir(legacy_dir=MODEL_DIR)
+        with self._lock:
+            self._pointer_mtime = mtime
+            if version == self.current[0] or version == self.loading:
+                return
+            if self.previous and version == self.previous[0]:
+                # rollback to the model we still hold: no load needed
+                self.current, self.previous = self.previous, self.current
+                return
+            self.loading = version
+        threading.Thread(target=self._load_and_swap, args=(version, model_dir), name=f"intent-swap-{version}", daemon=True).start()
+
+    def _load_and_swap(self, version, model_dir):
+        try:
+            clf = IntentClassifier(model_dir=model_dir, load_mode="eager", warmup=True)
+        except Exception as e:
+            with self._lock:
+                self.loading = None
+                self.last_error = e
+            return
+        with self._lock:
+            if self.loading != version:
+                return  # superseded by a newer version or a rollback meanwhile
+            self.previous, self.current = self.current, (version, clf)
+            self.loading = None
+            self.last_error = None
+
+    def rollback(self):
+        """Serve the previously loaded model again right away and repoint CURRENT at it."""
+        with self._lock:
+            if not self.previous:
+                raise RuntimeError("No previous model loaded in this process.")
+            self.current, self.previous = self.previous, self.current
+            self.loading = None
+            version = self.current[0]
+        if version:
+            model_registry.set_current(version)
+            self._pointer_mtime = model_registry.pointer_mtime()
+        return version
+
+
+_swapper = None
+_swapper_lock = threading.Lock()
+
+
+def get_model_swapper():
+    global _swapper
+    with _swapper_lock:
+        if _swapper is None:
+            _swapper = ModelSwapper()
+    return _swapper
+
 
 class NLUProcessor:
-    def __init__(self):
-        self.intent_model = IntentClassifier(model_dir=MODEL_DIR)
+    def __init__(self, backend=None):
+        backend = backend or INTENT_BACKEND
+        if backend == "embedding":
+            from nlu_engine.embedding_index import get_embedding_index
+            self.models = get_embedding_index()
+        else:
+            self.models = get_model_swapper()
         self.entity_extractor = EntityExtractor()
 
+    @property
+    def intent_model(self):
+        return self.models.classifier()
+
     def process(self, text):
-        intent_res = self.intent_model.predict(text, top_k=1)[0]
+        start = time.perf_counter()
+        # resolve once so the whole request runs on a single model version
+        intent_model = self.models.classifier()
+
+        # intent prediction goes to the pool, entities run on the caller thread
+        intent_future = _get_executor().submit(_timed, intent_model.predict, text, top_k=1)
+        entities, entity_ms = _timed(self.entity_extractor.extract, text)
+        preds, intent_ms = intent_future.result()
+
+        intent_res = preds[0]
         intent = intent_res["intent"]
         confidence = intent_res.get("confidence", intent_res.get("score", 1.0))
-        entities = self.entity_extractor.extract(text)
-        return intent, confidence, entities
\ No newline at end of file
+        timings = {
+            "intent": intent_ms,
+            "entities": entity_ms,
+            "total": (time.perf_counter() - start) * 1000.0,
+        }
+        tracing.record("nlu.intent", intent_ms)
+        tracing.record("nlu.entities", entity_ms)
+        tracing.record("nlu.process", timings["total"])
+        metrics.NLU_PREDICTIONS.inc(intent=intent)
+        return NLUResult(intent, confidence, entities, timings)
+
+    def process_batch(self, texts):
+        """NLUResults for many texts with one batched intent pass; the intent time is
+        split evenly across the batch in each result's timings."""
+        texts = [str(t) for t in texts]
+        if not texts:
+            return []
+        intent_model = self.models.classifier()
+        preds, intent_ms = _timed(intent_model.predict_batch, texts, top_k=1)
+        share = intent_ms / len(texts)
+        results = []
+        for text, pred in zip(texts, preds):
+            entities, entity_ms = _timed(self.entity_extractor.extract, text)
+            top = pred[0]
+            confidence = top.get("confidence", top.get("score", 1.0))
+            timings = {"intent": share, "entities": entity_ms, "total": share + entity_ms}
+            results.append(NLUResult(top["intent"], confidence, entities, timings))
+        return results
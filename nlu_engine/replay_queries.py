@@ -0,0 +1,305 @@
+# nlu_engine/replay_queries.py
+#
+# Replay logged user queries through the current NLU and compare with what was
+# logged at the time:
+#
+#   python -m nlu_engine.replay_queries --workers 8 --out logs/replay.json
+#   python -m nlu_engine.replay_queries --start 2025-01-01 --limit 100000 --mode single
+#
+# Queries are streamed from the compacted Parquet days and the live SQLite log
+# (database/query_archive.py), or from a legacy query_history.json (decoded one
+# entry at a time), in chunks of --batch_size; nothing is loaded whole. With
+# --workers > 1 the chunks are fanned out to a spawn multiprocessing Pool where
+# every worker holds one NLUProcessor, a new chunk is submitted as each one
+# finishes, and only compact per-query tuples come back to the parent.
+#
+# Reported: intent flips (overall, per logged intent and the most common
+# old -> new pairs with examples), confidence drift for queries whose intent
+# did not change, and per-query latency. --mode batch times one predict_batch
+# per chunk (throughput); --mode single calls process() per query (what a chat
+# request sees).
+
+import os
+import sys
+import json
+import time
+import argparse
+import queue
+import multiprocessing as mp
+from array import array
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+REPLAY_BATCH = 256
+JSON_READ_BYTES = 1 << 20
+# chunks queued per pool worker; bounds parent memory on very large logs
+IN_FLIGHT_PER_WORKER = 4
+FLIP_EXAMPLES = 25
+# |confidence change| above this counts as drifted
+DRIFT_THRESHOLD = 0.2
+
+
+# -----------------------
+# Log source
+# -----------------------
+def iter_json_array(path, read_size=JSON_READ_BYTES):
+    """Yield the elements of a top-level JSON array, decoding one at a time from a
+    sliding read buffer instead of json.load()ing the whole file. Elements are log
+    entry objects, so one cut off at the end of the buffer never decodes early."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, started = "", 0, False
+        while True:
+            # skip whitespace and separators; the buffer may end mid-value, so read more then
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if not started and pos < len(buf):
+                if buf[pos] != "[":
+                    raise ValueError(f"{path}: expected a JSON array")
+                started, pos = True, pos + 1
+                continue
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                more = f.read(read_size)
+                if not more:
+                    if buf[pos:].strip():
+                        raise
+                    return
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield item
+            pos = end
+
+
+def iter_logged(start=None, end=None, json_path=None, limit=None):
+    """Yield (query, intent, confidence) oldest first."""
+    n = 0
+    if json_path:
+        for e in iter_json_array(json_path):
+            if limit and n >= limit:
+                return
+            n += 1
+            yield e.get("query", ""), e.get("intent"), e.get("confidence", 0.0)
+        return
+
+    from database import query_archive
+
+    columns = ["query", "intent", "confidence"]
+    for batch in query_archive._scan_batches(columns, start, end):
+        d = batch.to_pydict()
+        for row in zip(d["query"], d["intent"], d["confidence"]):
+            if limit and n >= limit:
+                return
+            n += 1
+            yield row
+    for e in query_archive._live_entries(start, end):
+        if limit and n >= limit:
+            return
+        n += 1
+        yield e["query"], e["intent"], e["confidence"]
+
+
+def iter_chunks(rows, size):
+    chunk = []
+    for row in rows:
+        if not str(row[0] or "").strip():
+            continue
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# -----------------------
+# Workers
+# -----------------------
+_nlu = None
+_mode = "batch"
+
+
+def _init_worker(mode, backend, torch_threads):
+    global _nlu, _mode
+    if torch_threads:
+        try:
+            import torch
+            torch.set_num_threads(torch_threads)
+        except ImportError:
+            pass
+    from nlu_engine.nlu_router import NLUProcessor
+
+    _mode = mode
+    _nlu = NLUProcessor(backend=backend)
+    wait = getattr(_nlu.intent_model, "wait_until_loaded", None)
+    if wait:
+        wait()
+
+
+def _replay_chunk(chunk):
+    """[(query, old_intent, new_intent, old_conf, new_conf, ms)] for one chunk."""
+    texts = [str(q) for q, _, _ in chunk]
+    if _mode == "single":
+        results = [_nlu.process(t) for t in texts]
+    else:
+        results = _nlu.process_batch(texts)
+    return [(q, old, r.intent, float(old_conf or 0.0), float(r.confidence), r.timings["total"])
+            for (q, old, old_conf), r in zip(chunk, results)]
+
+
+# -----------------------
+# Aggregation
+# -----------------------
+class ReplayReport:
+    def __init__(self, drift_threshold=DRIFT_THRESHOLD, max_examples=FLIP_EXAMPLES):
+        self.drift_threshold = drift_threshold
+        self.max_examples = max_examples
+        self.total = 0
+        self.flips = 0
+        self.per_intent = Counter()
+        self.per_intent_flips = Counter()
+        self.flip_pairs = Counter()
+        self.examples = []
+        # typed arrays keep multi-million-query runs at a few bytes per query
+        self.conf_deltas = array("f")
+        self.latency_ms = array("f")
+
+    def add(self, rows):
+        for query, old, new, old_conf, new_conf, ms in rows:
+            self.total += 1
+            self.per_intent[old] += 1
+            self.latency_ms.append(ms)
+            if new != old:
+                self.flips += 1
+                self.per_intent_flips[old] += 1
+                self.flip_pairs[(old, new)] += 1
+                if len(self.examples) < self.max_examples:
+                    self.examples.append({"query": query, "logged": old, "now": new,
+                                          "logged_confidence": old_conf, "confidence": new_conf})
+            else:
+                self.conf_deltas.append(new_conf - old_conf)
+
+    @staticmethod
+    def _pcts(values):
+        vals = sorted(values)
+        if not vals:
+            return {}
+        pick = lambda q: vals[min(len(vals) - 1, int(q * len(vals)))]
+        return {"mean": sum(vals) / len(vals), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99),
+                "min": vals[0], "max": vals[-1]}
+
+    def summary(self):
+        deltas = self.conf_deltas
+        return {
+            "queries": self.total,
+            "intent_flips": self.flips,
+            "flip_rate": self.flips / self.total if self.total else 0.0,
+            "flip_rate_by_intent": {i: {"queries": n, "flips": self.per_intent_flips[i],
+                                        "flip_rate": self.per_intent_flips[i] / n}
+                                    for i, n in self.per_intent.most_common()},
+            "top_flips": [{"logged": o, "now": n, "count": c} for (o, n), c in self.flip_pairs.most_common(15)],
+            "flip_examples": self.examples,
+            "confidence_drift": {
+                **self._pcts(deltas),
+                "mean_abs": sum(abs(d) for d in deltas) / len(deltas) if deltas else None,
+                "drifted": sum(1 for d in deltas if abs(d) > self.drift_threshold),
+                "threshold": self.drift_threshold,
+            },
+            "latency_ms": self._pcts(self.latency_ms),
+        }
+
+
+def replay(rows, workers=1, batch_size=REPLAY_BATCH, mode="batch", backend=None, progress_every=10000):
+    report = ReplayReport()
+    chunks = iter_chunks(rows, batch_size)
+    start = time.perf_counter()
+    next_progress = progress_every
+
+    def consume(results):
+        nonlocal next_progress
+        for res in results:
+            report.add(res)
+            if progress_every and report.total >= next_progress:
+                rate = report.total / (time.perf_counter() - start)
+                print(f"  {report.total} queries  {report.flips} flips  {rate:.0f} q/s", flush=True)
+                next_progress += progress_every
+
+    if workers <= 1:
+        _init_worker(mode, backend, None)
+        consume(_replay_chunk(c) for c in chunks)
+    else:
+        torch_threads = max(1, (os.cpu_count() or workers) // workers)
+        with mp.get_context("spawn").Pool(workers, initializer=_init_worker,
+                                          initargs=(mode, backend, torch_threads)) as pool:
+            # imap would read the whole log into the task queue up front; keep at most
+            # workers * IN_FLIGHT_PER_WORKER chunks queued and submit the next chunk as
+            # each one finishes, so a slow chunk never holds up the other workers
+            done = queue.Queue()
+            in_flight = 0
+
+            def take_one():
+                res = done.get()
+                if isinstance(res, BaseException):
+                    raise res
+                consume([res])
+
+            for chunk in chunks:
+                if in_flight >= workers * IN_FLIGHT_PER_WORKER:
+                    take_one()
+                    in_flight -= 1
+                pool.apply_async(_replay_chunk, (chunk,), callback=done.put, error_callback=done.put)
+                in_flight += 1
+            while in_flight:
+                take_one()
+                in_flight -= 1
+    elapsed = time.perf_counter() - start
+    out = report.summary()
+    out.update({"elapsed_s": elapsed, "queries_per_s": report.total / elapsed if elapsed else None,
+                "workers": workers, "mode": mode, "batch_size": batch_size})
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start", default=None, help="first day (YYYY-MM-DD)")
+    parser.add_argument("--end", default=None, help="last day (YYYY-MM-DD)")
+    parser.add_argument("--json", default=None, help="replay a legacy query_history.json instead of the log DB")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch_size", type=int, default=REPLAY_BATCH)
+    parser.add_argument("--mode", choices=["batch", "single"], default="batch")
+    parser.add_argument("--backend", choices=["transformer", "embedding"], default=None)
+    parser.add_argument("--out", default=None, help="write the full report as JSON")
+    parser.add_argument("--max_flip_rate", type=float, default=None, help="exit non-zero above this flip rate")
+    args = parser.parse_args()
+
+    rows = iter_logged(args.start, args.end, json_path=args.json, limit=args.limit)
+    report = replay(rows, workers=args.workers, batch_size=args.batch_size, mode=args.mode, backend=args.backend)
+
+    drift, lat = report["confidence_drift"], report["latency_ms"]
+    print(f"\nReplayed {report['queries']} queries in {report['elapsed_s']:.1f}s "
+          f"({report['queries_per_s'] or 0:.0f} q/s, {args.workers} worker(s), {args.mode})")
+    print(f"Intent flips: {report['intent_flips']} ({report['flip_rate']:.2%})")
+    for f in report["top_flips"][:10]:
+        print(f"  {f['logged']:>20} -> {f['now']:<20} {f['count']}")
+    if drift.get("mean") is not None:
+        print(f"Confidence drift (unchanged intent): mean {drift['mean']:+.3f}  mean |d| {drift['mean_abs']:.3f}  "
+              f"p50 {drift['p50']:+.3f}  range {drift['min']:+.3f}..{drift['max']:+.3f}  >{drift['threshold']}: {drift['drifted']}")
+    if lat:
+        print(f"Latency per query: p50 {lat['p50']:.2f}ms  p95 {lat['p95']:.2f}ms  p99 {lat['p99']:.2f}ms")
+
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Report written to {args.out}")
+    if args.max_flip_rate is not None and report["flip_rate"] > args.max_flip_rate:
+        sys.exit(f"Flip rate {report['flip_rate']:.2%} exceeds {args.max_flip_rate:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# nlu_engine/student_model.py
+#
+# Tiny distilled intent classifier: a mean-pooled bag of token embeddings over
+# the teacher's tokenizer vocabulary followed by a small MLP. It has no
+# attention and no padding (EmbeddingBag takes flat ids + offsets), so a forward
+# pass is a handful of lookups and two small matmuls.
+
+import os
+import json
+
+STUDENT_CONFIG_NAME = "student_config.json"
+STUDENT_WEIGHTS_NAME = "student.safetensors"
+
+
+def is_student_dir(model_dir):
+    return os.path.exists(os.path.join(model_dir, STUDENT_CONFIG_NAME))
+
+
+def build_student(vocab_size, num_labels, embed_dim=64, hidden_dim=64, dropout=0.1):
+    import torch.nn as nn
+
+    class BagOfEmbeddingsClassifier(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.embedding = nn.EmbeddingBag(vocab_size, embed_dim, mode="mean")
+            self.classifier = nn.Sequential(
+                nn.Dropout(dropout),
+                nn.Linear(embed_dim, hidden_dim),
+                nn.ReLU(),
+                nn.Linear(hidden_dim, num_labels),
+            )
+
+        def forward(self, input_ids, offsets):
+            return self.classifier(self.embedding(input_ids, offsets))
+
+    return BagOfEmbeddingsClassifier()
+
+
+def pack_ids(tokenizer, texts, max_length=128):
+    """Tokenize texts into the flat (input_ids, offsets) pair EmbeddingBag expects."""
+    import torch
+
+    enc = tokenizer([str(t) for t in texts], truncation=True, max_length=max_length, add_special_tokens=False)
+    flat, offsets = [], []
+    for ids in enc["input_ids"]:
+        offsets.append(len(flat))
+        flat.extend(ids or [tokenizer.unk_token_id])
+    return torch.tensor(flat, dtype=torch.long), torch.tensor(offsets, dtype=torch.long)
+
+
+def save_student(model, tokenizer, out_dir, config, label2id, id2label):
+    from safetensors.torch import save_file
+
+    os.makedirs(out_dir, exist_ok=True)
+    save_file({k: v.contiguous() for k, v in model.state_dict().items()}, os.path.join(out_dir, STUDENT_WEIGHTS_NAME))
+    tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, STUDENT_CONFIG_NAME), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    with open(os.path.join(out_dir, "label2id.json"), "w", encoding="utf-8") as f:
+        json.dump(label2id, f)
+    with open(os.path.join(out_dir, "id2label.json"), "w", encoding="utf-8") as f:
+        json.dump(id2label, f)
+
+
+def load_student(model_dir):
+    """Return (model, config) for a directory written by save_student()."""
+    from safetensors.torch import load_file
+
+    with open(os.path.join(model_dir, STUDENT_CONFIG_NAME), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    model = build_student(
+        config["vocab_size"],
+        config["num_labels"],
+        embed_dim=config.get("embed_dim", 64),
+        hidden_dim=config.get("hidden_dim", 64),
+    )
+    model.load_state_dict(load_file(os.path.join(model_dir, STUDENT_WEIGHTS_NAME)))
+    model.eval()
+    return model, config
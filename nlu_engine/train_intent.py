@@ -8,7 +8,7 @@ import argparse
 import traceback
 from collections import Counter
 
-def load_intents(path):
+def load_intents(path, include_new=True):
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
 
@@ -23,26 +23,85 @@ def load_intents(path):
 
     for intent in data["intents"]:
         for ex in intent["examples"]:
-            texts.append(ex)
+            # examples are stored as {"text", "status"} dicts; plain strings are still accepted
+            txt = ex.get("text", "") if isinstance(ex, dict) else str(ex)
+            if not txt.strip():
+                continue
+            texts.append(txt.strip())
             labels.append(label2id[intent["name"]])
+        # new_examples are pending training; a full retrain picks them up
+        if include_new:
+            for ex in intent.get("new_examples", []):
+                if isinstance(ex, str) and ex.strip():
+                    texts.append(ex.strip())
+                    labels.append(label2id[intent["name"]])
 
     return texts, labels, label2id, id2label
 
+MAX_LENGTH = 128
+CACHE_DIR = "models/cache/tokenized"
+
 def encode_data(tokenizer, texts, labels):
-    import torch
+    # no padding here: DataCollatorWithPadding pads each batch to its own longest example
     enc = tokenizer(
-        texts,
+        list(texts),
         truncation=True,
-        padding=True,
-        max_length=128,
-        return_tensors="pt"
+        max_length=MAX_LENGTH,
     )
     return {
-        "input_ids": enc["input_ids"],
-        "attention_mask": enc["attention_mask"],
-        "labels": torch.tensor(labels)
+        "input_ids": [list(ids) for ids in enc["input_ids"]],
+        "attention_mask": [list(m) for m in enc["attention_mask"]],
+        "labels": list(labels)
     }
 
+def file_sha256(path):
+    import hashlib
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def tokenizer_fingerprint(tokenizer):
+    return [type(tokenizer).__name__, getattr(tokenizer, "name_or_path", ""), len(tokenizer), MAX_LENGTH]
+
+def tokenize_cached(tokenizer, texts, labels, intents_path, cache_dir=CACHE_DIR):
+    """Tokenize the whole dataset once per (tokenizer, intents file) and reuse it from disk."""
+    import hashlib
+
+    key_src = json.dumps([tokenizer_fingerprint(tokenizer), file_sha256(intents_path)])
+    key = hashlib.sha256(key_src.encode("utf-8")).hexdigest()[:32]
+    path = os.path.join(cache_dir, f"{key}.json")
+    texts_sha = hashlib.sha256("\n".join(texts).encode("utf-8")).hexdigest()
+
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("texts_sha") == texts_sha and cached.get("labels") == list(labels):
+                print("Using cached tokenization:", path)
+                return cached["enc"]
+        except Exception:
+            pass
+
+    enc = encode_data(tokenizer, texts, labels)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"texts_sha": texts_sha, "labels": list(labels), "enc": enc}, f)
+    os.replace(tmp, path)
+    return enc
+
+def subset_encodings(enc, indices):
+    return {k: [v[i] for i in indices] for k, v in enc.items()}
+
+def length_sorted_batches(lengths, batch_size):
+    """Indices sorted by length and cut into batches, to keep padding small at inference.
+
+    Training gets the same effect from the Trainer's group_by_length=True."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
 class SimpleDataset(object):
     def __init__(self, enc):
         self.enc = enc
@@ -57,21 +116,30 @@ class SimpleDataset(object):
             "labels": self.enc["labels"][idx]
         }
 
-def build_training_args(TrainingArgumentsClass, out_dir, epochs, batch_size, lr):
+def build_training_args(TrainingArgumentsClass, out_dir, epochs, batch_size, lr, logging_steps=10, select_best=True):
+    # select_best=False keeps the last epoch instead of the one scoring best on eval_dataset
+    import inspect
+
+    # renamed to eval_strategy in newer transformers, which reject the old keyword
+    params = inspect.signature(TrainingArgumentsClass.__init__).parameters
+    eval_key = "eval_strategy" if "eval_strategy" in params else "evaluation_strategy"
     modern_kwargs = dict(
         output_dir=out_dir,
         num_train_epochs=epochs,
         per_device_train_batch_size=batch_size,
         per_device_eval_batch_size=batch_size,
         learning_rate=lr,
-        evaluation_strategy="epoch",
         save_strategy="epoch",
-        load_best_model_at_end=True,
+        load_best_model_at_end=select_best,
         logging_dir=os.path.join(out_dir, "logs"),
+        logging_steps=logging_steps,
+        group_by_length=True,
     )
+    modern_kwargs[eval_key] = "epoch"
     try:
         return TrainingArgumentsClass(**modern_kwargs)
     except TypeError:
+        # no per-epoch evaluation here, so no best checkpoint to load at the end
         fallback_kwargs = dict(
             output_dir=out_dir,
             num_train_epochs=epochs,
@@ -79,9 +147,10 @@ def build_training_args(TrainingArgumentsClass, out_dir, epochs, batch_size, lr)
             per_device_eval_batch_size=batch_size,
             learning_rate=lr,
             logging_dir=os.path.join(out_dir, "logs"),
+            logging_steps=logging_steps,
             do_eval=True,
             save_steps=1000,
-            load_best_model_at_end=True
+            group_by_length=True
         )
         try:
             return TrainingArgumentsClass(**fallback_kwargs)
@@ -90,7 +159,8 @@ def build_training_args(TrainingArgumentsClass, out_dir, epochs, batch_size, lr)
                 output_dir=out_dir,
                 num_train_epochs=epochs,
                 per_device_train_batch_size=batch_size,
-                logging_dir=os.path.join(out_dir, "logs")
+                logging_dir=os.path.join(out_dir, "logs"),
+                group_by_length=True
             )
             return TrainingArgumentsClass(**minimal_kwargs)
 
@@ -132,6 +202,68 @@ def choose_train_test_split(texts, labels, default_frac=0.2):
 
     return train_txt, val_txt, train_lbl, val_lbl
 
+HELDOUT_FILE = "heldout.json"
+
+def save_heldout(out_dir, texts, intents):
+    """Record the validation examples a model never trained on, so a later
+    incremental run can gate on exactly those."""
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, HELDOUT_FILE), "w", encoding="utf-8") as f:
+        json.dump({"texts": list(texts), "intents": list(intents)}, f, ensure_ascii=False)
+
+def load_heldout(model_dir):
+    """[(text, intent name)] held out from ``model_dir``'s training, or None if not recorded."""
+    try:
+        with open(os.path.join(model_dir, HELDOUT_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return list(zip(data.get("texts", []), data.get("intents", [])))
+
+def compute_accuracy(eval_pred):
+    logits, label_ids = eval_pred
+    preds = logits.argmax(-1)
+    return {"accuracy": float((preds == label_ids).mean())}
+
+def make_progress_callback(path):
+    """TrainerCallback that appends one JSON line per event to ``path``.
+
+    The admin Training page tails this file to show step, loss and eval
+    accuracy while the job runs in its own process.
+    """
+    import time
+    from transformers import TrainerCallback
+
+    def emit(**event):
+        event["time"] = time.time()
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event) + "\n")
+
+    class ProgressCallback(TrainerCallback):
+        def on_train_begin(self, args, state, control, **kwargs):
+            emit(event="start", total_steps=state.max_steps)
+
+        def on_log(self, args, state, control, logs=None, **kwargs):
+            logs = logs or {}
+            if "loss" in logs:
+                emit(event="log", step=state.global_step, total_steps=state.max_steps, epoch=state.epoch, loss=logs["loss"])
+
+        def on_evaluate(self, args, state, control, metrics=None, **kwargs):
+            metrics = metrics or {}
+            emit(event="eval", step=state.global_step, total_steps=state.max_steps, epoch=state.epoch,
+                 eval_accuracy=metrics.get("eval_accuracy"), eval_loss=metrics.get("eval_loss"))
+
+    return ProgressCallback(), emit
+
+def save_model(model, out_dir):
+    # model.safetensors lets IntentClassifier memory-map the weights at load time
+    try:
+        model.save_pretrained(out_dir, safe_serialization=True)
+    except TypeError:
+        model.save_pretrained(out_dir)
+        from nlu_engine.mmap_weights import ensure_safetensors
+        ensure_safetensors(out_dir)
+
 def train(args):
     try:
         import torch
@@ -149,21 +281,20 @@ def train(args):
     if n < 5:
         print("Warning: very small dataset — consider adding more examples per intent.")
 
-    train_txt, val_txt, train_lbl, val_lbl = choose_train_test_split(texts, labels, default_frac=0.2)
-    print(f"Train size: {len(train_txt)}  Val size: {len(val_txt)}")
+    train_idx, val_idx, train_lbl, val_lbl = choose_train_test_split(list(range(n)), labels, default_frac=0.2)
+    print(f"Train size: {len(train_idx)}  Val size: {len(val_idx)}")
 
     tokenizer = AutoTokenizer.from_pretrained(args.model_name)
+    enc_all = tokenize_cached(tokenizer, texts, labels, args.intents, cache_dir=args.cache_dir)
 
+    # recorded with the model; the dummy val row below is training data
+    heldout_idx = list(val_idx)
     # if val set empty, still create small dummy val to avoid Trainer complaining
-    if len(val_txt) == 0:
-        val_txt = train_txt[:1]
-        val_lbl = train_lbl[:1]
+    if len(val_idx) == 0:
+        val_idx = train_idx[:1]
 
-    train_enc = encode_data(tokenizer, train_txt, train_lbl)
-    val_enc = encode_data(tokenizer, val_txt, val_lbl)
-
-    train_ds = SimpleDataset(train_enc)
-    val_ds = SimpleDataset(val_enc)
+    train_ds = SimpleDataset(subset_encodings(enc_all, train_idx))
+    val_ds = SimpleDataset(subset_encodings(enc_all, val_idx))
 
     model = AutoModelForSequenceClassification.from_pretrained(
         args.model_name,
@@ -171,24 +302,33 @@ def train(args):
     )
 
     TrainingArgumentsClass = TrainingArguments
-    training_args = build_training_args(TrainingArgumentsClass, args.output_dir, args.epochs, args.batch_size, args.lr)
+    training_args = build_training_args(TrainingArgumentsClass, args.output_dir, args.epochs, args.batch_size, args.lr,
+                                        logging_steps=args.logging_steps)
+
+    callbacks, emit = [], None
+    if args.progress_file:
+        callback, emit = make_progress_callback(args.progress_file)
+        callbacks.append(callback)
 
-    from sklearn.model_selection import train_test_split  # keep mt imports local
-    from transformers import Trainer
+    from transformers import Trainer, DataCollatorWithPadding
 
     trainer = Trainer(
         model=model,
         args=training_args,
         train_dataset=train_ds,
         eval_dataset=val_ds,
-        tokenizer=tokenizer
+        tokenizer=tokenizer,
+        data_collator=DataCollatorWithPadding(tokenizer),
+        compute_metrics=compute_accuracy,
+        callbacks=callbacks
     )
 
     print("Starting training...")
     trainer.train()
+    eval_metrics = trainer.evaluate()
 
     os.makedirs(args.output_dir, exist_ok=True)
-    model.save_pretrained(args.output_dir)
+    save_model(model, args.output_dir)
     tokenizer.save_pretrained(args.output_dir)
 
     with open(os.path.join(args.output_dir, "label2id.json"), "w", encoding="utf-8") as f:
@@ -196,8 +336,479 @@ def train(args):
 
     with open(os.path.join(args.output_dir, "id2label.json"), "w", encoding="utf-8") as f:
         json.dump(id2label, f)
+    save_heldout(args.output_dir, [texts[i] for i in heldout_idx], [id2label[labels[i]] for i in heldout_idx])
+
+    metrics = {
+        "eval_accuracy": eval_metrics.get("eval_accuracy"),
+        "eval_loss": eval_metrics.get("eval_loss"),
+        "train_size": len(train_idx),
+        "val_size": len(val_idx),
+        "epochs": args.epochs,
+        "batch_size": args.batch_size,
+        "lr": args.lr,
+    }
+    with open(os.path.join(args.output_dir, "metrics.json"), "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
+    if emit:
+        emit(event="done", **metrics)
 
     print("Model training complete! Saved to:", args.output_dir)
+    return metrics
+
+# -----------------------
+# Hyperparameter sweep
+# -----------------------
+SWEEP_DIR = "models/sweeps"
+
+# per worker process: base model loaded once, deep-copied for every config it runs
+_sweep_base = {}
+
+def _sweep_run(job):
+    """Train and score one config inside a pool worker. Tokenization comes from the
+    on-disk cache, so workers never re-tokenize intents.json."""
+    import copy
+    import time
+    import shutil
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, Trainer, TrainingArguments, DataCollatorWithPadding
+
+    torch.set_num_threads(job["threads"])
+    if job["model_name"] not in _sweep_base:
+        tokenizer = AutoTokenizer.from_pretrained(job["model_name"])
+        base = AutoModelForSequenceClassification.from_pretrained(job["model_name"], num_labels=job["num_labels"])
+        _sweep_base[job["model_name"]] = (tokenizer, base)
+    tokenizer, base = _sweep_base[job["model_name"]]
+    model = copy.deepcopy(base)
+
+    texts, labels, _, _ = load_intents(job["intents"])
+    enc_all = tokenize_cached(tokenizer, texts, labels, job["intents"], cache_dir=job["cache_dir"])
+    train_ds = SimpleDataset(subset_encodings(enc_all, job["train_idx"]))
+    val_ds = SimpleDataset(subset_encodings(enc_all, job["val_idx"]))
+
+    cfg = job["config"]
+    run_dir = os.path.join(job["sweep_dir"], job["name"])
+    trainer = Trainer(
+        model=model,
+        args=build_training_args(TrainingArguments, run_dir, cfg["epochs"], cfg["batch_size"], cfg["lr"],
+                                 logging_steps=job["logging_steps"],
+                                 # score the final epoch of every config; picking each run's best
+                                 # epoch on val_ds would rank the configs on the data used to pick it
+                                 select_best=False),
+        train_dataset=train_ds,
+        eval_dataset=val_ds,
+        tokenizer=tokenizer,
+        data_collator=DataCollatorWithPadding(tokenizer),
+        compute_metrics=compute_accuracy,
+    )
+    start = time.perf_counter()
+    trainer.train()
+    train_s = time.perf_counter() - start
+    eval_metrics = trainer.evaluate()
+    # checkpoints are only needed to pick the best epoch; the leaderboard is the output
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+    model.eval()
+    val_texts = [texts[i] for i in job["val_idx"]]
+
+    def predict_one(text):
+        with torch.no_grad():
+            return model(**tokenizer(text, truncation=True, max_length=MAX_LENGTH, return_tensors="pt")).logits
+
+    return dict(cfg, name=job["name"],
+                eval_accuracy=eval_metrics.get("eval_accuracy"),
+                eval_loss=eval_metrics.get("eval_loss"),
+                latency_ms=measure_latency_ms(predict_one, val_texts),
+                train_s=train_s)
+
+
+def sweep(args):
+    """Train every (epochs, lr, batch size) combination in a process pool and write a
+    leaderboard of held-out accuracy and single-query latency."""
+    import csv
+    import itertools
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from transformers import AutoTokenizer
+
+    texts, labels, label2id, _ = load_intents(args.intents)
+    train_idx, val_idx, _, _ = choose_train_test_split(list(range(len(texts))), labels, default_frac=0.2)
+    if not val_idx:
+        val_idx = train_idx[:1]
+    # fill the cache once up front so workers only ever read it
+    tokenize_cached(AutoTokenizer.from_pretrained(args.model_name), texts, labels, args.intents, cache_dir=args.cache_dir)
+
+    grid = list(itertools.product(args.sweep_epochs or [args.epochs],
+                                  args.sweep_lrs or [args.lr],
+                                  args.sweep_batch_sizes or [args.batch_size]))
+    workers = max(1, min(args.sweep_workers, len(grid)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    os.makedirs(args.sweep_dir, exist_ok=True)
+    jobs = []
+    for epochs, lr, batch_size in grid:
+        jobs.append({
+            "name": f"e{epochs}_lr{lr:g}_bs{batch_size}",
+            "config": {"epochs": epochs, "lr": lr, "batch_size": batch_size},
+            "model_name": args.model_name,
+            "num_labels": len(label2id),
+            "intents": args.intents,
+            "cache_dir": args.cache_dir,
+            "sweep_dir": args.sweep_dir,
+            "train_idx": train_idx,
+            "val_idx": val_idx,
+            "logging_steps": args.logging_steps,
+            "threads": threads,
+        })
+    print(f"Sweeping {len(jobs)} configs on {workers} workers ({threads} threads each)...")
+
+    results = []
+    # spawn: forked workers would inherit torch/OpenMP state from the parent
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(_sweep_run, job): job["name"] for job in jobs}
+        for fut in as_completed(futures):
+            try:
+                res = fut.result()
+            except Exception as e:
+                print(f"  {futures[fut]} failed: {e}")
+                continue
+            print(f"  {res['name']}: accuracy={res['eval_accuracy']:.3f} latency={res['latency_ms']:.2f}ms")
+            results.append(res)
+
+    results.sort(key=lambda r: (-(r["eval_accuracy"] or 0.0), r["latency_ms"]))
+    with open(os.path.join(args.sweep_dir, "leaderboard.json"), "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    fields = ["name", "epochs", "lr", "batch_size", "eval_accuracy", "eval_loss", "latency_ms", "train_s"]
+    with open(os.path.join(args.sweep_dir, "leaderboard.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+
+    print()
+    print(f"{'config':<24}{'accuracy':>10}{'latency (ms)':>15}{'train (s)':>12}")
+    for r in results:
+        print(f"{r['name']:<24}{r['eval_accuracy']:>10.3f}{r['latency_ms']:>15.2f}{r['train_s']:>12.1f}")
+    print("Leaderboard written to:", args.sweep_dir)
+    return results
+
+# -----------------------
+# Incremental fine-tuning
+# -----------------------
+def load_new_examples(path, label2id):
+    """Texts/labels of the pending new_examples only."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    texts, labels = [], []
+    for intent in data["intents"]:
+        for ex in intent.get("new_examples", []):
+            if isinstance(ex, str) and ex.strip():
+                texts.append(ex.strip())
+                labels.append(label2id[intent["name"]])
+    return texts, labels
+
+def replay_sample(texts, labels, n, seed=42):
+    """Up to n old examples, drawn round-robin over classes so rare intents are kept."""
+    import random
+
+    rng = random.Random(seed)
+    by_class = {}
+    for t, l in zip(texts, labels):
+        by_class.setdefault(l, []).append(t)
+    for items in by_class.values():
+        rng.shuffle(items)
+    out_txt, out_lbl = [], []
+    while len(out_txt) < n and any(by_class.values()):
+        for l in sorted(by_class):
+            if by_class[l] and len(out_txt) < n:
+                out_txt.append(by_class[l].pop())
+                out_lbl.append(l)
+    return out_txt, out_lbl
+
+def incremental(args):
+    """Fine-tune the serving model on pending new_examples plus a replay sample of old ones.
+
+    The gate set is the base model's own held-out set (heldout.json, written by
+    every run), so neither model has trained on it. It is scored before and after
+    fine-tuning; if accuracy drops by more than --max_regression the model is not
+    saved and the run exits non-zero. The last epoch is kept rather than the one
+    that scores best on the gate set. Falls back to a full retrain when there is
+    no fine-tunable model, it does not know every intent, or it has no recorded
+    held-out set.
+    """
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, Trainer, TrainingArguments, DataCollatorWithPadding
+    from nlu_engine.infer_intent import IntentClassifier
+    from nlu_engine.student_model import is_student_dir
+
+    base_dir = args.base_dir
+    if not base_dir:
+        from nlu_engine.model_registry import resolve_model_dir
+        base_dir, _ = resolve_model_dir()
+    if not os.path.exists(os.path.join(base_dir, "config.json")) or is_student_dir(base_dir):
+        print(f"No fine-tunable model in {base_dir}; running a full retrain instead.")
+        return train(args)
+
+    # train against the base model's own label ids so its classifier head is reused as-is
+    base_id2label = IntentClassifier._load_label_map(base_dir)
+    label2id = {name: int(i) for i, name in base_id2label.items()}
+    with open(args.intents, "r", encoding="utf-8") as f:
+        names = [it["name"] for it in json.load(f)["intents"]]
+    unknown = [n for n in names if n not in label2id]
+    if unknown:
+        print(f"Model in {base_dir} does not know intents {unknown}; running a full retrain instead.")
+        return train(args)
+    id2label = {i: name for name, i in label2id.items()}
+
+    # examples since deleted from intents.json still count; intents the model lacks cannot
+    heldout = [(t, name) for t, name in load_heldout(base_dir) or [] if name in label2id]
+    if not heldout:
+        print(f"No held-out set recorded with {base_dir}; running a full retrain instead.")
+        return train(args)
+
+    old_txt, cur_lbl, _, cur_id2label = load_intents(args.intents, include_new=False)
+    old_lbl = [label2id[cur_id2label[l]] for l in cur_lbl]
+    new_txt, new_lbl = load_new_examples(args.intents, label2id)
+    if not new_txt:
+        raise SystemExit("No pending new_examples to train on.")
+
+    # held-out examples stay out of the replay sample
+    heldout_set = {t for t, _ in heldout}
+    val_txt, val_lbl = [t for t, _ in heldout], [label2id[name] for _, name in heldout]
+    pool = [(t, l) for t, l in zip(old_txt, old_lbl) if t not in heldout_set]
+    train_txt, train_lbl = [t for t, _ in pool], [l for _, l in pool]
+    n_replay = max(args.min_replay, int(len(new_txt) * args.replay_ratio))
+    rep_txt, rep_lbl = replay_sample(train_txt, train_lbl, n_replay)
+    ft_txt, ft_lbl = new_txt + rep_txt, new_lbl + rep_lbl
+    print(f"Fine-tuning {base_dir} on {len(new_txt)} new + {len(rep_txt)} replayed examples; held-out size: {len(val_txt)}")
+
+    tokenizer = AutoTokenizer.from_pretrained(base_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(base_dir)
+    train_ds = SimpleDataset(encode_data(tokenizer, ft_txt, ft_lbl))
+    val_ds = SimpleDataset(encode_data(tokenizer, val_txt, val_lbl))
+
+    # checkpoint selection on the gate set would grade the model on the data that chose it
+    training_args = build_training_args(TrainingArguments, args.output_dir, args.epochs, args.batch_size, args.lr,
+                                        logging_steps=args.logging_steps, select_best=False)
+    callbacks, emit = [], None
+    if args.progress_file:
+        callback, emit = make_progress_callback(args.progress_file)
+        callbacks.append(callback)
+
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=train_ds,
+        eval_dataset=val_ds,
+        tokenizer=tokenizer,
+        data_collator=DataCollatorWithPadding(tokenizer),
+        compute_metrics=compute_accuracy,
+        callbacks=callbacks
+    )
+
+    before = trainer.evaluate().get("eval_accuracy")
+    print(f"Held-out accuracy before: {before:.3f}")
+    print("Starting incremental training...")
+    trainer.train()
+    eval_metrics = trainer.evaluate()
+    after = eval_metrics.get("eval_accuracy")
+    print(f"Held-out accuracy after:  {after:.3f}")
+
+    metrics = {
+        "mode": "incremental",
+        "base_dir": base_dir,
+        "eval_accuracy": after,
+        "eval_loss": eval_metrics.get("eval_loss"),
+        "baseline_accuracy": before,
+        "max_regression": args.max_regression,
+        "regressed": after < before - args.max_regression,
+        "new_size": len(new_txt),
+        "replay_size": len(rep_txt),
+        "val_size": len(val_txt),
+        "epochs": args.epochs,
+        "batch_size": args.batch_size,
+        "lr": args.lr,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, "metrics.json"), "w", encoding="utf-8") as f:
+        json.dump(metrics, f, indent=2)
+    if emit:
+        emit(event="done", **metrics)
+    if metrics["regressed"]:
+        raise SystemExit(f"Held-out accuracy regressed from {before:.3f} to {after:.3f}; model not saved.")
+
+    save_model(model, args.output_dir)
+    tokenizer.save_pretrained(args.output_dir)
+    with open(os.path.join(args.output_dir, "label2id.json"), "w", encoding="utf-8") as f:
+        json.dump(label2id, f)
+    with open(os.path.join(args.output_dir, "id2label.json"), "w", encoding="utf-8") as f:
+        json.dump(id2label, f)
+    # the new examples are training data now; the gate set carries over unchanged
+    save_heldout(args.output_dir, val_txt, [id2label[l] for l in val_lbl])
+
+    print("Incremental training complete! Saved to:", args.output_dir)
+    return metrics
+
+# -----------------------
+# Distillation
+# -----------------------
+def augment_texts(texts, labels, copies=3, seed=42):
+    """Cheap label-preserving variants: lowercasing, punctuation stripping,
+    word dropout and adjacent-word swaps."""
+    import random
+    import re
+
+    rng = random.Random(seed)
+    out_txt, out_lbl = list(texts), list(labels)
+    for txt, lbl in zip(texts, labels):
+        words = re.sub(r"[^\w\s₹]", " ", txt.lower()).split()
+        for _ in range(copies):
+            variant = list(words)
+            if len(variant) > 3:
+                variant = [w for w in variant if rng.random() > 0.15] or variant
+            if len(variant) > 2 and rng.random() < 0.5:
+                i = rng.randrange(len(variant) - 1)
+                variant[i], variant[i + 1] = variant[i + 1], variant[i]
+            aug = " ".join(variant)
+            if aug and aug != txt:
+                out_txt.append(aug)
+                out_lbl.append(lbl)
+    return out_txt, out_lbl
+
+def measure_latency_ms(predict_one, texts, repeats=1):
+    """Mean single-query latency in milliseconds."""
+    import time
+
+    if not texts:
+        return 0.0
+    predict_one(texts[0])  # first call pays one-off allocation costs
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for t in texts:
+            predict_one(t)
+    return (time.perf_counter() - start) * 1000.0 / (len(texts) * repeats)
+
+def distill(args):
+    import torch
+    import torch.nn.functional as F
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    from nlu_engine.student_model import build_student, pack_ids, save_student
+
+    print("Loading intents from:", args.intents)
+    texts, labels, label2id, id2label = load_intents(args.intents)
+    train_txt, val_txt, train_lbl, val_lbl = choose_train_test_split(texts, labels, default_frac=0.2)
+    # too few examples to hold any out (choose_train_test_split needs two): score on the
+    # training set, and label the report so nobody reads it as held-out accuracy
+    eval_split = "val"
+    if not val_txt:
+        val_txt, val_lbl = train_txt, train_lbl
+        eval_split = "train"
+        print("Warning: no held-out examples; teacher/student accuracy below is TRAIN accuracy.")
+    aug_txt, aug_lbl = augment_texts(train_txt, train_lbl, copies=args.augment)
+    print(f"Train size: {len(train_txt)} (+{len(aug_txt) - len(train_txt)} augmented)  Val size: {len(val_txt)}")
+
+    print("Loading teacher from:", args.teacher_dir)
+    tokenizer = AutoTokenizer.from_pretrained(args.teacher_dir)
+    teacher = AutoModelForSequenceClassification.from_pretrained(args.teacher_dir)
+    teacher.eval()
+
+    # teacher output index -> current label id, matched by intent name
+    teacher_labels = {int(k): v for k, v in teacher.config.id2label.items()}
+    id2label_path = os.path.join(args.teacher_dir, "id2label.json")
+    if os.path.exists(id2label_path):
+        with open(id2label_path, "r", encoding="utf-8") as f:
+            teacher_labels = {int(k): v for k, v in json.load(f).items()}
+    missing = [name for name in label2id if name not in teacher_labels.values()]
+    if missing:
+        raise SystemExit(f"Teacher does not know intents {missing}; retrain the teacher before distilling.")
+    order = [next(i for i, n in teacher_labels.items() if n == name) for name, _ in sorted(label2id.items(), key=lambda kv: kv[1])]
+
+    def teacher_logits(batch):
+        enc = tokenizer(batch, truncation=True, padding=True, max_length=128, return_tensors="pt")
+        with torch.no_grad():
+            return teacher(**enc).logits[:, order]
+
+    # length-sorted batches keep padding to a minimum during the teacher pass
+    lengths = [len(ids) for ids in tokenizer(aug_txt, truncation=True, max_length=MAX_LENGTH)["input_ids"]]
+    soft = torch.zeros(len(aug_txt), len(label2id))
+    for batch in length_sorted_batches(lengths, 64):
+        soft[batch] = teacher_logits([aug_txt[i] for i in batch])
+    hard = torch.tensor(aug_lbl)
+
+    student = build_student(len(tokenizer), len(label2id), embed_dim=args.student_dim, hidden_dim=args.student_dim)
+    optim = torch.optim.Adam(student.parameters(), lr=args.student_lr)
+    T = args.temperature
+    g = torch.Generator().manual_seed(42)
+
+    print("Distilling student...")
+    for epoch in range(args.student_epochs):
+        student.train()
+        perm = torch.randperm(len(aug_txt), generator=g).tolist()
+        total = 0.0
+        for i in range(0, len(perm), args.batch_size):
+            idx = perm[i:i + args.batch_size]
+            input_ids, offsets = pack_ids(tokenizer, [aug_txt[j] for j in idx])
+            logits = student(input_ids, offsets)
+            kd = F.kl_div(F.log_softmax(logits / T, dim=1), F.softmax(soft[idx] / T, dim=1), reduction="batchmean") * (T * T)
+            ce = F.cross_entropy(logits, hard[idx])
+            loss = args.alpha * kd + (1.0 - args.alpha) * ce
+            optim.zero_grad()
+            loss.backward()
+            optim.step()
+            total += float(loss) * len(idx)
+        if (epoch + 1) % 10 == 0 or epoch + 1 == args.student_epochs:
+            print(f"  epoch {epoch + 1}/{args.student_epochs}  loss={total / len(perm):.4f}")
+    student.eval()
+
+    def teacher_predict(batch):
+        return teacher_logits(batch).argmax(dim=1).tolist()
+
+    def student_predict(batch):
+        input_ids, offsets = pack_ids(tokenizer, batch)
+        with torch.no_grad():
+            return student(input_ids, offsets).argmax(dim=1).tolist()
+
+    def accuracy(predict):
+        preds = predict(val_txt)
+        return sum(int(p == y) for p, y in zip(preds, val_lbl)) / len(val_lbl)
+
+    def n_params(m):
+        return sum(p.numel() for p in m.parameters())
+
+    report = {
+        "teacher": {
+            "dir": args.teacher_dir,
+            "accuracy": accuracy(teacher_predict),
+            "latency_ms": measure_latency_ms(lambda t: teacher_predict([t]), val_txt),
+            "params": n_params(teacher),
+        },
+        "student": {
+            "dir": args.student_dir,
+            "accuracy": accuracy(student_predict),
+            "latency_ms": measure_latency_ms(lambda t: student_predict([t]), val_txt),
+            "params": n_params(student),
+        },
+        "val_size": len(val_txt),
+        "eval_split": eval_split,
+    }
+
+    config = {
+        "architecture": "bag_of_embeddings",
+        "vocab_size": len(tokenizer),
+        "num_labels": len(label2id),
+        "embed_dim": args.student_dim,
+        "hidden_dim": args.student_dim,
+        "max_length": 128,
+        "teacher": args.teacher_dir,
+    }
+    save_student(student, tokenizer, args.student_dir, config, label2id, id2label)
+    with open(os.path.join(args.student_dir, "distill_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print()
+    acc_header = "accuracy" if eval_split == "val" else "train acc"
+    print(f"{'model':<10}{acc_header:>10}{'latency (ms)':>15}{'params':>14}")
+    for name in ("teacher", "student"):
+        r = report[name]
+        print(f"{name:<10}{r['accuracy']:>10.3f}{r['latency_ms']:>15.2f}{r['params']:>14,}")
+    print("Student saved to:", args.student_dir)
+    return report
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -207,8 +818,39 @@ if __name__ == "__main__":
     parser.add_argument("--epochs", type=int, default=2)
     parser.add_argument("--batch_size", type=int, default=8)
     parser.add_argument("--lr", type=float, default=2e-5)
+    parser.add_argument("--mode", default="full", choices=["full", "incremental", "distill", "sweep"])
+    parser.add_argument("--cache_dir", default=CACHE_DIR, help="on-disk cache of tokenized datasets")
+    parser.add_argument("--progress_file", default=None, help="append JSON progress events here (used by the admin job runner)")
+    parser.add_argument("--logging_steps", type=int, default=10)
+    # hyperparameter sweep
+    parser.add_argument("--sweep_epochs", type=int, nargs="+", default=None)
+    parser.add_argument("--sweep_lrs", type=float, nargs="+", default=None)
+    parser.add_argument("--sweep_batch_sizes", type=int, nargs="+", default=None)
+    parser.add_argument("--sweep_workers", type=int, default=2)
+    parser.add_argument("--sweep_dir", default=SWEEP_DIR)
+    # incremental fine-tuning
+    parser.add_argument("--base_dir", default=None, help="model to fine-tune (default: the serving version)")
+    parser.add_argument("--replay_ratio", type=float, default=2.0, help="old examples replayed per new example")
+    parser.add_argument("--min_replay", type=int, default=32)
+    parser.add_argument("--max_regression", type=float, default=0.01, help="allowed drop in held-out accuracy")
+    # distillation
+    parser.add_argument("--teacher_dir", default="models/intent_model")
+    parser.add_argument("--student_dir", default="models/intent_student")
+    parser.add_argument("--student_dim", type=int, default=64)
+    parser.add_argument("--student_epochs", type=int, default=40)
+    parser.add_argument("--student_lr", type=float, default=5e-3)
+    parser.add_argument("--augment", type=int, default=3, help="augmented copies per training example")
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--alpha", type=float, default=0.7, help="weight of the distillation loss vs. hard labels")
     args = parser.parse_args()
-    train(args)
+    if args.mode == "distill":
+        distill(args)
+    elif args.mode == "incremental":
+        incremental(args)
+    elif args.mode == "sweep":
+        sweep(args)
+    else:
+        train(args)
 
 
    
\ No newline at end of file
@@ -0,0 +1,321 @@
+# nlu_engine/training_jobs.py
+#
+# Background training jobs for the admin pages. Each job runs
+# `python -m nlu_engine.train_intent` in its own process, streams progress
+# through a JSONL file and, once training exits cleanly, has to pass a
+# validation gate before it is published as the serving model version.
+#
+# Job state lives on disk (models/jobs/<id>/job.json) so any Streamlit session
+# or rerun can pick it up; Popen handles are kept per process for cancellation.
+
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import threading
+import subprocess
+
+from nlu_engine import model_registry
+
+INTENTS_PATH = "nlu_engine/intents.json"
+JOBS_DIR = "models/jobs"
+MIN_ACCURACY = 0.85
+SANITY_PER_INTENT = 3
+
+STATUS_RUNNING = "running"
+STATUS_VALIDATING = "validating"
+STATUS_PROMOTED = "promoted"
+STATUS_REJECTED = "rejected"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+ACTIVE_STATUSES = {STATUS_RUNNING, STATUS_VALIDATING}
+
+_procs = {}
+_lock = threading.Lock()
+
+
+# -----------------------
+# Job files
+# -----------------------
+def _job_dir(job_id):
+    return os.path.join(JOBS_DIR, job_id)
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _read_json(path, default=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+def load_job(job_id):
+    return _read_json(os.path.join(_job_dir(job_id), "job.json"))
+
+def save_job(job):
+    _write_json(os.path.join(_job_dir(job["id"]), "job.json"), job)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    return True
+
+def list_jobs():
+    if not os.path.isdir(JOBS_DIR):
+        return []
+    jobs = []
+    for job_id in sorted(os.listdir(JOBS_DIR), reverse=True):
+        job = load_job(job_id)
+        if not job:
+            continue
+        # a job left "running" by a process that no longer exists (server restart)
+        if job["status"] in ACTIVE_STATUSES and job_id not in _procs and not _pid_alive(job.get("pid")):
+            job["status"] = STATUS_FAILED
+            job["error"] = "Training process exited without reporting a result."
+            save_job(job)
+        jobs.append(job)
+    return jobs
+
+def latest_job():
+    jobs = list_jobs()
+    return jobs[0] if jobs else None
+
+def active_job():
+    return next((j for j in list_jobs() if j["status"] in ACTIVE_STATUSES), None)
+
+
+# -----------------------
+# Progress
+# -----------------------
+def read_progress(job_id):
+    """Summarize progress.jsonl: latest step/loss/accuracy plus the loss and eval curves."""
+    out = {"step": 0, "total_steps": None, "epoch": None, "loss": None, "eval_accuracy": None,
+           "losses": [], "evals": []}
+    path = os.path.join(_job_dir(job_id), "progress.jsonl")
+    if not os.path.exists(path):
+        return out
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                ev = json.loads(line)
+            except ValueError:
+                continue  # partially written last line
+            if ev.get("total_steps"):
+                out["total_steps"] = ev["total_steps"]
+            if ev.get("step") is not None:
+                out["step"] = ev["step"]
+            if ev.get("epoch") is not None:
+                out["epoch"] = ev["epoch"]
+            if ev["event"] == "log":
+                out["loss"] = ev["loss"]
+                out["losses"].append((ev["step"], ev["loss"]))
+            elif ev["event"] == "eval" and ev.get("eval_accuracy") is not None:
+                out["eval_accuracy"] = ev["eval_accuracy"]
+                out["evals"].append((ev["step"], ev["eval_accuracy"]))
+    return out
+
+def log_tail(job_id, lines=20):
+    path = os.path.join(_job_dir(job_id), "train.log")
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+    except OSError:
+        return ""
+
+
+# -----------------------
+# Intents helpers
+# -----------------------
+def pending_examples(intents_path=INTENTS_PATH):
+    data = _read_json(intents_path, {}) or {}
+    return {it["name"]: list(it.get("new_examples", [])) for it in data.get("intents", []) if it.get("new_examples")}
+
+def promote_examples(intents_path, pending):
+    """Move the new_examples a job trained on into examples; later additions stay pending."""
+    if not pending:
+        return
+    data = _read_json(intents_path, {}) or {}
+    for it in data.get("intents", []):
+        trained = set(pending.get(it.get("name"), []))
+        if not trained:
+            continue
+        keep = []
+        for ex in it.get("new_examples", []):
+            if ex in trained:
+                it.setdefault("examples", []).append({"text": ex, "status": "trained"})
+            else:
+                keep.append(ex)
+        it["new_examples"] = keep
+    _write_json(intents_path, data)
+
+def labelled_samples(intents_path=INTENTS_PATH, per_intent=SANITY_PER_INTENT):
+    data = _read_json(intents_path, {}) or {}
+    samples = []
+    for it in data.get("intents", []):
+        for ex in it.get("examples", [])[:per_intent]:
+            txt = ex.get("text", "") if isinstance(ex, dict) else str(ex)
+            if txt.strip():
+                samples.append((txt.strip(), it["name"]))
+    return samples
+
+
+# -----------------------
+# Validation gate + promotion
+# -----------------------
+def validate_model(model_dir, min_accuracy=MIN_ACCURACY, intents_path=INTENTS_PATH):
+    """Return (ok, report). The held-out accuracy written by train_intent must clear
+    min_accuracy, and the saved model must load and label representative
+    utterances from intents.json correctly."""
+    metrics = _read_json(os.path.join(model_dir, "metrics.json"), {}) or {}
+    acc = metrics.get("eval_accuracy")
+    report = {"eval_accuracy": acc, "min_accuracy": min_accuracy}
+    if acc is None:
+        report["reason"] = "Training did not report a held-out accuracy."
+        return False, report
+    if acc < min_accuracy:
+        report["reason"] = f"Held-out accuracy {acc:.3f} is below the gate ({min_accuracy:.3f})."
+        return False, report
+
+    from nlu_engine.infer_intent import IntentClassifier
+
+    try:
+        clf = IntentClassifier(model_dir=model_dir, load_mode="eager", warmup=False)
+        samples = labelled_samples(intents_path)
+        preds = clf.predict_batch([t for t, _ in samples], top_k=1)
+    except Exception as e:
+        report["reason"] = f"Trained model failed to load or predict: {e}"
+        return False, report
+    correct = sum(int(p[0]["intent"] == name) for p, (_, name) in zip(preds, samples))
+    sanity = correct / len(samples) if samples else 1.0
+    report["sanity_accuracy"] = sanity
+    if sanity < min_accuracy:
+        report["reason"] = f"Sanity accuracy {sanity:.3f} on known examples is below the gate."
+        return False, report
+    return True, report
+
+def promote_model(staging_dir):
+    """Publish the validated model as a new registry version and make it current.
+
+    Running NLUProcessors notice the new CURRENT pointer and hot-swap it in."""
+    version = model_registry.publish(staging_dir)
+    return os.path.join(model_registry.VERSIONS_DIR, version)
+
+
+# -----------------------
+# Start / watch / cancel
+# -----------------------
+def start_job(epochs=3, batch_size=8, lr=2e-5, model_name="distilbert-base-uncased",
+              intents_path=INTENTS_PATH, min_accuracy=MIN_ACCURACY, mode="full", extra_args=None):
+    """Launch train_intent in a subprocess. mode is "full" or "incremental" (fine-tune
+    the serving model on pending new_examples with replay of old ones)."""
+    with _lock:
+        running = active_job()
+        if running:
+            raise RuntimeError(f"Training job {running['id']} is already {running['status']}.")
+
+        job_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        job_dir = _job_dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        staging = os.path.join(job_dir, "model")
+        cmd = [
+            sys.executable, "-m", "nlu_engine.train_intent",
+            "--intents", intents_path,
+            "--model_name", model_name,
+            "--output_dir", staging,
+            "--epochs", str(int(epochs)),
+            "--batch_size", str(int(batch_size)),
+            "--lr", str(float(lr)),
+            "--progress_file", os.path.join(job_dir, "progress.jsonl"),
+            "--mode", mode,
+        ] + list(extra_args or [])
+
+        log = open(os.path.join(job_dir, "train.log"), "w", encoding="utf-8")
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, cwd=os.getcwd())
+        job = {
+            "id": job_id,
+            "status": STATUS_RUNNING,
+            "pid": proc.pid,
+            "cmd": cmd,
+            "params": {"epochs": int(epochs), "batch_size": int(batch_size), "lr": float(lr), "model_name": model_name,
+                       "mode": mode},
+            "min_accuracy": min_accuracy,
+            "intents_path": intents_path,
+            "staging_dir": staging,
+            # snapshot: only these get promoted to trained if the job succeeds
+            "pending": pending_examples(intents_path),
+            "started_at": time.time(),
+        }
+        save_job(job)
+        _procs[job_id] = proc
+
+    threading.Thread(target=_watch, args=(job_id, proc, log), name=f"train-{job_id}", daemon=True).start()
+    return job
+
+def _watch(job_id, proc, log):
+    rc = proc.wait()
+    log.close()
+    with _lock:
+        _procs.pop(job_id, None)
+        job = load_job(job_id)
+        if job["status"] == STATUS_CANCELLED:
+            return
+        job["returncode"] = rc
+        job["finished_at"] = time.time()
+        metrics = _read_json(os.path.join(job["staging_dir"], "metrics.json"), {}) or {}
+        if rc != 0 and metrics.get("regressed"):
+            # incremental run that made held-out accuracy worse: nothing was saved
+            job["status"] = STATUS_REJECTED
+            job["validation"] = {
+                "eval_accuracy": metrics.get("eval_accuracy"),
+                "baseline_accuracy": metrics.get("baseline_accuracy"),
+                "reason": f"Held-out accuracy fell from {metrics['baseline_accuracy']:.3f} to {metrics['eval_accuracy']:.3f}.",
+            }
+            save_job(job)
+            return
+        if rc != 0:
+            job["status"] = STATUS_FAILED
+            job["error"] = log_tail(job_id, 5).strip() or f"Training exited with code {rc}."
+            save_job(job)
+            return
+        job["status"] = STATUS_VALIDATING
+        save_job(job)
+
+    ok, report = validate_model(job["staging_dir"], job["min_accuracy"], job["intents_path"])
+    job["validation"] = report
+    if not ok:
+        job["status"] = STATUS_REJECTED
+        save_job(job)
+        return
+    try:
+        job["model_dir"] = promote_model(job["staging_dir"])
+        promote_examples(job["intents_path"], job.get("pending"))
+        job["status"] = STATUS_PROMOTED
+    except Exception as e:
+        job["status"] = STATUS_FAILED
+        job["error"] = f"Promotion failed: {e}"
+    job["promoted_at"] = time.time()
+    save_job(job)
+
+def cancel_job(job_id):
+    with _lock:
+        job = load_job(job_id)
+        if not job or job["status"] != STATUS_RUNNING:
+            return False
+        # mark first so the watcher thread does not validate a half-trained model
+        job["status"] = STATUS_CANCELLED
+        job["finished_at"] = time.time()
+        save_job(job)
+        proc = _procs.get(job_id)
+    if proc is not None:
+        proc.terminate()
+    elif _pid_alive(job.get("pid")):
+        os.kill(job["pid"], signal.SIGTERM)
+    return True
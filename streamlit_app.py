@@ -4,6 +4,8 @@ import os
 import json
 from pathlib import Path
 
+from nlu_engine import training_jobs, model_registry
+
 # =====================================================
 # Paths
 # =====================================================
@@ -403,8 +405,12 @@ def save_intents(intents):
     with open(INTENTS_PATH, "w", encoding="utf-8") as f:
         json.dump({"intents": intents}, f, indent=4)
 
+def serving_model_dir():
+    return model_registry.resolve_model_dir(legacy_dir=MODEL_DIR)[0]
+
 def model_exists():
-    return os.path.isdir(MODEL_DIR) and any(Path(MODEL_DIR).iterdir())
+    model_dir = serving_model_dir()
+    return os.path.isdir(model_dir) and any(Path(model_dir).iterdir())
 
 # =====================================================
 # Layout
@@ -485,7 +491,7 @@ with right_col:
             from nlu_engine.entity_extractor import EntityExtractor
 
             # --- Load models ---
-            ic = IntentClassifier(model_dir=MODEL_DIR)
+            ic = IntentClassifier(model_dir=serving_model_dir())
             ee = EntityExtractor(ENTITIES_FILE)
 
             # --- Predict intents ---
@@ -547,13 +553,40 @@ st.markdown("<h3 class='section-header'>🧠 Train Model</h3>", unsafe_allow_htm
 if model_exists():
     st.success("✅ Trained model found and ready to use!")
 
-epochs = st.number_input("Epochs", value=50)
-batch = st.number_input("Batch size", value=8)
-lr = st.number_input("Learning rate", value=0.01, format="%.6f")
+epochs = st.number_input("Epochs", value=3, min_value=1)
+batch = st.number_input("Batch size", value=8, min_value=1)
+lr = st.number_input("Learning rate", value=0.00002, format="%.6f")
 
 
 if st.button("🚀 Start Training"):
-    st.info("🔄 Training started...")
-    st.success("✅ Training completed (hook your training script here)")
+    try:
+        job = training_jobs.start_job(epochs=epochs, batch_size=batch, lr=lr, intents_path=INTENTS_PATH)
+        st.info(f"🔄 Training job {job['id']} started in the background.")
+    except RuntimeError as e:
+        st.warning(f"⚠️ {e}")
+    except Exception as e:
+        st.error(f"❌ Could not start training: {e}")
+
+job = training_jobs.latest_job()
+if job:
+    prog = training_jobs.read_progress(job["id"])
+    if prog["total_steps"]:
+        st.progress(min(1.0, prog["step"] / prog["total_steps"]))
+    loss = f"{prog['loss']:.4f}" if prog["loss"] is not None else "—"
+    acc = f"{prog['eval_accuracy']:.3f}" if prog["eval_accuracy"] is not None else "—"
+    st.markdown(f"**Job {job['id']}** — {job['status']} • step {prog['step']}/{prog['total_steps'] or '?'} • loss {loss} • eval accuracy {acc}")
+    if job["status"] == training_jobs.STATUS_RUNNING:
+        col_cancel, col_refresh = st.columns(2)
+        with col_cancel:
+            if st.button("⛔ Cancel Training"):
+                training_jobs.cancel_job(job["id"])
+        with col_refresh:
+            st.button("🔄 Refresh")
+    elif job["status"] == training_jobs.STATUS_PROMOTED:
+        st.success("✅ New model validated and now serving.")
+    elif job["status"] == training_jobs.STATUS_REJECTED:
+        st.error(f"❌ Rejected by validation gate: {job.get('validation', {}).get('reason', '')}")
+    elif job["status"] == training_jobs.STATUS_FAILED:
+        st.error(f"❌ Training failed: {job.get('error', '')}")
 
 st.markdown("</div>", unsafe_allow_html=True)
\ No newline at end of file